@@ -0,0 +1,59 @@
+"""
+Payload size and encode/decode time of the Redis cache codecs.
+
+Encodes the values the query cache stores, a query result's record ids and records, with
+JsonCodec (the format every value used to have), PackedCodec without compression, and
+PackedCodec with its default compression threshold, and times the decode every cache hit
+pays. No Redis server is needed.
+
+Usage: python -m benchmarks.bench_cache_codec [--ids 10000] [--repeat 200]
+"""
+import argparse
+import time
+
+from database.cache_codec import JsonCodec, PackedCodec
+
+
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ids', type=int, default=10000, help="Record ids in the large query result")
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    values = [
+        ('100 ids', [f'id{i:07d}' for i in range(100)]),
+        (f'{args.ids} ids', [f'id{i:07d}' for i in range(args.ids)]),
+        ('record', {'C1': 'id0000042', 'C2': 'group42', 'C3': 'a value of some length 42'}),
+        ('long record', {'C1': 'id0000042', 'C2': 'group42', 'C3': 'lorem ipsum dolor sit amet ' * 100}),
+    ]
+    codecs = [
+        ('json', JsonCodec()),
+        ('packed', PackedCodec(compress_threshold=float('inf'))),
+        ('packed+zlib', PackedCodec()),
+    ]
+    print(f"best of {args.repeat}")
+    print(f"{'value':<14}{'codec':<13}{'bytes':>9}{'encode us':>11}{'decode us':>11}")
+    for name, value in values:
+        for codec_name, codec in codecs:
+            data = codec.encode(value)
+            assert codec.decode(data) == value
+            size = len(data.encode('utf-8') if isinstance(data, str) else data)
+            encode = best_time(lambda: codec.encode(value), args.repeat)
+            # values come back from Redis as bytes
+            data = data.encode('utf-8') if isinstance(data, str) else data
+            decode = best_time(lambda: codec.decode(data), args.repeat)
+            print(f"{name:<14}{codec_name:<13}{size:>9}{encode * 1e6:>11.1f}{decode * 1e6:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Read-path benchmark for the SQL engine.
+
+Loads a table into a SQLite file (or the database given with --url) and times the query
+that MySQLDatabase runs on a cache miss, once through the ORM the way it used to
+(session.query(...).all() and to_dict() per record) and once through the Core select it
+runs now. The Redis cache is bypassed, so only the database round trip and row
+materialization are measured.
+
+Usage: python -m benchmarks.bench_mysql_read [--rows 50000] [--repeat 5] [--url URL]
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+from unittest.mock import patch
+
+from sqlalchemy import insert
+
+from database.mysql_manager import MySQLDatabase
+from database.query_ast import Predicate, Or
+
+
+def load(db, rows):
+    batch = [{'C1': f'id{i:07d}', 'C2': f'group{i % 100}', 'C3': f'value {i}'} for i in range(rows)]
+    with db.engine.begin() as connection:
+        connection.execute(db.table.delete())
+        connection.execute(insert(db.table), batch)
+
+
+def orm_read(db, expression, limit):
+    session = db.Session()
+    try:
+        query = session.query(db.Record)
+        if expression is not None:
+            query = query.filter(db._compile_expression(expression))
+        if limit is not None:
+            query = query.order_by(db.Record.C1).limit(limit)
+        return [record.to_dict() for record in query.all()]
+    finally:
+        session.close()
+
+
+def core_read(db, expression, limit):
+    return db._select_rows(expression, limit=limit)
+
+
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--url', help="Database URL; defaults to a temporary SQLite file")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    directory = tempfile.mkdtemp()
+    url = args.url or f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    # the cache is not exercised, so no Redis server is needed
+    with patch('database.mysql_manager.RedisManager'):
+        db = MySQLDatabase(url, table_name='bench_record')
+    load(db, args.rows)
+
+    cases = [
+        ('full table', None, None),
+        ('1% match', Predicate('C2', '==', 'group7'), None),
+        ('or, 2%', Or([Predicate('C2', '==', 'group7'), Predicate('C2', '==', 'group8')]), None),
+        ('page of 100', None, 100),
+    ]
+    print(f"{args.rows} rows, best of {args.repeat}")
+    print(f"{'query':<14}{'rows':>8}{'orm ms':>10}{'core ms':>10}{'speedup':>9}")
+    for name, expression, limit in cases:
+        assert orm_read(db, expression, limit) == core_read(db, expression, limit)
+        count = len(core_read(db, expression, limit))
+        orm = best_time(lambda: orm_read(db, expression, limit), args.repeat)
+        core = best_time(lambda: core_read(db, expression, limit), args.repeat)
+        print(f"{name:<14}{count:>8}{orm * 1000:>10.1f}{core * 1000:>10.1f}{orm / core:>8.1f}x")
+    db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
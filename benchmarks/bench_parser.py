@@ -0,0 +1,136 @@
+"""
+Parsing micro-benchmark for the shared lexer.
+
+Parses a batch of write commands and a batch of queries with the lexer-based DataModifier
+and QueryParser, and with the regex parsers they replaced, and reports commands per second.
+
+Usage: python -m benchmarks.bench_parser [--commands 20000] [--repeat 5]
+"""
+import argparse
+import re
+import time
+from unittest.mock import MagicMock
+from urllib.parse import unquote
+
+from database.data_modifier import DataModifier
+from database.query_parser import QueryParser
+
+
+class LegacyDataModifier:
+    """The regex parsers DataModifier used before the lexer; parse only, nothing is applied"""
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def parse(self, command):
+        command = unquote(command)
+        if command.startswith("INSERT"):
+            return self.parse_insert(command[len("INSERT"):].strip())
+        elif command.startswith("DELETE"):
+            return self.parse_delete(command[len("DELETE"):].strip())
+        elif command.startswith("UPDATE"):
+            return self.parse_update(command[len("UPDATE"):].strip())
+        raise ValueError("Unknown command")
+
+    def parse_insert(self, command):
+        pattern = r'((?:"(?:[^"\\]|\\.)*"\s*,\s*)*(?:"(?:[^"\\]|\\.)*"))'
+        match = re.match(pattern, command)
+        if not match:
+            raise ValueError("Invalid INSERT command format.")
+        values = re.findall(r'"((?:[^"\\]|\\.)*)"', match.group(1))
+        return ('insert', [value.replace('\\"', '"').replace('\\\\', '\\') for value in values])
+
+    def parse_delete(self, command):
+        values = re.findall(r'"((?:[^"\\]|\\.)*)"', command)
+        processed_values = [value.replace('\\"', '"').replace('\\\\', '\\') for value in values]
+        return ('delete', dict(zip(self.columns, processed_values)))
+
+    def parse_update(self, command):
+        parts = re.findall(r'(?:"((?:[^"\\]|\\.)*)"|\b([A-Za-z0-9_]+)\b)', command)
+        flattened_parts = [quoted if quoted else unquoted for quoted, unquoted in parts]
+        condition_parts = [part.replace('\\"', '"').replace('\\\\', '\\') for part in flattened_parts[:-2]]
+        new_value = flattened_parts[-1].replace('\\"', '"').replace('\\\\', '\\')
+        return ('update', dict(zip(self.columns, condition_parts)), flattened_parts[-2], new_value)
+
+
+LEGACY_CONDITION_PATTERN = re.compile(
+    r'(\*|[A-Za-z0-9_]+)(?:\s*(==|!=|\$=|&=|\^=|<=|>=|<|>)\s*"(.*?)(?<!\\)"'
+    r'|\s+(IN|in)\s*\(\s*((?:"(?:.*?)(?<!\\)"\s*,\s*)*"(?:.*?)(?<!\\)")\s*\))'
+    r'(\s+and\s+|\s+or\s+|$)', re.DOTALL)
+LEGACY_LIST_VALUE_PATTERN = re.compile(r'"(.*?)(?<!\\)"', re.DOTALL)
+LEGACY_PAGING_PATTERN = re.compile(r'(?:\s+|^)(LIMIT\s+\d+|OFFSET\s+\d+|CURSOR\s+"[A-Za-z0-9_\-=]*")\s*$', re.IGNORECASE)
+
+
+def legacy_parse_query(query_str):
+    """The regex query parser before the lexer: paging clauses, then one findall over the conditions"""
+    paging_match = LEGACY_PAGING_PATTERN.search(query_str)
+    while paging_match:
+        query_str = query_str[:paging_match.start()]
+        paging_match = LEGACY_PAGING_PATTERN.search(query_str)
+    parsed_conditions = []
+    for column, operator, value, in_keyword, in_values, logic in LEGACY_CONDITION_PATTERN.findall(query_str):
+        if in_keyword:
+            value = tuple(item.replace('\\"', '"') for item in LEGACY_LIST_VALUE_PATTERN.findall(in_values))
+            operator = 'IN'
+        else:
+            value = value.replace('\\"', '"')
+        parsed_conditions.append((column, operator, value, logic.strip()))
+    return parsed_conditions
+
+
+def make_commands(count):
+    commands = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            commands.append(f'INSERT "id{i}", "name \\"{i}\\" with some text", "value {i}"')
+        elif kind == 1:
+            commands.append(f'UPDATE "id{i - 1}", "C3", "updated value {i}"')
+        else:
+            commands.append(f'DELETE "id{i - 2}", "name \\"{i - 2}\\" with some text"')
+    return commands
+
+
+def make_queries(count):
+    return [f'C1 == "id{i}" and C2 &= "text" or C3 IN ("value {i}", "other") LIMIT 10' for i in range(count)]
+
+
+def best_rate(function, items, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(items)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(items) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--commands', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    columns = ['C1', 'C2', 'C3']
+    db = MagicMock()
+    db.get_columns.return_value = columns
+    modifier = DataModifier(db)
+    legacy_modifier = LegacyDataModifier(columns)
+    query_parser = QueryParser()
+
+    commands = make_commands(args.commands)
+    queries = make_queries(args.commands)
+    cases = [
+        ('commands', 'regex', lambda items: [legacy_modifier.parse(item) for item in items], commands),
+        ('commands', 'lexer', modifier.parse_batch, commands),
+        ('queries', 'regex', lambda items: [legacy_parse_query(item) for item in items], queries),
+        ('queries', 'lexer', lambda items: [query_parser.parse_command(item) for item in items], queries),
+    ]
+    print(f"{args.commands} items, best of {args.repeat}")
+    print(f"{'input':<10}{'parser':<8}{'items/s':>12}")
+    for name, variant, function, items in cases:
+        print(f"{name:<10}{variant:<8}{best_rate(function, items, args.repeat):>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Contention benchmark for FairReadWriteLock.
+
+Runs the same mixed reader/writer workload against the current phase-fair lock and
+the previous single-condition implementation, and reports throughput and the worst
+reader and writer wait times.
+
+Usage: python -m benchmarks.bench_rw_lock [--readers 16] [--writers 2] [--seconds 2]
+"""
+import argparse
+import threading
+import time
+
+from threading_lib.read_write_lock import FairReadWriteLock
+
+
+class LegacyReadWriteLock:
+    """The original implementation: one condition, notify_all on every release"""
+
+    def __init__(self):
+        self._writers_waiting = 0
+        self._readers = 0
+        self._writer = False
+        self._read_ready = threading.Condition(threading.Lock())
+
+    def acquire_read(self):
+        with self._read_ready:
+            while self._writer or self._writers_waiting > 0:
+                self._read_ready.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._read_ready:
+            self._readers -= 1
+            if self._readers == 0:
+                self._read_ready.notify_all()
+
+    def acquire_write(self):
+        with self._read_ready:
+            self._writers_waiting += 1
+            while self._writer or self._readers > 0:
+                self._read_ready.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._read_ready:
+            self._writer = False
+            self._read_ready.notify_all()
+
+
+def spin(iterations):
+    total = 0
+    for i in range(iterations):
+        total += i
+    return total
+
+
+def run(lock, readers, writers, seconds, read_work, write_work):
+    stop = threading.Event()
+    counts = {'read': 0, 'write': 0}
+    max_wait = {'read': 0.0, 'write': 0.0}
+    guard = threading.Lock()
+
+    def worker(kind, acquire, release, work):
+        done = 0
+        worst = 0.0
+        while not stop.is_set():
+            start = time.perf_counter()
+            acquire()
+            waited = time.perf_counter() - start
+            try:
+                spin(work)
+            finally:
+                release()
+            done += 1
+            if waited > worst:
+                worst = waited
+        with guard:
+            counts[kind] += done
+            max_wait[kind] = max(max_wait[kind], worst)
+
+    threads = [threading.Thread(target=worker, args=('read', lock.acquire_read, lock.release_read, read_work))
+               for _ in range(readers)]
+    threads += [threading.Thread(target=worker, args=('write', lock.acquire_write, lock.release_write, write_work))
+                for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return counts, max_wait
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--read-work', type=int, default=200, help='loop iterations inside each read section')
+    parser.add_argument('--write-work', type=int, default=2000, help='loop iterations inside each write section')
+    args = parser.parse_args()
+
+    print(f"{args.readers} readers, {args.writers} writers, {args.seconds}s per lock")
+    print(f"{'lock':<12}{'reads/s':>12}{'writes/s':>12}{'max read wait':>16}{'max write wait':>16}")
+    for name, lock in (('legacy', LegacyReadWriteLock()), ('phase-fair', FairReadWriteLock())):
+        counts, max_wait = run(lock, args.readers, args.writers, args.seconds, args.read_work, args.write_work)
+        print(f"{name:<12}{counts['read'] / args.seconds:>12.0f}{counts['write'] / args.seconds:>12.0f}"
+              f"{max_wait['read'] * 1000:>14.1f}ms{max_wait['write'] * 1000:>14.1f}ms")
+        if isinstance(lock, FairReadWriteLock):
+            stats = lock.stats()
+            print(f"{'':<12}avg contended wait: read {stats['read']['wait_avg'] * 1000:.2f}ms, "
+                  f"write {stats['write']['wait_avg'] * 1000:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Workload benchmark for the SQLite engine against the CSV engine.
+
+Builds the same table as a CSV file and as an SQLite database, with C1 and C2 indexed in
+both engines, and times startup, point lookups, prefix, substring and case-insensitive
+searches, a group count and a durable write batch.
+
+Usage: python -m benchmarks.bench_sqlite [--rows 100000] [--repeat 3]
+"""
+import argparse
+import csv
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from database.csv_manager import CSVFileManager
+from database.query_ast import Predicate
+from database.sqlite_manager import SQLiteDatabase
+
+COLUMNS = ['C1', 'C2', 'C3']
+
+
+def make_rows(count):
+    return [[f'id{i:07d}', f'Group{i % 100}', f'text {i} item{i % 997}'] for i in range(count)]
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
+
+
+def write_sqlite(path, rows):
+    db = SQLiteDatabase(path, columns=COLUMNS, indexed_columns=['C1', 'C2'])
+    for row in rows:
+        db.add_record(row)
+    db.write()
+    db.close()
+
+
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def workloads(rows):
+    count = len(rows)
+    lookups = [Predicate('C1', '==', rows[i * 7919 % count][0]) for i in range(200)]
+
+    def point_lookups(db):
+        for predicate in lookups:
+            db.query_records(predicate)
+
+    def write_batch(db):
+        for i in range(1000):
+            db.update_record({'C1': rows[i * 31 % count][0]}, 'C3', f'updated {i}')
+        db.write()
+
+    return [
+        ('200 point lookups', point_lookups),
+        ('prefix', lambda db: db.query_records(Predicate('C1', '^=', 'id00001'))),
+        ('substring', lambda db: db.query_records(Predicate('C3', '&=', 'item99 '))),
+        ('substring any', lambda db: db.query_records(Predicate('*', '&=', 'item99 '))),
+        ('case-insensitive', lambda db: db.query_records(Predicate('C2', '$=', 'group7'))),
+        ('group count', lambda db: db.aggregate_records(None, 'group_count', 'C2', limit=10)),
+        ('1000 updates', write_batch),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    directory = tempfile.mkdtemp()
+    try:
+        rows = make_rows(args.rows)
+        csv_path = os.path.join(directory, 'bench.csv')
+        sqlite_path = os.path.join(directory, 'bench.db')
+        write_csv(csv_path, rows)
+        write_sqlite(sqlite_path, rows)
+
+        engines = {}
+        startup = {}
+        for name, open_engine in (('csv', lambda: CSVFileManager(csv_path, indexed_columns=['C1', 'C2'])),
+                                  ('sqlite', lambda: SQLiteDatabase(sqlite_path))):
+            start = time.perf_counter()
+            engines[name] = open_engine()
+            startup[name] = time.perf_counter() - start
+
+        print(f"{args.rows} rows, best of {args.repeat}")
+        print(f"{'workload':<20}{'csv ms':>10}{'sqlite ms':>11}")
+        print(f"{'startup':<20}{startup['csv'] * 1000:>10.1f}{startup['sqlite'] * 1000:>11.1f}")
+        for name, workload in workloads(rows):
+            times = {engine: best_time(lambda: workload(db), args.repeat) for engine, db in engines.items()}
+            print(f"{name:<20}{times['csv'] * 1000:>10.1f}{times['sqlite'] * 1000:>11.1f}")
+        engines['sqlite'].close()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
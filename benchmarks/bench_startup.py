@@ -0,0 +1,70 @@
+"""
+Startup benchmark for a CSV-only worker.
+
+Boots fresh interpreters that import the server and initialize a CSV backend, and reports
+the median wall time and peak RSS. The 'eager' variant first imports every backend
+dependency the way main.py used to at import time (Flask-SQLAlchemy, PyMySQL, pika, redis,
+pybloom_live, redlock) to show what the lazy backend registry saves.
+
+Usage: python -m benchmarks.bench_startup [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BOOT = '''
+import json, resource, sys, time
+start = time.perf_counter()
+{preload}
+import main
+main.csv_database = main.CSVDatabase('csv', {path!r})
+elapsed = time.perf_counter() - start
+print(json.dumps({{'elapsed': elapsed, 'maxrss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  'modules': len(sys.modules)}}))
+'''
+
+EAGER_PRELOAD = 'import flask_sqlalchemy, pymysql, pika, redis, pybloom_live, redlock, sqlalchemy'
+
+
+def boot(preload, path, runs):
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = BOOT.format(preload=preload, path=path)
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], cwd=repo_root, capture_output=True, text=True, check=True)
+        samples.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+        f.write('C1,C2,C3\n')
+        for i in range(1000):
+            f.write(f'id{i},value {i},other {i}\n')
+        path = f.name
+    try:
+        print(f"{'variant':<10}{'boot ms':>10}{'peak RSS MB':>14}{'modules':>10}")
+        for name, preload in (('lazy', ''), ('eager', EAGER_PRELOAD)):
+            try:
+                samples = boot(preload, path, args.runs)
+            except subprocess.CalledProcessError as e:
+                print(f"{name:<10} failed: {e.stderr.strip().splitlines()[-1]}")
+                continue
+            elapsed = statistics.median(sample['elapsed'] for sample in samples) * 1000
+            rss = statistics.median(sample['maxrss_kb'] for sample in samples) / 1024
+            modules = samples[0]['modules']
+            print(f"{name:<10}{elapsed:>10.1f}{rss:>14.1f}{modules:>10}")
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,7 @@
+import functools
 from database.query_parser import QueryParser
 from database.data_modifier import DataModifier
+from metrics import STAGE_LATENCY
 
 class BusinessLogic:
     db = None
@@ -13,8 +15,59 @@ class BusinessLogic:
     
     @classmethod
     def query_data(cls, command):
-        return cls.db.query_records(cls.query_parser.parse_command(command))
+        return cls.query_page(command)[0]
+
+    @classmethod
+    def query_page(cls, command):
+        """
+        Runs a query and returns one page of results.
+
+        :param command: The query string.
+        :return: A tuple of (rows, next_cursor); next_cursor is None when there are no more matches.
+        """
+        with STAGE_LATENCY.time('parse'):
+            query = cls.query_parser.parse_command(command)
+        with STAGE_LATENCY.time('query'):
+            if query.limit is None:
+                return cls._run(query, None), None
+            # Fetch one extra row to learn whether another page exists
+            rows = cls._run(query, query.limit + 1)
+        if len(rows) > query.limit:
+            rows = rows[:query.limit]
+            return rows, query.next_cursor(len(rows))
+        return rows, None
     
+    @classmethod
+    def _run(cls, query, limit):
+        if query.aggregate is not None:
+            return cls.db.aggregate_records(query.conditions, query.aggregate.function, column=query.aggregate.column,
+                                            limit=limit, offset=query.offset)
+        return cls.db.query_records(query.conditions, columns=query.columns, limit=limit, offset=query.offset)
+
+    @classmethod
+    def estimate_rows(cls, command):
+        """Return the engine's estimate of how many rows the query's filter matches, from its statistics"""
+        return cls.db.estimate_rows(cls.query_parser.parse_command(command).conditions)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def normalize_query(command):
+        """
+        Returns the canonical form of a query string, memoized so that repeated
+        conditional requests do not have to re-parse the query.
+        """
+        return BusinessLogic.query_parser.parse_command(command).normalized()
+
     @classmethod
     def modify_data(cls, command):
         cls.data_modifier.parse_command(command)
+
+    @classmethod
+    def parse_batch(cls, commands):
+        """Parse a batch of commands without applying them; see DataModifier.parse_batch"""
+        return cls.data_modifier.parse_batch(commands)
+
+    @classmethod
+    def apply_batch(cls, operations):
+        """Apply a batch returned by parse_batch, skipping commands that failed to parse or to apply"""
+        return cls.data_modifier.apply_batch(operations)
@@ -0,0 +1,29 @@
+import importlib
+
+# db_type -> (module, class). Backends are imported on first use, so a CSV-only
+# process never loads SQLAlchemy, the MySQL driver or the Redis client.
+BACKENDS = {
+    'csv': ('database.csv_manager', 'CSVFileManager'),
+    'csv_shared': ('database.shared_csv_manager', 'SharedCSVFileManager'),
+    'mysql': ('database.mysql_manager', 'MySQLDatabase'),
+    'sqlite': ('database.sqlite_manager', 'SQLiteDatabase'),
+}
+
+
+def register_backend(db_type, module_name, class_name):
+    BACKENDS[db_type] = (module_name, class_name)
+
+
+def get_backend(db_type):
+    """
+    Returns the DatabaseInterface implementation registered for db_type, importing it on first use.
+
+    :param db_type: The backend name, as passed to /init.
+    :return: The backend class.
+    :raises ValueError: If no backend is registered under db_type.
+    """
+    try:
+        module_name, class_name = BACKENDS[db_type]
+    except KeyError:
+        raise ValueError("Unsupported database type")
+    return getattr(importlib.import_module(module_name), class_name)
@@ -0,0 +1,204 @@
+"""
+A counting Bloom filter of the records that exist, shared by every process through Redis.
+
+The filter is an array of 4-bit counters stored in one Redis string, the layout the BITFIELD
+command uses for 'u4' fields. Adding a key increments its counters and removing a key
+decrements them, both with one BITFIELD command; a key is absent when any of its counters is
+zero. Each process checks membership against a local copy of the array, so a check never
+leaves the process. The copy reflects this process's own changes immediately and is reloaded
+from Redis by a background thread every refresh_interval seconds to pick up the other
+processes' changes.
+
+A saturated counter no longer knows its true count, so it is never decremented. Redis'
+OVERFLOW SAT only clamps at the bounds, so updates go through a Lua script that skips
+counters already at COUNTER_MAX before incrementing the others.
+
+The filter only ever saves cache lookups: in the window before a process sees another
+process's addition, a check answers "absent" and the caller falls back to the database.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+
+import redis
+
+# a counter saturates here and is no longer decremented, since its true count is unknown
+COUNTER_MAX = 15
+
+# seconds between attempts to load a filter that another process has yet to build
+LOAD_RETRY_INTERVAL = 1.0
+
+# ARGV holds pairs of a '#<index>' offset and a delta; saturated counters are left alone
+UPDATE_SCRIPT = """
+for i = 1, #ARGV, 2 do
+    local value = redis.call('BITFIELD', KEYS[1], 'GET', 'u4', ARGV[i])[1]
+    if value < %d then
+        redis.call('BITFIELD', KEYS[1], 'OVERFLOW', 'SAT', 'INCRBY', 'u4', ARGV[i], ARGV[i + 1])
+    end
+end
+return #ARGV / 2
+""" % COUNTER_MAX
+
+
+def optimal_size(capacity, error_rate):
+    """Return the (counters, hashes) that give error_rate once capacity keys were added"""
+    counters = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+    hashes = max(1, int(round(counters / capacity * math.log(2))))
+    return counters, hashes
+
+
+def _get_counter(counters, index):
+    byte = counters[index >> 1]
+    return byte >> 4 if index % 2 == 0 else byte & 0x0F
+
+
+def _add_to_counter(counters, index, delta):
+    value = _get_counter(counters, index)
+    if value == COUNTER_MAX:
+        return
+    value = min(max(value + delta, 0), COUNTER_MAX)
+    byte = counters[index >> 1]
+    if index % 2 == 0:
+        counters[index >> 1] = (value << 4) | (byte & 0x0F)
+    else:
+        counters[index >> 1] = (byte & 0xF0) | value
+
+
+class SharedBloomFilter:
+    def __init__(self, client, key='bloom:record', capacity=1000000, error_rate=0.01, refresh_interval=30.0,
+                 clock=time.monotonic):
+        """
+        :param client: The Redis client holding the filter.
+        :param key: The Redis key of the counter array.
+        :param capacity: Number of keys the filter is sized for; beyond it the false positive rate rises.
+        :param error_rate: The false positive rate at capacity.
+        :param refresh_interval: Seconds between reloads of the local copy from Redis.
+        :param clock: Function returning the current time in seconds.
+        """
+        self.client = client
+        self.key = key
+        self.capacity = capacity
+        self.size, self.hashes = optimal_size(capacity, error_rate)
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self._update_script = client.register_script(UPDATE_SCRIPT)
+        # the local copy of the counters; None until loaded, and every key is reported as present
+        self._counters = None
+        # when the copy is next reloaded; None until the first load
+        self._next_refresh = None
+        self._reloader = None
+        self._reload_lock = threading.Lock()
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:], 'big') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def _empty(self):
+        return bytearray((self.size + 1) // 2)
+
+    def __contains__(self, key):
+        if self._next_refresh is not None and self.clock() >= self._next_refresh:
+            self._start_reload()
+        counters = self._counters
+        if counters is None:
+            return True
+        return all(_get_counter(counters, position) for position in self._positions(key))
+
+    def _start_reload(self):
+        # the array is megabytes at the default capacity, so it is not fetched on the caller's thread
+        with self._reload_lock:
+            if self._reloader is not None:
+                return
+            self._next_refresh = self.clock() + self.refresh_interval
+            reloader = self._reloader = threading.Thread(target=self._reload, daemon=True)
+        reloader.start()
+
+    def _reload(self):
+        try:
+            self.load()
+        except redis.RedisError as e:
+            logging.warning(f"Could not reload the Bloom filter, keeping the local copy: {e}")
+        finally:
+            with self._reload_lock:
+                self._reloader = None
+
+    def load(self):
+        """
+        Replaces the local copy with the counters stored in Redis.
+
+        While the filter is missing, because the process that claimed the rebuild has yet to
+        store it, the copy is dropped so that every key is reported as present, and loading
+        is retried every LOAD_RETRY_INTERVAL seconds.
+        """
+        data = self.client.get(self.key)
+        if not isinstance(data, bytes):
+            self._counters = None
+            self._next_refresh = self.clock() + min(LOAD_RETRY_INTERVAL, self.refresh_interval)
+            return
+        counters = self._empty()
+        counters[:len(data)] = data[:len(counters)]
+        self._counters = counters
+        self._next_refresh = self.clock() + self.refresh_interval
+
+    def update(self, added=(), removed=(), pipeline=None):
+        """
+        Adds and removes keys with one script call.
+
+        :param added: Keys of records that now exist.
+        :param removed: Keys of records that no longer exist.
+        :param pipeline: A pipeline to queue the command on instead of sending it.
+        """
+        changes = [(key, 1) for key in added] + [(key, -1) for key in removed]
+        if not changes:
+            return
+        arguments = []
+        for key, delta in changes:
+            for position in self._positions(key):
+                if self._counters is not None:
+                    _add_to_counter(self._counters, position, delta)
+                # sent even when the local copy is saturated; Redis decides from its own counter
+                arguments.extend((f'#{position}', delta))
+        self._update_script(keys=[self.key], args=arguments, client=pipeline)
+
+    def rebuild(self, keys):
+        """
+        Replaces the filter with one holding exactly keys, built locally and swapped in atomically.
+
+        Changes other processes make while the keys are read are lost until the next rebuild,
+        which at worst sends lookups of the records they added to the database.
+
+        :param keys: Iterable of the keys of every record.
+        """
+        counters = self._empty()
+        count = 0
+        for key in keys:
+            for position in self._positions(key):
+                _add_to_counter(counters, position, 1)
+            count += 1
+        if count > self.capacity:
+            logging.warning(f"Bloom filter {self.key} holds {count} keys, more than its capacity of {self.capacity}")
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.set(f'{self.key}:new', bytes(counters))
+        pipeline.rename(f'{self.key}:new', self.key)
+        pipeline.execute()
+        self._counters = counters
+        self._next_refresh = self.clock() + self.refresh_interval
+        logging.info(f"Rebuilt Bloom filter {self.key} from {count} keys")
+        return count
+
+    def rebuild_or_load(self, keys, interval=300):
+        """
+        Rebuilds the filter unless another process did so in the last interval seconds, in
+        which case its result is loaded, so that workers starting together scan the table once.
+
+        :param keys: Function returning an iterable of the keys of every record; only called to rebuild.
+        :param interval: Seconds during which a rebuild is not repeated.
+        """
+        if self.client.set(f'{self.key}:rebuilt', 1, nx=True, ex=interval):
+            self.rebuild(keys())
+        else:
+            self.load()
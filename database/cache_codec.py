@@ -0,0 +1,116 @@
+"""
+Encodings of the values cached in Redis.
+
+JsonCodec stores JSON text, the format every cached value used to have. PackedCodec stores the
+two shapes the cache is mostly made of without JSON's quoting: lists of strings, such as the
+record ids of a query result, and dictionaries of string to string, such as records. Both are
+laid out as a count followed by the strings joined by the ASCII unit separator, so decoding
+is one UTF-8 decode and one split. Other values, and strings containing the separator, are
+stored as compact JSON. Encoded values larger than compress_threshold are compressed with
+zlib when that makes them smaller.
+
+Packed values start with a header whose first byte can never start JSON text, so PackedCodec
+also reads values written by JsonCodec, and a cache can be switched over without a flush.
+"""
+import json
+import struct
+import zlib
+
+# Header: format version, kind of value, flags
+HEADER_FORMAT = '<BcB'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+PACKED_VERSION = 1
+COMPRESSED = 0x01
+
+LIST = b'L'
+DICT = b'D'
+JSON = b'J'
+
+COUNT_FORMAT = '<I'
+COUNT_SIZE = struct.calcsize(COUNT_FORMAT)
+SEPARATOR = '\x1f'
+
+
+class JsonCodec:
+    name = 'json'
+
+    def encode(self, value):
+        return json.dumps(value)
+
+    def decode(self, data):
+        return json.loads(data)
+
+
+def _pack_strings(strings):
+    """Return the packed strings, or None if one of them contains the separator"""
+    text = SEPARATOR.join(strings)
+    # n strings joined hold n - 1 separators unless a string contains one
+    if text.count(SEPARATOR) != max(len(strings) - 1, 0):
+        return None
+    return struct.pack(COUNT_FORMAT, len(strings)) + text.encode('utf-8')
+
+
+def _unpack_strings(body):
+    count, = struct.unpack_from(COUNT_FORMAT, body)
+    if count == 0:
+        return []
+    return body[COUNT_SIZE:].decode('utf-8').split(SEPARATOR)
+
+
+def _all_strings(values):
+    return all(type(value) is str for value in values)
+
+
+class PackedCodec:
+    name = 'packed'
+
+    def __init__(self, compress_threshold=1024, compress_level=1):
+        """
+        :param compress_threshold: Encoded size in bytes above which values are compressed.
+        :param compress_level: The zlib compression level; low levels trade size for speed.
+        """
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+
+    def encode(self, value):
+        kind = body = None
+        if type(value) is list and _all_strings(value):
+            kind, body = LIST, _pack_strings(value)
+        elif type(value) is dict and _all_strings(value) and _all_strings(value.values()):
+            kind, body = DICT, _pack_strings([string for item in value.items() for string in item])
+        if body is None:
+            kind, body = JSON, json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        flags = 0
+        if len(body) > self.compress_threshold:
+            compressed = zlib.compress(body, self.compress_level)
+            if len(compressed) < len(body):
+                body, flags = compressed, COMPRESSED
+        return struct.pack(HEADER_FORMAT, PACKED_VERSION, kind, flags) + body
+
+    def decode(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if not data or data[0] != PACKED_VERSION:
+            # written by JsonCodec
+            return json.loads(data)
+        _, kind, flags = struct.unpack_from(HEADER_FORMAT, data)
+        body = data[HEADER_SIZE:]
+        if flags & COMPRESSED:
+            body = zlib.decompress(body)
+        if kind == LIST:
+            return _unpack_strings(body)
+        elif kind == DICT:
+            strings = _unpack_strings(body)
+            return dict(zip(strings[::2], strings[1::2]))
+        return json.loads(body)
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec, PackedCodec)}
+
+
+def get_codec(name):
+    """Return a codec instance by name"""
+    try:
+        return CODECS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown cache codec: {name}")
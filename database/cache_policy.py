@@ -0,0 +1,236 @@
+"""
+Admission, eviction and expiry of the query results a process caches in Redis.
+
+Admission follows TinyLFU: the frequency of every query is estimated with a count-min sketch
+whose counters are halved every sample_size accesses, so that it reflects recent use. While
+the cached results fit in the byte budget every result is admitted; once they do not, a new
+result is only admitted if it is used more often than the results it would push out. Those
+victims are picked among the least recently used entries, preferring the ones whose frequency
+per byte is lowest, so one large result does not displace many small hot ones.
+
+Each result's TTL follows how often the data it depends on is written: the rate at which
+its generation counters are observed to move. A result stays cached for ttl_factor expected
+write intervals, so results over rarely written data stay long and results over hot data,
+which a write makes unreachable anyway, do not hold memory for an hour.
+
+The policy only sees the results this process caches, so its byte budget is this process's
+share of the query cache, and the sizes are estimated from the lengths of the cached strings.
+"""
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+# least recently used entries considered when picking a victim
+EVICTION_SAMPLE = 5
+# weight of the latest interval in the write rate average
+RATE_SMOOTHING = 0.3
+
+
+class FrequencySketch:
+    """A count-min sketch of access frequencies that halves its counters every sample_size accesses"""
+
+    def __init__(self, width=4096, depth=4, sample_size=None):
+        self.width = width
+        self.depth = depth
+        self.sample_size = sample_size or width * 10
+        self._rows = [array('I', [0]) * width for _ in range(depth)]
+        self._additions = 0
+
+    def _indexes(self, key):
+        return [hash((row, key)) % self.width for row in range(self.depth)]
+
+    def increment(self, key):
+        for row, index in zip(self._rows, self._indexes(key)):
+            row[index] += 1
+        self._additions += 1
+        if self._additions >= self.sample_size:
+            self._age()
+
+    def estimate(self, key):
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+
+    def _age(self):
+        for row in self._rows:
+            for index in range(self.width):
+                row[index] >>= 1
+        self._additions //= 2
+
+
+class _WriteRate:
+    __slots__ = ('generation', 'changed_at', 'rate')
+
+    def __init__(self, generation, now):
+        self.generation = generation
+        self.changed_at = now
+        self.rate = 0.0
+
+
+class CachePolicy:
+    def __init__(self, byte_budget=64 * 1024 * 1024, min_ttl=60, max_ttl=3600, ttl_factor=2.0, sketch_width=4096,
+                 clock=time.monotonic):
+        """
+        :param byte_budget: Estimated bytes of query results this process keeps cached.
+        :param min_ttl: Shortest TTL, in seconds, of a cached result.
+        :param max_ttl: Longest TTL, in seconds, of a cached result.
+        :param ttl_factor: How many expected write intervals a result stays cached.
+        :param sketch_width: Counters per row of the frequency sketch.
+        :param clock: Function returning the current time in seconds.
+        """
+        self.byte_budget = byte_budget
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.ttl_factor = ttl_factor
+        self.clock = clock
+        self.sketch = FrequencySketch(sketch_width)
+        # cache key -> (query, size, expires_at), least recently used first
+        self._entries = OrderedDict()
+        self._by_query = {}
+        self._write_rates = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def estimate_size(record_ids, records=()):
+        """Estimates the bytes a result takes in Redis from the lengths of its strings"""
+        size = sum(len(record_id) + 1 for record_id in record_ids)
+        for record in records:
+            size += sum(len(column) + len(str(value)) + 2 for column, value in record.items())
+        return size
+
+    def record_access(self, query, hit):
+        """
+        Counts one lookup of a query.
+
+        :param query: The query's identity, the same across generations.
+        :param hit: Whether its result was cached.
+        """
+        with self._lock:
+            self.sketch.increment(query)
+            if hit:
+                self.hits += 1
+                key = self._by_query.get(query)
+                if key is not None:
+                    self._entries.move_to_end(key)
+            else:
+                self.misses += 1
+
+    def observe_generations(self, keys, generations):
+        """Updates the write rate of each generation key from its current value"""
+        now = self.clock()
+        with self._lock:
+            for key, generation in zip(keys, generations):
+                rate = self._write_rates.get(key)
+                if rate is None:
+                    self._write_rates[key] = _WriteRate(generation, now)
+                elif generation != rate.generation:
+                    elapsed = max(now - rate.changed_at, 1e-3)
+                    latest = abs(generation - rate.generation) / elapsed
+                    rate.rate = latest if not rate.rate else RATE_SMOOTHING * latest + (1 - RATE_SMOOTHING) * rate.rate
+                    rate.generation = generation
+                    rate.changed_at = now
+
+    def ttl(self, keys):
+        """Return the TTL, in seconds, of a result depending on the given generation keys"""
+        now = self.clock()
+        total = 0.0
+        with self._lock:
+            for key in keys:
+                rate = self._write_rates.get(key)
+                if rate is not None and rate.rate:
+                    # a quiet spell since the last write lowers the rate
+                    total += min(rate.rate, 1.0 / max(now - rate.changed_at, 1e-3))
+        if not total:
+            return self.max_ttl
+        return int(min(max(self.ttl_factor / total, self.min_ttl), self.max_ttl))
+
+    def admit(self, key, query, size, ttl):
+        """
+        Decides whether to cache a result, making room for it if it is admitted.
+
+        :param key: The result's cache key.
+        :param query: The query's identity, as passed to record_access.
+        :param size: The result's estimated size in bytes.
+        :param ttl: The TTL the result is cached with.
+        :return: A tuple of (admitted, the cache keys of the results evicted to make room).
+        """
+        evicted = []
+        with self._lock:
+            now = self.clock()
+            if size > self.byte_budget:
+                self.rejected += 1
+                return False, evicted
+            self._remove(key)
+            old_key = self._by_query.get(query)
+            if old_key is not None:
+                # the result of an older generation is unreachable, it only holds memory
+                if self._entries[old_key][2] > now:
+                    evicted.append(old_key)
+                self._remove(old_key)
+            frequency = self.sketch.estimate(query)
+            victims = []
+            freed = 0
+            while self.bytes - freed + size > self.byte_budget:
+                victim = self._pick_victim(now, victims)
+                victim_query, victim_size, expires_at = self._entries[victim]
+                if expires_at > now and self.sketch.estimate(victim_query) >= frequency:
+                    self.rejected += 1
+                    self.evicted += len(evicted)
+                    return False, evicted
+                victims.append(victim)
+                freed += victim_size
+            for victim in victims:
+                if self._entries[victim][2] > now:
+                    evicted.append(victim)
+                self._remove(victim)
+            self.evicted += len(evicted)
+            self._entries[key] = (query, size, now + ttl)
+            self._by_query[query] = key
+            self.bytes += size
+            self.admitted += 1
+        return True, evicted
+
+    def _pick_victim(self, now, excluded):
+        """Return the expired or lowest frequency per byte entry among the least recently used ones"""
+        best = best_score = None
+        sampled = 0
+        for key, (query, size, expires_at) in self._entries.items():
+            if key in excluded:
+                continue
+            if expires_at <= now:
+                return key
+            score = self.sketch.estimate(query) / max(size, 1)
+            if best is None or score < best_score:
+                best, best_score = key, score
+            sampled += 1
+            if sampled >= EVICTION_SAMPLE:
+                break
+        return best
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            query, size, _ = entry
+            self.bytes -= size
+            if self._by_query.get(query) == key:
+                del self._by_query[query]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'bytes': self.bytes,
+                'budget_bytes': self.byte_budget,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else None,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'evicted': self.evicted,
+            }
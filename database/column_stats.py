@@ -0,0 +1,304 @@
+"""
+Per-column statistics for the engines: row count, distinct count, most common values
+and a histogram of value lengths, maintained incrementally as rows are written.
+"""
+import heapq
+import math
+
+from database.query_ast import DEFAULT_SELECTIVITY, plan, default_estimate
+
+
+class HyperLogLog:
+    """
+    Estimates the number of distinct values added, in 2 ** precision bytes.
+
+    Values are hashed with the interpreter's string hash, so estimates are only meaningful
+    within one process. Removing values is not supported: after deletes the estimate is an
+    upper bound until the sketch is rebuilt.
+    """
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+        self.alpha = 0.7213 / (1 + 1.079 / self.size)
+
+    def add(self, value):
+        hashed = hash(value) & 0xFFFFFFFFFFFFFFFF
+        register = hashed & (self.size - 1)
+        remaining = hashed >> self.precision
+        # position of the lowest set bit among the remaining 64 - precision bits
+        rank = (remaining & -remaining).bit_length() if remaining else 64 - self.precision + 1
+        if rank > self.registers[register]:
+            self.registers[register] = rank
+
+    def count(self):
+        estimate = self.alpha * self.size * self.size / sum(2.0 ** -register for register in self.registers)
+        empty = self.registers.count(0)
+        if estimate <= 2.5 * self.size and empty:
+            # linear counting is more accurate for small cardinalities
+            estimate = self.size * math.log(self.size / empty)
+        return int(round(estimate))
+
+
+class MostCommonValues:
+    """
+    Tracks the most frequent values with the Space-Saving algorithm.
+
+    At most capacity values are counted. While no value has ever been evicted the counts
+    are exact and cover every value seen; afterwards they may overestimate.
+
+    The value to evict is found with a min-heap of (count, value) entries. Changing a count
+    pushes a new entry and leaves the old one in place; entries that no longer match the
+    counts are skipped when popped and dropped when the heap is rebuilt.
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.counts = {}
+        self.exhaustive = True
+        self._heap = []
+
+    def _set(self, value, count):
+        self.counts[value] = count
+        if len(self._heap) >= 4 * self.capacity:
+            self._heap = [(current, key) for key, current in self.counts.items()]
+            heapq.heapify(self._heap)
+        else:
+            heapq.heappush(self._heap, (count, value))
+
+    def _pop_least(self):
+        while True:
+            count, value = heapq.heappop(self._heap)
+            if self.counts.get(value) == count:
+                del self.counts[value]
+                return count
+
+    def add(self, value):
+        if value in self.counts:
+            self._set(value, self.counts[value] + 1)
+        elif len(self.counts) < self.capacity:
+            self._set(value, 1)
+        else:
+            self._set(value, self._pop_least() + 1)
+            self.exhaustive = False
+
+    def remove(self, value):
+        count = self.counts.get(value)
+        if count is None:
+            return
+        if count <= 1:
+            del self.counts[value]
+        else:
+            self._set(value, count - 1)
+
+    def top(self, n):
+        return sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))[:n]
+
+
+class ColumnStatistics:
+    """Statistics for the values of one column."""
+
+    def __init__(self, column, mcv_capacity=64, precision=12):
+        self.column = column
+        self.distinct = HyperLogLog(precision)
+        self.most_common = MostCommonValues(mcv_capacity)
+        # length_counts[i] counts values whose length has bit_length i: 0, 1, 2-3, 4-7, ...
+        self.length_counts = []
+        self.empty_count = 0
+
+    def add(self, value):
+        value = value or ''
+        self.distinct.add(value)
+        self.most_common.add(value)
+        bucket = len(value).bit_length()
+        if bucket >= len(self.length_counts):
+            self.length_counts.extend([0] * (bucket + 1 - len(self.length_counts)))
+        self.length_counts[bucket] += 1
+        if not value:
+            self.empty_count += 1
+
+    def remove(self, value):
+        value = value or ''
+        self.most_common.remove(value)
+        bucket = len(value).bit_length()
+        if bucket < len(self.length_counts) and self.length_counts[bucket]:
+            self.length_counts[bucket] -= 1
+        if not value:
+            self.empty_count -= 1
+
+    def distinct_count(self, row_count):
+        if self.most_common.exhaustive:
+            return len(self.most_common.counts)
+        return max(min(self.distinct.count(), row_count), len(self.most_common.counts))
+
+    def length_histogram(self):
+        histogram = {}
+        for bucket, count in enumerate(self.length_counts):
+            if count:
+                low = 0 if bucket == 0 else 1 << (bucket - 1)
+                high = 0 if bucket == 0 else (1 << bucket) - 1
+                histogram[str(low) if low == high else f'{low}-{high}'] = count
+        return histogram
+
+    def fraction_at_least(self, length, row_count):
+        """Return an estimate of the fraction of values at least length characters long"""
+        if not row_count:
+            return 0.0
+        bucket = length.bit_length()
+        # the bucket holding length is counted in full, which overestimates
+        return min(sum(self.length_counts[bucket:]) / row_count, 1.0)
+
+
+class TableStatistics:
+    """
+    Statistics for every column of a table, updated by the engine on each write.
+
+    Removing rows keeps the counts, most common values and length histograms exact (or
+    conservative), but leaves the distinct-count sketch as an upper bound; needs_rebuild
+    reports when enough rows were removed that the engine should rebuild from its data.
+    """
+
+    def __init__(self, columns, rows=(), mcv_capacity=64, precision=12):
+        """
+        :param columns: The table's column names.
+        :param rows: Iterable of the table's current row dictionaries.
+        :param mcv_capacity: Number of values each column tracks the frequency of.
+        :param precision: HyperLogLog precision; each column's sketch takes 2 ** precision bytes.
+        """
+        self.mcv_capacity = mcv_capacity
+        self.precision = precision
+        self.rebuild(columns, rows)
+
+    def rebuild(self, columns, rows):
+        """
+        Recomputes the statistics from scratch.
+
+        :param columns: The table's column names.
+        :param rows: Iterable of row dictionaries.
+        """
+        self.columns = {column: ColumnStatistics(column, self.mcv_capacity, self.precision) for column in columns}
+        self.row_count = 0
+        self.removed_since_rebuild = 0
+        for row in rows:
+            self.add_row(row)
+
+    def add_row(self, row):
+        self.row_count += 1
+        for column, stats in self.columns.items():
+            stats.add(row.get(column))
+
+    def remove_row(self, row):
+        self.row_count -= 1
+        self.removed_since_rebuild += 1
+        for column, stats in self.columns.items():
+            stats.remove(row.get(column))
+
+    def update_value(self, column, old_value, new_value):
+        stats = self.columns.get(column)
+        if stats is None or old_value == new_value:
+            return
+        stats.remove(old_value)
+        stats.add(new_value)
+        self.removed_since_rebuild += 1
+
+    def needs_rebuild(self):
+        return self.removed_since_rebuild > max(self.row_count // 10, 100)
+
+    def equality_selectivity(self, column, value):
+        stats = self.columns[column]
+        if not self.row_count:
+            return 0.0
+        most_common = stats.most_common
+        if value in most_common.counts:
+            return min(most_common.counts[value] / self.row_count, 1.0)
+        if most_common.exhaustive:
+            return 0.0
+        rest_rows = max(self.row_count - sum(most_common.counts.values()), 0)
+        rest_distinct = max(stats.distinct_count(self.row_count) - len(most_common.counts), 1)
+        return rest_rows / rest_distinct / self.row_count
+
+    def selectivity(self, column, operator, value):
+        """
+        Estimates the fraction of rows a predicate matches.
+
+        :return: The estimated fraction, or None when the statistics say nothing about it.
+        """
+        stats = self.columns.get(column)
+        if stats is None:
+            return None
+        if not self.row_count:
+            return 0.0
+        most_common = stats.most_common
+        if operator == '==':
+            return self.equality_selectivity(column, value)
+        elif operator == '!=':
+            return 1.0 - self.equality_selectivity(column, value)
+        elif operator == 'IN':
+            return min(sum(self.equality_selectivity(column, item) for item in set(value)), 1.0)
+        elif most_common.exhaustive:
+            # every value is known with its exact count
+            matched = sum(count for cell_value, count in most_common.counts.items()
+                          if _matches(cell_value, operator, value))
+            return matched / self.row_count
+        elif operator == '$=':
+            return 1.0 / max(stats.distinct_count(self.row_count), 1)
+        elif operator in ('&=', '^='):
+            return stats.fraction_at_least(len(value), self.row_count) * DEFAULT_SELECTIVITY[operator]
+        return None
+
+    def estimate(self, predicate):
+        """
+        Estimates a predicate's cost and selectivity, in the form the query planner expects.
+
+        :return: A tuple of (cost, selectivity).
+        """
+        cost, selectivity = default_estimate(predicate)
+        estimated = self.selectivity(predicate.column, predicate.operator, predicate.value)
+        return cost, selectivity if estimated is None else estimated
+
+    def estimate_rows(self, expression):
+        """
+        Estimates how many rows a filter matches.
+
+        :param expression: A query_ast expression, or None for every row.
+        """
+        _, _, selectivity = plan(expression, self.estimate)
+        return int(round(selectivity * self.row_count))
+
+    def to_dict(self, top=10):
+        """
+        Returns the statistics as a JSON-serializable dictionary.
+
+        :param top: Number of most common values to list per column.
+        """
+        return {
+            'row_count': self.row_count,
+            'columns': {
+                column: {
+                    'distinct': stats.distinct_count(self.row_count),
+                    'empty': stats.empty_count,
+                    'most_common': [[value, count] for value, count in stats.most_common.top(top)],
+                    'length_histogram': stats.length_histogram(),
+                }
+                for column, stats in self.columns.items()
+            },
+        }
+
+
+def _matches(cell_value, operator, value):
+    if operator == '$=':
+        return cell_value.lower() == value.lower()
+    elif operator == '&=':
+        return value in cell_value
+    elif operator == '^=':
+        return cell_value.startswith(value)
+    elif operator == '<':
+        return cell_value < value
+    elif operator == '<=':
+        return cell_value <= value
+    elif operator == '>':
+        return cell_value > value
+    elif operator == '>=':
+        return cell_value >= value
+    raise ValueError(f"Unsupported operator: {operator}")
@@ -0,0 +1,135 @@
+from bisect import bisect_left, bisect_right
+
+# Sorts after every character, used as the upper bound of prefix ranges
+MAX_CHAR = '\U0010ffff'
+INF = float('inf')
+
+RANGE_OPERATORS = ('==', '<', '<=', '>', '>=', '^=', 'IN')
+
+
+class SortedIndex:
+    """
+    A bisect-based index over one column of the CSV table.
+
+    Entries are (value, seq, row) tuples kept in sorted order, where seq is the row's
+    position in insertion order. Lookups return (seq, row) pairs so callers can restore
+    the table's row order. Values compare as strings, the same way the VARCHAR columns
+    compare in MySQL.
+    """
+
+    def __init__(self, column):
+        self.column = column
+        self.entries = []
+
+    def build(self, rows_with_seq):
+        """
+        Rebuilds the index from scratch.
+
+        :param rows_with_seq: Iterable of (seq, row) pairs.
+        """
+        self.entries = sorted((row.get(self.column) or '', seq, row) for seq, row in rows_with_seq)
+
+    def add(self, seq, row):
+        entry = (row.get(self.column) or '', seq, row)
+        self.entries.insert(bisect_right(self.entries, entry[:2]), entry)
+
+    def remove(self, seq, value):
+        """
+        Removes the entry of the row with the given seq.
+
+        :param seq: The row's insertion sequence number.
+        :param value: The column value the row was indexed under.
+        """
+        position = bisect_left(self.entries, (value or '', seq))
+        if position < len(self.entries) and self.entries[position][1] == seq:
+            del self.entries[position]
+
+    def _slice(self, start, end):
+        return [(seq, row) for _, seq, row in self.entries[start:end]]
+
+    def _span(self, low=None, high=None, low_inclusive=True, high_inclusive=True):
+        if low is None:
+            start = 0
+        elif low_inclusive:
+            start = bisect_left(self.entries, (low,))
+        else:
+            start = bisect_right(self.entries, (low, INF))
+        if high is None:
+            end = len(self.entries)
+        elif high_inclusive:
+            end = bisect_right(self.entries, (high, INF))
+        else:
+            end = bisect_left(self.entries, (high,))
+        return start, max(start, end)
+
+    def spans(self, operator, value):
+        """
+        Returns the positions of the entries matching a single condition on the indexed column.
+
+        :param operator: One of RANGE_OPERATORS.
+        :param value: The condition value; a tuple of values for IN.
+        :return: List of (start, end) slices of self.entries.
+        """
+        if operator == '==':
+            return [self._span(value, value)]
+        elif operator == '<':
+            return [self._span(high=value, high_inclusive=False)]
+        elif operator == '<=':
+            return [self._span(high=value)]
+        elif operator == '>':
+            return [self._span(low=value, low_inclusive=False)]
+        elif operator == '>=':
+            return [self._span(low=value)]
+        elif operator == '^=':
+            return [self._span(value, value + MAX_CHAR, True, False)]
+        elif operator == 'IN':
+            return [self._span(item, item) for item in set(value)]
+        raise ValueError(f"Operator {operator} cannot use an index")
+
+    def count(self, operator, value):
+        """Return the number of rows matching the condition, without materializing them"""
+        return sum(end - start for start, end in self.spans(operator, value))
+
+    def lookup(self, operator, value):
+        """
+        Returns the rows matching a single condition on the indexed column.
+
+        :param operator: One of RANGE_OPERATORS.
+        :param value: The condition value; a tuple of values for IN.
+        :return: List of (seq, row) pairs.
+        """
+        matches = []
+        for start, end in self.spans(operator, value):
+            matches.extend(self._slice(start, end))
+        return matches
+
+    def value_counts(self):
+        """
+        Yields (value, count) for every distinct value, in value order, jumping over each
+        run of equal values with a bisect instead of visiting its entries.
+        """
+        position = 0
+        while position < len(self.entries):
+            value = self.entries[position][0]
+            end = bisect_right(self.entries, (value, INF), position)
+            yield value, end - position
+            position = end
+
+    def equal(self, value):
+        return self.lookup('==', value)
+
+    def range(self, low=None, high=None, low_inclusive=True, high_inclusive=True):
+        """
+        Returns the rows whose value lies between low and high.
+
+        :param low: Lower bound, or None for no lower bound.
+        :param high: Upper bound, or None for no upper bound.
+        :return: List of (seq, row) pairs in value order.
+        """
+        return self._slice(*self._span(low, high, low_inclusive, high_inclusive))
+
+    def prefix(self, prefix):
+        return self.lookup('^=', prefix)
+
+    def __len__(self):
+        return len(self.entries)
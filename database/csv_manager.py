@@ -1,19 +1,38 @@
 import csv
+import heapq
 import logging
+from collections import Counter
 from database.database_interface import DatabaseInterface
+from database.shared_table import SharedTableWriter
+from database.csv_index import SortedIndex, RANGE_OPERATORS
+from database.query_ast import Predicate, And, Or, from_conditions, plan
+from database.column_stats import TableStatistics
+from database.row_search import TableSearchText
 
 class CSVFileManager(DatabaseInterface):
-    def __init__(self, filepath):
+    def __init__(self, filepath, indexed_columns=None):
         """
         Initializes the CSVFileManager to read data from the specified filepath
         and write changes to the file at specified intervals if data has been modified.
 
         :param filepath: Path to the CSV file.
-        :param write_interval: Interval in seconds between checks for writing modified data to file.
+        :param indexed_columns: Columns to build a sorted index on, for range, prefix and IN lookups.
         """
         self.filepath = filepath
         self.data = self.read()
         self.data_modified = False
+        self.shared_table = None
+        # insertion sequence number of every row, keyed by id(row); it orders index lookups like the table
+        self.row_seq = {}
+        self.next_seq = 0
+        self.indexes = {}
+        for row in self.data or []:
+            self._assign_seq(row)
+        self.statistics = TableStatistics(self.get_columns(), self.data or [])
+        # built by the first '*' query after a write
+        self._search_text = None
+        for column in indexed_columns or []:
+            self.create_index(column)
 
     def read(self):
         """
@@ -52,56 +71,355 @@ class CSVFileManager(DatabaseInterface):
                     self.data_modified = False
         except Exception as e:
             logging.error(f"Failed to write data to {self.filepath}: {e}")
+        if self.statistics.needs_rebuild():
+            # deletes leave the distinct-count sketches overestimating
+            self.statistics.rebuild(self.get_columns(), self.data)
+        if self.shared_table is not None:
+            self.shared_table.publish(self.get_columns(), self.data)
+
+    def publish_to(self, table_name):
+        """
+        Publishes the table into shared memory under table_name, and republishes it after
+        every write, so SharedCSVFileManager instances in other processes can serve reads.
+
+        :param table_name: The shared memory name to publish under.
+        """
+        self.shared_table = SharedTableWriter(table_name)
+        self.shared_table.publish(self.get_columns(), self.data)
+
+    def create_index(self, column):
+        """
+        Builds a sorted index on a column. The index is kept up to date by every write.
+
+        :param column: The column to index.
+        :raises ValueError: If the column does not exist.
+        """
+        if column not in self.get_columns():
+            raise ValueError(f"Cannot index unknown column: {column}")
+        index = SortedIndex(column)
+        index.build((self.row_seq[id(row)], row) for row in self.data)
+        self.indexes[column] = index
+
+    def drop_index(self, column):
+        self.indexes.pop(column, None)
+
+    def _assign_seq(self, row):
+        seq = self.next_seq
+        self.next_seq += 1
+        self.row_seq[id(row)] = seq
+        return seq
+
+    def _rows_matching(self, conditions):
+        """Return the rows whose columns equal every value in conditions, probing an index when one applies"""
+        indexed = [column for column in conditions if column in self.indexes]
+        if indexed:
+            candidates = (row for _, row in sorted(self.indexes[indexed[0]].equal(conditions[indexed[0]]),
+                                                   key=lambda pair: pair[0]))
+        else:
+            candidates = self.data
+        return [row for row in candidates if all(row.get(k) == v for k, v in conditions.items())]
 
     def add_record(self, record):
         new_row = dict(zip(self.data[0].keys(), record))
         self.data.append(new_row)
+        seq = self._assign_seq(new_row)
+        for index in self.indexes.values():
+            index.add(seq, new_row)
+        self.statistics.add_row(new_row)
+        self._search_text = None
         self.data_modified = True
 
     def delete_record(self, conditions):
-        original_row_len = len(self.data)
-        self.data = [row for row in self.data if not all(row.get(k) == v for k, v in conditions.items())]
-        if original_row_len > len(self.data):
-            self.data_modified = True
+        removed = self._rows_matching(conditions)
+        if not removed:
+            return
+        removed_ids = set()
+        for row in removed:
+            seq = self.row_seq.pop(id(row))
+            removed_ids.add(id(row))
+            for column, index in self.indexes.items():
+                index.remove(seq, row.get(column))
+            self.statistics.remove_row(row)
+        self.data = [row for row in self.data if id(row) not in removed_ids]
+        self._search_text = None
+        self.data_modified = True
 
     def update_record(self, conditions, target_column, new_value):
-        for row in self.data:
-            if all(row.get(k) == v for k, v in conditions.items()):
+        index = self.indexes.get(target_column)
+        for row in self._rows_matching(conditions):
+            self.statistics.update_value(target_column, row.get(target_column), new_value)
+            if index is not None:
+                seq = self.row_seq[id(row)]
+                index.remove(seq, row.get(target_column))
+                row[target_column] = new_value
+                index.add(seq, row)
+            else:
                 row[target_column] = new_value
-                self.data_modified = True
+            self._search_text = None
+            self.data_modified = True
 
-    def query_records(self, query_conditions):
+    def query_records(self, query_conditions, columns=None, limit=None, offset=0):
+        """
+        Returns the rows matching the query conditions.
+
+        The filter is planned first: index probes narrow the rows to scan, and the remaining
+        predicates are ordered by cost and selectivity and short-circuited per row. The scan
+        stops as soon as offset + limit matches have been found, and the projection is only
+        applied to the rows that are actually returned.
+
+        :param query_conditions: An expression node or a legacy list of (column, operator, value, logic)
+            tuples; None or an empty list matches every row.
+        :param columns: Column names to project, or None for whole rows.
+        :param limit: Maximum number of rows to return, or None for no limit.
+        :param offset: Number of matching rows to skip.
+        :return: List of matching rows as dictionaries.
+        """
+        if columns is not None:
+            unknown_columns = [column for column in columns if column not in self.get_columns()]
+            if unknown_columns:
+                raise ValueError(f"Unknown columns: {', '.join(unknown_columns)}")
+        if limit == 0:
+            return []
+
+        candidates, residual = self._candidate_rows(from_conditions(query_conditions))
+        residual, _, _ = plan(residual, self.estimate_predicate)
         filtered_data = []
-        for row in self.data:
-            match = False
-            last_logic = 'and'
-            for i, condition in enumerate(query_conditions):
-                column, operator, value, logic = condition
-                condition_match = self.check_condition(row, (column, operator, value))
-                if last_logic == 'and':
-                    match = condition_match if i == 0 else match and condition_match
-                elif last_logic == 'or':
-                    match = match or condition_match
-                if logic == '':
-                    break
-                last_logic = logic
-            if match:
-                filtered_data.append(row)
+        skipped = 0
+        for row in candidates:
+            if not self.match_row(row, residual):
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            filtered_data.append(row if columns is None else {column: row.get(column) for column in columns})
+            if limit is not None and len(filtered_data) >= limit:
+                break
         return filtered_data
 
+    def aggregate_records(self, query_conditions, function, column=None, limit=None, offset=0):
+        """
+        Computes an aggregate over the rows matching the query conditions, without building result rows.
+
+        Counts are answered from the sorted indexes when the filter is a single indexed predicate,
+        and group counts over an indexed column with no filter are read off the index's runs.
+
+        :param query_conditions: An expression node or a legacy condition list; None or empty matches every row.
+        :param function: 'count', 'count_distinct' or 'group_count'.
+        :param column: The counted or grouped column.
+        :param limit: For 'group_count', the number of groups to return.
+        :param offset: For 'group_count', the number of groups to skip.
+        :return: [{'count': n}] for counts, or [{column: value, 'count': n}, ...] ordered by
+            descending count for group counts.
+        """
+        if column is not None and column not in self.get_columns():
+            raise ValueError(f"Unknown columns: {column}")
+        expression = from_conditions(query_conditions)
+        if function == 'count':
+            return [{'count': self._count_matching(expression)}]
+        if function not in ('count_distinct', 'group_count'):
+            raise ValueError(f"Unsupported aggregate: {function}")
+
+        index = self.indexes.get(column)
+        if expression is None and index is not None:
+            counts = index.value_counts()
+        else:
+            counts = Counter(row.get(column) or '' for row in self._matching_rows(expression)).items()
+        if function == 'count_distinct':
+            return [{'count': sum(1 for _ in counts)}]
+        order = lambda item: (-item[1], item[0])
+        if limit is None:
+            groups = sorted(counts, key=order)[offset:]
+        else:
+            groups = heapq.nsmallest(offset + limit, counts, key=order)[offset:]
+        return [{column: value, 'count': count} for value, count in groups]
+
+    def _count_matching(self, expression):
+        if expression is None:
+            return len(self.data)
+        if isinstance(expression, Predicate) and self._index_count(expression) is not None:
+            return self._index_count(expression)
+        return sum(1 for _ in self._matching_rows(expression))
+
+    def _matching_rows(self, expression):
+        candidates, residual = self._candidate_rows(expression)
+        residual, _, _ = plan(residual, self.estimate_predicate)
+        if residual is None:
+            return iter(candidates)
+        return (row for row in candidates if residual.evaluate(row, self.check_condition))
+
+    def estimate_predicate(self, predicate):
+        """
+        Estimates the per-row cost and selectivity of a predicate for the planner.
+
+        :return: A tuple of (cost, selectivity).
+        """
+        cost, selectivity = self.statistics.estimate(predicate)
+        if predicate.column == '*':
+            cost *= max(len(self.get_columns()), 1)
+        index = self.indexes.get(predicate.column)
+        if index is not None and predicate.operator in RANGE_OPERATORS and len(index):
+            # an index count is exact
+            selectivity = index.count(predicate.operator, predicate.value) / len(index)
+        return cost, selectivity
+
+    def get_statistics(self, top=10):
+        """
+        Returns the table's row count and per-column distinct counts, most common values
+        and value-length histograms.
+
+        :param top: Number of most common values to list per column.
+        """
+        return self.statistics.to_dict(top)
+
+    def estimate_rows(self, query_conditions):
+        """Return an estimate of the number of rows matching the query conditions, without scanning"""
+        return self.statistics.estimate_rows(from_conditions(query_conditions))
+
+    def _probe_method(self, predicate):
+        """
+        Returns how a predicate can be answered without scanning: 'index' for an indexed column,
+        'columns' for a '*' predicate when every column is indexed, 'search' for a '*' predicate
+        the table search text handles, or None.
+        """
+        if predicate.column != '*':
+            index = self.indexes.get(predicate.column)
+            return 'index' if index is not None and predicate.operator in RANGE_OPERATORS else None
+        columns = self.get_columns()
+        if predicate.operator in RANGE_OPERATORS and columns and all(column in self.indexes for column in columns):
+            return 'columns'
+        if TableSearchText.supports(predicate.operator, predicate.value):
+            return 'search'
+        return None
+
+    def _index_count(self, node):
+        """Return how many rows an index probe for node would yield, or None if node cannot be probed"""
+        if isinstance(node, Predicate):
+            method = self._probe_method(node)
+            if method == 'index':
+                return self.indexes[node.column].count(node.operator, node.value)
+            elif method == 'columns':
+                # rows matching in several columns are counted more than once
+                return sum(self.indexes[column].count(node.operator, node.value) for column in self.get_columns())
+            elif method == 'search':
+                return self._estimate_any_column(node)
+            return None
+        counts = [self._index_count(child) for child in node.children]
+        if isinstance(node, And):
+            counts = [count for count in counts if count is not None]
+            return min(counts) if counts else None
+        return None if None in counts else sum(counts)
+
+    def _estimate_any_column(self, predicate):
+        row_count = len(self.data)
+        if predicate.operator == '!=':
+            equal = Predicate(predicate.column, '==', predicate.value)
+            return row_count - self._estimate_any_column(equal)
+        fraction = 0.0
+        for column in self.get_columns():
+            _, selectivity = self.statistics.estimate(Predicate(column, predicate.operator, predicate.value))
+            fraction += selectivity
+        return int(min(fraction, 1.0) * row_count)
+
+    def _table_search(self):
+        if self._search_text is None:
+            self._search_text = TableSearchText(self.data, self.get_columns())
+        return self._search_text
+
+    def _index_probe(self, node):
+        """
+        Probes the indexes for the rows that can match node.
+
+        :return: A tuple of ({seq: row} of the candidate rows, whether the candidates match node exactly).
+        """
+        if isinstance(node, Predicate):
+            method = self._probe_method(node)
+            if method == 'index':
+                return dict(self.indexes[node.column].lookup(node.operator, node.value)), True
+            elif method == 'columns':
+                matches = {}
+                for column in self.get_columns():
+                    matches.update(self.indexes[column].lookup(node.operator, node.value))
+                return matches, True
+            data = self.data
+            row_seq = self.row_seq
+            return {row_seq[id(data[position])]: data[position]
+                    for position in self._table_search().rows_matching(node.operator, node.value)}, True
+        if isinstance(node, Or):
+            matches = {}
+            exact = True
+            for child in node.children:
+                child_matches, child_exact = self._index_probe(child)
+                matches.update(child_matches)
+                exact = exact and child_exact
+            return matches, exact
+        best = min((child for child in node.children if self._index_count(child) is not None), key=self._index_count)
+        matches, _ = self._index_probe(best)
+        return matches, len(node.children) == 1
+
+    def _candidate_rows(self, expression):
+        """
+        Narrows the rows a query has to scan using the sorted indexes and, for '*' predicates,
+        the table search text.
+
+        For a conjunction the probe-able child with the fewest index matches is probed, and
+        dropped from the filter when the probe answers it exactly; a disjunction is probed
+        only when every branch can be, as the union of the branches. Otherwise every row is
+        a candidate.
+
+        :return: A tuple of (candidate rows in table order, the filter left to evaluate on them).
+        """
+        if expression is None or self._index_count(expression) is None:
+            return self.data, expression
+        if isinstance(expression, And):
+            probed = min((child for child in expression.children if self._index_count(child) is not None),
+                         key=self._index_count)
+            matches, exact = self._index_probe(probed)
+            if exact:
+                rest = [child for child in expression.children if child is not probed]
+                residual = rest[0] if len(rest) == 1 else And(rest)
+            else:
+                residual = expression
+        else:
+            matches, exact = self._index_probe(expression)
+            residual = None if exact else expression
+        return [matches[seq] for seq in sorted(matches)], residual
+
+    def match_row(self, row, query_conditions):
+        """
+        Evaluates a filter against one row.
+
+        :param query_conditions: An expression node, a legacy condition list or None.
+        """
+        expression = from_conditions(query_conditions)
+        if expression is None:
+            return True
+        return expression.evaluate(row, self.check_condition)
+
     def check_condition(self, row, condition):
         column, operator, value = condition
         if column == '*':
-            return self.check_all_columns(row, operator, value)
+            return self.check_any_column(row, operator, value)
         else:
             cell_value = row.get(column, "")
             return self.evaluate_condition(cell_value, operator, value)
 
-    def check_all_columns(self, row, operator, value):
+    def check_any_column(self, row, operator, value):
+        """
+        Evaluates a '*' predicate: true when any column matches, except for '!=', which is true
+        when no column equals the value.
+        """
+        if operator == '==':
+            return value in row.values()
+        elif operator == '!=':
+            return value not in row.values()
+        elif operator == 'IN':
+            return any(cell_value in value for cell_value in row.values())
+        elif operator == '&=':
+            return any(value in cell_value for cell_value in row.values())
         for cell_value in row.values():
-            if not self.evaluate_condition(cell_value, operator, value):
-                return False
-        return True
+            if self.evaluate_condition(cell_value, operator, value):
+                return True
+        return False
 
     def evaluate_condition(self, cell_value, operator, value):
         if operator == '==':
@@ -112,6 +430,18 @@ class CSVFileManager(DatabaseInterface):
             return cell_value.lower() == value.lower()
         elif operator == '&=':
             return value in cell_value
+        elif operator == '<':
+            return cell_value < value
+        elif operator == '<=':
+            return cell_value <= value
+        elif operator == '>':
+            return cell_value > value
+        elif operator == '>=':
+            return cell_value >= value
+        elif operator == '^=':
+            return cell_value.startswith(value)
+        elif operator == 'IN':
+            return cell_value in value
         else:
             raise ValueError(f"Unsupported operator: {operator}")
 
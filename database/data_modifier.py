@@ -1,6 +1,6 @@
-import re
 from urllib.parse import unquote
 import logging
+from database.lexer import tokenize, STRING, WORD, PUNCT
 
 logger = logging.getLogger(__name__)
 
@@ -25,16 +25,69 @@ class DataModifier:
         :param command: A SQL-like command string (INSERT, DELETE, or UPDATE).
         :raises ValueError: If the command is not recognized.
         """
+        self.apply(self.parse(command))
+
+    def parse(self, command):
+        """
+        Parses a command without applying it.
+
+        :param command: A SQL-like command string (INSERT, DELETE, or UPDATE).
+        :return: ('insert', values), ('delete', conditions) or ('update', conditions, target_column, new_value).
+        :raises ValueError: If the command is not recognized or is malformed.
+        """
         command = unquote(command)
-        if command.startswith("INSERT"):
-            self.parse_insert(command[len("INSERT"):].strip())  
-        elif command.startswith("DELETE"):
-            self.parse_delete(command[len("DELETE"):].strip())  
-        elif command.startswith("UPDATE"):
-            self.parse_update(command[len("UPDATE"):].strip())
+        for keyword, parser in (("INSERT", self._parse_insert), ("DELETE", self._parse_delete),
+                                ("UPDATE", self._parse_update)):
+            if command.startswith(keyword):
+                return parser(tokenize(command[len(keyword):]))
+        raise ValueError("Unknown command")
+
+    def parse_batch(self, commands):
+        """
+        Parses a whole batch of commands before any of them is applied.
+
+        :param commands: Iterable of command strings.
+        :return: List with the parsed operation, or the ValueError raised, for each command in order.
+        """
+        parsed = []
+        for command in commands:
+            try:
+                parsed.append(self.parse(command))
+            except ValueError as e:
+                parsed.append(e)
+        return parsed
+
+    def apply_batch(self, operations):
+        """
+        Applies a batch parsed by parse_batch. Commands that failed to parse or to apply are
+        logged and skipped, so one bad command does not stop the rest of the batch.
+
+        :param operations: The list returned by parse_batch.
+        :return: The number of operations applied.
+        """
+        applied = 0
+        for operation in operations:
+            if isinstance(operation, ValueError):
+                logger.error("Skipping invalid command: %s", operation)
+                continue
+            try:
+                self.apply(operation)
+            except Exception:
+                logger.exception("Skipping command that failed to apply: %s", operation)
+                continue
+            applied += 1
+        return applied
+
+    def apply(self, operation):
+        """
+        Applies an operation returned by parse.
+        """
+        if operation[0] == 'insert':
+            self.db.add_record(operation[1])
+        elif operation[0] == 'delete':
+            self.db.delete_record(operation[1])
         else:
-            raise ValueError("Unknown command")
-    
+            self.db.update_record(*operation[1:])
 
     def parse_insert(self, command):
         """
@@ -43,22 +96,7 @@ class DataModifier:
         :param command: A SQL-like INSERT command string.
         :raises ValueError: If the command format is invalid or the column count does not match.
         """
-        # print(f"Command: {command}")
-        pattern = r'((?:"(?:[^"\\]|\\.)*"\s*,\s*)*(?:"(?:[^"\\]|\\.)*"))'
-        match = re.match(pattern, command)
-        if not match:
-            raise ValueError("Invalid INSERT command format.")
-        
-        values = re.findall(r'"((?:[^"\\]|\\.)*)"', match.group(1))
-        expected_columns_count = len(self.columns)
-        if len(values) != expected_columns_count:
-            raise ValueError(f"Column count mismatch. Expected {expected_columns_count}, got {len(values)}.")
-        
-        # process escape characters
-        processed_values = [value.replace('\\"', '"').replace('\\\\', '\\') for value in values]
-        
-        self.db.add_record(processed_values)
-
+        self.apply(self._parse_insert(tokenize(command)))
 
     def parse_delete(self, command):
         """
@@ -67,21 +105,7 @@ class DataModifier:
         :param command: A SQL-like DELETE command string.
         :raises ValueError: If the command format is invalid or does not match the expected column count.
         """
-        pattern = r'"((?:[^"\\]|\\.)*)"'
-        values = re.findall(pattern, command)
-        
-        if len(values) < 1:
-            raise ValueError("Too few conditions for DELETE command. Check conditions are surrounded by \"\".")
-        
-        expected_columns_count = len(self.columns)
-        if len(values) > expected_columns_count:
-            raise ValueError(f"Too many conditions for DELETE command. CSV file has {expected_columns_count} columns.")
-        
-        processed_values = [value.replace('\\"', '"').replace('\\\\', '\\') for value in values]
-
-        conditions_dict = {self.columns[i]: processed_values[i] for i in range(len(processed_values))}
-
-        self.db.delete_record(conditions_dict)
+        self.apply(self._parse_delete(tokenize(command)))
 
     def parse_update(self, command):
         """
@@ -90,24 +114,50 @@ class DataModifier:
         :param command: A SQL-like UPDATE command string.
         :raises ValueError: If the command format is invalid, conditions are not in pairs, or the target column does not exist.
         """
-        pattern = r'(?:"((?:[^"\\]|\\.)*)"|\b([A-Za-z0-9_]+)\b)'
-        parts = re.findall(pattern, command)
+        self.apply(self._parse_update(tokenize(command)))
+
+    def _parse_insert(self, tokens):
+        # the leading run of comma-separated quoted values; anything after it is ignored
+        values = []
+        for position, (kind, value) in enumerate(tokens):
+            if position % 2 == 0:
+                if kind != STRING:
+                    break
+                values.append(value)
+            elif kind != PUNCT or value != ',':
+                break
+        if not values:
+            raise ValueError("Invalid INSERT command format.")
 
-        flattened_parts = [quoted if quoted else unquoted for quoted, unquoted in parts]
-        
-        # print(flattened_parts)
-        if len(flattened_parts) < 3:
-            raise ValueError("UPDATE command must include at least one condition, target column, and a new value.")
+        expected_columns_count = len(self.columns)
+        if len(values) != expected_columns_count:
+            raise ValueError(f"Column count mismatch. Expected {expected_columns_count}, got {len(values)}.")
+        return ('insert', values)
+
+    def _parse_delete(self, tokens):
+        values = [value for kind, value in tokens if kind == STRING]
 
-        condition_parts = flattened_parts[:-2]
-        target_column = flattened_parts[-2]
-        new_value = flattened_parts[-1]
+        if len(values) < 1:
+            raise ValueError("Too few conditions for DELETE command. Check conditions are surrounded by \"\".")
+
+        expected_columns_count = len(self.columns)
+        if len(values) > expected_columns_count:
+            raise ValueError(f"Too many conditions for DELETE command. CSV file has {expected_columns_count} columns.")
+
+        return ('delete', dict(zip(self.columns, values)))
+
+    def _parse_update(self, tokens):
+        # conditions, target column and new value, quoted or bare; commas are optional
+        parts = [value for kind, value in tokens if kind == STRING or kind == WORD]
+
+        if len(parts) < 3:
+            raise ValueError("UPDATE command must include at least one condition, target column, and a new value.")
 
-        condition_parts = [part.replace('\\"', '"').replace('\\\\', '\\') for part in condition_parts]
-        new_value = new_value.replace('\\"', '"').replace('\\\\', '\\')
+        condition_parts = parts[:-2]
+        target_column = parts[-2]
+        new_value = parts[-1]
 
         if target_column not in self.columns:
             raise ValueError(f"Target column '{target_column}' does not exist in the CSV file.")
 
-        conditions_dict = {self.columns[i]: condition_parts[i] for i in range(min(len(condition_parts), len(self.columns)))}
-        self.db.update_record(conditions_dict, target_column, new_value)
\ No newline at end of file
+        return ('update', dict(zip(self.columns, condition_parts)), target_column, new_value)
@@ -23,9 +23,17 @@ class DatabaseInterface(ABC):
         pass
 
     @abstractmethod
-    def query_records(self, query_conditions):
+    def query_records(self, query_conditions, columns=None, limit=None, offset=0):
+        pass
+
+    @abstractmethod
+    def aggregate_records(self, query_conditions, function, column=None, limit=None, offset=0):
         pass
 
     @abstractmethod
     def get_columns(self):
         pass
+
+    @abstractmethod
+    def get_statistics(self, top=10):
+        pass
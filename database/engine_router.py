@@ -0,0 +1,172 @@
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError
+
+ROUTING_POLICIES = ('round_robin', 'least_connections')
+
+
+class _Replica:
+    def __init__(self, engine):
+        self.engine = engine
+        self.healthy = True
+        self.in_use = 0
+        self.retry_at = 0.0
+
+
+class EngineRouter:
+    """
+    Routes reads to read replicas and everything else to the primary.
+
+    Replicas are picked round-robin or by fewest reads in flight. A replica whose connection
+    fails is ejected, and its read is retried on the next candidate and finally on the primary.
+    Ejected replicas are probed with SELECT 1 once their retry interval has passed, and every
+    replica is re-probed each health_check_interval. The probes run in a background thread
+    started by the first read that finds a check due, so a hung replica never holds up a
+    read: reads only look at the health the last check recorded.
+
+    After a write, reads are pinned to the primary for pin_seconds, so a client reads its own
+    writes even when the replicas lag behind.
+    """
+
+    def __init__(self, primary_url, replica_urls=(), pool_size=5, max_overflow=10, pool_recycle=1800,
+                 policy='round_robin', pin_seconds=1.0, health_check_interval=30.0, retry_interval=5.0):
+        """
+        :param primary_url: Database URL of the primary, which takes every write.
+        :param replica_urls: Database URLs of the read replicas; reads go to the primary when empty.
+        :param pool_size: Connections kept open per engine.
+        :param max_overflow: Connections an engine may open beyond pool_size under load.
+        :param pool_recycle: Seconds after which a pooled connection is replaced, so that server-side
+            idle timeouts never hand out a dead connection.
+        :param policy: 'round_robin' or 'least_connections'.
+        :param pin_seconds: How long reads stay on the primary after a write.
+        :param health_check_interval: Seconds between probes of the healthy replicas.
+        :param retry_interval: Seconds an ejected replica waits before it is probed again.
+        :raises ValueError: If policy is not one of ROUTING_POLICIES.
+        """
+        if policy not in ROUTING_POLICIES:
+            raise ValueError(f"Unsupported routing policy: {policy}")
+        pool_options = {'pool_size': pool_size, 'max_overflow': max_overflow, 'pool_recycle': pool_recycle}
+        self.primary = create_engine(primary_url, **pool_options)
+        self.replicas = [_Replica(create_engine(url, **pool_options)) for url in replica_urls or ()]
+        self.policy = policy
+        self.pin_seconds = pin_seconds
+        self.health_check_interval = health_check_interval
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+        self._pinned_until = 0.0
+        self._next_health_check = time.monotonic() + health_check_interval
+        self._checker = None
+
+    def mark_written(self):
+        """Pins reads to the primary for the next pin_seconds; call after every committed write"""
+        self._pinned_until = time.monotonic() + self.pin_seconds
+
+    def is_pinned(self):
+        return time.monotonic() < self._pinned_until
+
+    def _probe(self, replica):
+        try:
+            with replica.engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+        except DBAPIError as e:
+            logging.warning(f"Read replica {replica.engine.url!r} failed its health check: {e}")
+            return False
+        return True
+
+    def _eject(self, replica):
+        with self._lock:
+            if replica.healthy:
+                logging.warning(f"Ejecting read replica {replica.engine.url!r}")
+            replica.healthy = False
+            replica.retry_at = time.monotonic() + self.retry_interval
+
+    def check_health(self, force=False):
+        """
+        Probes the replicas that are due: healthy ones every health_check_interval, ejected
+        ones once their retry interval has passed.
+
+        :param force: Probe every replica now.
+        """
+        now = time.monotonic()
+        with self._lock:
+            probe_healthy = force or now >= self._next_health_check
+            if probe_healthy:
+                self._next_health_check = now + self.health_check_interval
+            due = [replica for replica in self.replicas
+                   if force or (probe_healthy if replica.healthy else now >= replica.retry_at)]
+        for replica in due:
+            if self._probe(replica):
+                if not replica.healthy:
+                    logging.info(f"Read replica {replica.engine.url!r} is back in rotation")
+                replica.healthy = True
+            else:
+                self._eject(replica)
+
+    def _start_health_check(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._checker is not None:
+                return
+            if now < self._next_health_check and not any(
+                    not replica.healthy and now >= replica.retry_at for replica in self.replicas):
+                return
+            checker = self._checker = threading.Thread(target=self._run_health_check, daemon=True)
+        checker.start()
+
+    def _run_health_check(self):
+        try:
+            self.check_health()
+        finally:
+            with self._lock:
+                self._checker = None
+
+    def _candidates(self):
+        """Return the healthy replicas in the order they should be tried"""
+        self._start_health_check()
+        with self._lock:
+            healthy = [replica for replica in self.replicas if replica.healthy]
+            if not healthy:
+                return []
+            if self.policy == 'least_connections':
+                return sorted(healthy, key=lambda replica: replica.in_use)
+            start = next(self._turn) % len(healthy)
+            return healthy[start:] + healthy[:start]
+
+    @contextmanager
+    def read_connection(self):
+        """
+        Yields a connection for a read: a healthy replica's, or the primary's while pinned or
+        when no replica can be reached.
+
+        A replica that fails to hand out a connection is ejected and the next one is tried;
+        errors raised by the read itself are passed on unchanged.
+        """
+        replicas = [] if self.is_pinned() else self._candidates()
+        for replica in replicas:
+            with self._lock:
+                replica.in_use += 1
+            try:
+                try:
+                    connection = replica.engine.connect()
+                except DBAPIError:
+                    self._eject(replica)
+                    continue
+                with connection:
+                    yield connection
+                return
+            finally:
+                with self._lock:
+                    replica.in_use -= 1
+        with self.primary.connect() as connection:
+            yield connection
+
+    def dispose(self):
+        self.primary.dispose()
+        for replica in self.replicas:
+            replica.engine.dispose()
@@ -0,0 +1,233 @@
+"""
+Recommends indexes from the shapes of the queries an engine actually runs.
+
+Every query's filter is reduced to a shape, its values replaced by placeholders, and the
+advisor keeps the count and latency of each shape. Each indexable predicate of a shape is a
+candidate index on its column: a B-tree index for equality, range, IN and prefix predicates,
+a full-text index for substring and case-insensitive ones. Candidates whose shapes ran
+often and slowly enough are recommended; after an index is created, the latency of the
+shapes it serves is reported before and after, so the impact of each index is visible.
+"""
+import threading
+import time
+
+from database.query_ast import Predicate, And
+
+BTREE = 'index'
+FULLTEXT = 'fulltext'
+
+BTREE_OPERATORS = ('==', '<', '<=', '>', '>=', 'IN', '^=')
+FULLTEXT_OPERATORS = ('&=', '$=')
+
+
+def index_kind(operator):
+    """Return the kind of index that can serve operator, or None"""
+    if operator in BTREE_OPERATORS:
+        return BTREE
+    elif operator in FULLTEXT_OPERATORS:
+        return FULLTEXT
+    # '!=' matches most rows, an index would not be used
+    return None
+
+
+def query_shape(expression):
+    """
+    Normalizes a filter into its shape: values become placeholders and the children of
+    every group are sorted, so filters differing only in values or order share a shape.
+
+    :param expression: A query_ast expression, or None.
+    """
+    if expression is None:
+        return ''
+    if isinstance(expression, Predicate):
+        placeholder = '(?)' if expression.operator == 'IN' else '?'
+        return f'{expression.column} {expression.operator} {placeholder}'
+    joiner = ' and ' if isinstance(expression, And) else ' or '
+    parts = [query_shape(child) if isinstance(child, Predicate) else f'({query_shape(child)})'
+             for child in expression.children]
+    return joiner.join(sorted(parts))
+
+
+def shape_indexes(expression):
+    """Return the set of (column, kind) indexes that could serve some predicate of expression"""
+    if expression is None:
+        return set()
+    candidates = set()
+    for predicate in expression.predicates():
+        kind = index_kind(predicate.operator)
+        if kind is not None and predicate.column != '*':
+            candidates.add((predicate.column, kind))
+    return candidates
+
+
+class _ShapeStats:
+    def __init__(self, shape, indexes):
+        self.shape = shape
+        self.indexes = indexes
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+
+
+class IndexAdvisor:
+    """
+    Collects query shapes and turns them into index recommendations.
+
+    The advisor is independent of the engine: the engine reports each query with record(),
+    passes the indexes it already has to due() and report(), and tells the advisor which
+    indexes it created with mark_created().
+    """
+
+    def __init__(self, min_queries=100, min_mean_ms=20.0, max_shapes=1000):
+        """
+        :param min_queries: How many queries an index must be able to serve before it is recommended.
+        :param min_mean_ms: The mean latency, in milliseconds, those queries must exceed.
+        :param max_shapes: Number of distinct shapes tracked; further shapes are not recorded.
+        """
+        self.min_queries = min_queries
+        self.min_mean_ms = min_mean_ms
+        self.max_shapes = max_shapes
+        self.shapes = {}
+        # (column, kind) -> {'name', 'created_at', 'before': {shape: (count, total)}}
+        self.created = {}
+        self.pending = set()
+        # (column, kind) -> the error its creation failed with; failed indexes are not retried
+        self.failed = {}
+        self._lock = threading.Lock()
+
+    def record(self, expression, seconds):
+        """
+        Records one executed query.
+
+        :param expression: The query's filter, a query_ast expression or None.
+        :param seconds: How long the database took to answer it.
+        """
+        shape = query_shape(expression)
+        with self._lock:
+            stats = self.shapes.get(shape)
+            if stats is None:
+                if len(self.shapes) >= self.max_shapes:
+                    return
+                stats = self.shapes[shape] = _ShapeStats(shape, shape_indexes(expression))
+            stats.add(seconds)
+
+    def candidates(self):
+        """
+        Aggregates the recorded shapes per candidate index.
+
+        :return: Dictionary of (column, kind) -> {'queries', 'total_ms', 'shapes'}, where shapes
+            lists the shapes the index could serve.
+        """
+        candidates = {}
+        with self._lock:
+            for stats in self.shapes.values():
+                for index in stats.indexes:
+                    candidate = candidates.setdefault(index, {'queries': 0, 'total_ms': 0.0, 'shapes': []})
+                    candidate['queries'] += stats.count
+                    candidate['total_ms'] += stats.total * 1000
+                    candidate['shapes'].append(stats.shape)
+        return candidates
+
+    def _meets_thresholds(self, candidate):
+        return (candidate['queries'] >= self.min_queries
+                and candidate['total_ms'] / candidate['queries'] >= self.min_mean_ms)
+
+    def due(self, existing):
+        """
+        Returns the candidate indexes that crossed the thresholds and do not exist yet, and marks
+        them pending so that each one is only handed out once.
+
+        :param existing: Set of (column, kind) indexes the table already has.
+        :return: List of (column, kind), costliest first.
+        """
+        due = []
+        candidates = self.candidates()
+        for index, candidate in sorted(candidates.items(), key=lambda item: -item[1]['total_ms']):
+            if index in existing or index in self.created or index in self.pending or index in self.failed:
+                continue
+            if self._meets_thresholds(candidate):
+                due.append(index)
+        with self._lock:
+            due = [index for index in due if index not in self.pending]
+            self.pending.update(due)
+        return due
+
+    def mark_created(self, column, kind, name):
+        """
+        Records that an index was created; the latency of the shapes it serves is measured
+        from here on to report its impact.
+        """
+        with self._lock:
+            self.pending.discard((column, kind))
+            before = {stats.shape: (stats.count, stats.total)
+                      for stats in self.shapes.values() if (column, kind) in stats.indexes}
+            self.created[(column, kind)] = {'name': name, 'created_at': time.time(), 'before': before}
+
+    def mark_failed(self, column, kind, error):
+        """Records that creating an index failed; it is reported with the error and not handed out again"""
+        with self._lock:
+            self.pending.discard((column, kind))
+            self.failed[(column, kind)] = str(error)
+
+    def _impact(self, index):
+        created = self.created[index]
+        before_count = before_total = after_count = after_total = 0
+        with self._lock:
+            for shape, (count, total) in created['before'].items():
+                stats = self.shapes[shape]
+                before_count += count
+                before_total += total
+                after_count += stats.count - count
+                after_total += stats.total - total
+        return {
+            'before_queries': before_count,
+            'before_mean_ms': round(before_total * 1000 / before_count, 3) if before_count else None,
+            'after_queries': after_count,
+            'after_mean_ms': round(after_total * 1000 / after_count, 3) if after_count else None,
+        }
+
+    def report(self, existing, describe=None):
+        """
+        Lists every candidate index with its status and, for created indexes, their impact.
+
+        :param existing: Set of (column, kind) indexes the table already has.
+        :param describe: Optional function of (column, kind) returning extra details to
+            include, such as the statement that would create the index.
+        :return: List of dictionaries with 'column', 'kind', 'status', 'queries' and
+            'mean_ms', costliest first. status is 'created', 'pending', 'failed', 'exists',
+            'recommended' or 'below_threshold'.
+        """
+        report = []
+        candidates = self.candidates()
+        for index in self.created:
+            candidates.setdefault(index, {'queries': 0, 'total_ms': 0.0, 'shapes': []})
+        for (column, kind), candidate in sorted(candidates.items(), key=lambda item: -item[1]['total_ms']):
+            entry = {
+                'column': column,
+                'kind': kind,
+                'queries': candidate['queries'],
+                'mean_ms': round(candidate['total_ms'] / candidate['queries'], 3) if candidate['queries'] else None,
+                'shapes': sorted(candidate['shapes']),
+            }
+            if (column, kind) in self.created:
+                entry['status'] = 'created'
+                entry['name'] = self.created[(column, kind)]['name']
+                entry['impact'] = self._impact((column, kind))
+            elif (column, kind) in self.pending:
+                entry['status'] = 'pending'
+            elif (column, kind) in self.failed:
+                entry['status'] = 'failed'
+                entry['error'] = self.failed[(column, kind)]
+            elif (column, kind) in existing:
+                entry['status'] = 'exists'
+            elif self._meets_thresholds(candidate):
+                entry['status'] = 'recommended'
+            else:
+                entry['status'] = 'below_threshold'
+            if describe is not None and entry['status'] in ('recommended', 'below_threshold', 'pending', 'failed'):
+                entry.update(describe(column, kind))
+            report.append(entry)
+        return report
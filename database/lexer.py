@@ -0,0 +1,55 @@
+"""
+The lexer shared by QueryParser and DataModifier.
+
+tokenize() splits a command in one left-to-right pass of a single compiled pattern whose
+alternatives never backtrack, and unescapes quoted values on the way out: a backslash
+escapes a double quote or another backslash, and any other backslash is kept as written.
+"""
+import re
+
+STRING = 'string'
+WORD = 'word'
+OPERATOR = 'operator'
+PUNCT = 'punct'
+OTHER = 'other'
+
+# A double-quoted value, quotes included, and the comparison operators, longest first
+QUOTED_PATTERN = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+OPERATOR_PATTERN = r'==|!=|\$=|&=|\^=|<=|>=|<|>'
+
+# One alternative per token kind; the quoted value keeps its quotes so that "" is told apart
+# from a group that did not take part in the match
+_TOKEN_PATTERN = re.compile(
+    rf'({QUOTED_PATTERN})|([A-Za-z0-9_]+)|({OPERATOR_PATTERN})|([(),*])|(\S)', re.DOTALL)
+
+
+def unescape(value):
+    """Resolve the \\" and \\\\ escapes of a quoted value, leaving other backslashes as written"""
+    if '\\' not in value:
+        return value
+    # within a well-formed value backslashes pair up left to right, exactly as split finds them
+    return '\\'.join(part.replace('\\"', '"') for part in value.split('\\\\'))
+
+
+def _other(character):
+    if character == '"':
+        raise ValueError("Unterminated quoted value")
+    return (OTHER, character)
+
+
+def tokenize(text):
+    """
+    Splits a command into tokens.
+
+    :param text: The command or query string.
+    :return: List of (kind, value) tuples, where kind is STRING, WORD, OPERATOR, PUNCT or
+        OTHER. STRING values are unescaped; characters outside the grammar become OTHER
+        tokens, and it is up to the parser whether to reject them.
+    :raises ValueError: If a quoted value is not terminated.
+    """
+    return [(STRING, unescape(string[1:-1])) if string else
+            (WORD, word) if word else
+            (OPERATOR, operator) if operator else
+            (PUNCT, punct) if punct else
+            _other(other)
+            for string, word, operator, punct, other in _TOKEN_PATTERN.findall(text)]
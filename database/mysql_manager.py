@@ -1,18 +1,88 @@
-from sqlalchemy import create_engine, MetaData, Table, Column, String, inspect
+from sqlalchemy import MetaData, Table, Column, String, inspect, func, distinct, select, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql.expression import and_, or_
 from sqlalchemy.orm import sessionmaker, scoped_session
 from database.database_interface import DatabaseInterface
 from database.redis_manager import RedisManager
+from database.query_ast import Predicate, And, from_conditions, to_data, from_data
+from database.column_stats import TableStatistics
+from database.engine_router import EngineRouter
+from database.index_advisor import IndexAdvisor, BTREE, FULLTEXT
+from database.single_flight import SingleFlight
+from database.query_warmer import QueryWarmer
+from database.cache_policy import CachePolicy
+import json
+import threading
 import time
 import logging
 import traceback
+import pymysql
+import redis
+
+# lets 'mysql://' URLs use the pure-Python driver
+pymysql.install_as_MySQLdb()
 
 Base = declarative_base()
 
+# rows fetched per round trip when a result is streamed from a server-side cursor
+STREAM_CHUNK_SIZE = 1000
+
+# validity of the Redlock a process holds while it loads a missing query result, and how long
+# the other processes wait for it to announce the result before trying the lock again
+LOCK_TTL_MS = 1000
+# lock attempts before a query is run without the lock
+LOCK_ATTEMPTS = 5
+
+# expiry, in seconds, of the record keys filled from query results; every query returning a
+# record shares its key, so it does not take the adaptive TTL of any one query
+RECORD_TTL = 3600
+
+# seconds between checks whether the query log calls for a new index
+INDEX_CHECK_INTERVAL = 10.0
+# a prefix index is recommended when at most this fraction of the values is longer than the prefix
+PREFIX_INDEX_OVERFLOW = 0.05
+# MySQL's default ngram_token_size; shorter values cannot be searched in an ngram full-text index
+NGRAM_TOKEN_SIZE = 2
+# InnoDB drops every ngram containing a stopword from a full-text index, so advised full-text
+# indexes are built with stopwords disabled, and say so in their comment
+FULLTEXT_STOPWORDS_OFF = 'SET SESSION innodb_ft_enable_stopword = 0'
+FULLTEXT_STOPWORDS_DEFAULT = 'SET SESSION innodb_ft_enable_stopword = DEFAULT'
+STOPWORD_FREE_COMMENT = 'ngram, no stopwords'
+
 class MySQLDatabase(DatabaseInterface):
-    def __init__(self, db_url, table_name='record'):
-        self.engine = create_engine(db_url)
+    def __init__(self, db_url, table_name='record', replica_urls=None, routing_policy='round_robin', pool_size=5,
+                 max_overflow=10, pin_seconds=1.0, auto_index=False, index_min_queries=100, index_min_mean_ms=20.0,
+                 near_cache_size=10000, near_cache_ttl=5.0, bloom_capacity=1000000, cache_codec='packed',
+                 warm_top_k=50, warm_rate=10.0, query_cache_bytes=64 * 1024 * 1024, min_query_ttl=60,
+                 max_query_ttl=3600):
+        """
+        :param db_url: Database URL of the primary, which takes every write.
+        :param table_name: The table holding the records.
+        :param replica_urls: Database URLs of read replicas of the primary; reads are spread over them.
+        :param routing_policy: 'round_robin' or 'least_connections'.
+        :param pool_size: Connections kept open per engine.
+        :param max_overflow: Connections an engine may open beyond pool_size under load.
+        :param pin_seconds: How long reads stay on the primary after a write, to cover replication lag.
+        :param auto_index: Create the indexes the query log calls for as soon as they cross the thresholds.
+        :param index_min_queries: How many queries an index must be able to serve before it is recommended.
+        :param index_min_mean_ms: The mean latency, in milliseconds, those queries must exceed.
+        :param near_cache_size: Records and query results kept decoded in this process in front of Redis;
+            0 disables the near cache.
+        :param near_cache_ttl: Seconds a near-cache entry is served without asking Redis.
+        :param bloom_capacity: Number of records the shared Bloom filter of existing records is sized for.
+        :param cache_codec: Encoding of the values cached in Redis, 'packed' or 'json'.
+        :param warm_top_k: Number of the hottest queries re-run in the background on startup and after
+            writes, so that they stay cached; 0 disables warming.
+        :param warm_rate: Maximum number of queries a warm-up runs per second.
+        :param query_cache_bytes: Estimated bytes of query results this process keeps in Redis; beyond
+            it, results are only cached if they are used more often than the ones they push out.
+        :param min_query_ttl: Shortest TTL, in seconds, of a cached query result.
+        :param max_query_ttl: Longest TTL, in seconds, of a cached query result, used for data that is
+            not written; results over often written data get shorter TTLs.
+        """
+        self.router = EngineRouter(db_url, replica_urls, pool_size=pool_size, max_overflow=max_overflow,
+                                   policy=routing_policy, pin_seconds=pin_seconds)
+        self.engine = self.router.primary
         self.metadata = MetaData()
 
         # Create table if not exists
@@ -23,8 +93,30 @@ class MySQLDatabase(DatabaseInterface):
         self.metadata.reflect(self.engine)
         self.Session = scoped_session(sessionmaker(bind=self.engine))
         self.Record = self.dynamic_table_class(table_name)
-        self.column_names = [column.name for column in self.Record.__table__.columns]
-        self.redis = RedisManager()
+        # reads go through SQLAlchemy Core on the table; the ORM class is only used for writes
+        self.table = self.Record.__table__
+        self.column_names = [column.name for column in self.table.columns]
+        # bumped by inserts, deletes and primary key changes; updates of another column bump its own
+        self.generation_key = f'generation:{table_name}'
+        self.redis = RedisManager(near_cache_size=near_cache_size, near_cache_ttl=near_cache_ttl,
+                                  bloom_capacity=bloom_capacity, codec=cache_codec)
+        self.redis.rebuild_bloom_filter(self._scan_record_keys)
+        # built by the first call that needs it, then kept up to date by this instance's writes
+        self._statistics = None
+        self.advisor = IndexAdvisor(index_min_queries, index_min_mean_ms)
+        self.auto_index = auto_index
+        # (column, kind) of the table's indexes, reflected on first use
+        self._indexes = None
+        # columns whose full-text index was built without stopwords, reflected with the indexes
+        self._stopword_free = set()
+        self._next_index_check = 0.0
+        self.single_flight = SingleFlight()
+        self.cache_policy = CachePolicy(query_cache_bytes, min_query_ttl, max_query_ttl)
+        self.warmer = None
+        if warm_top_k:
+            self.warmer = QueryWarmer(self.redis.client, f'hot_queries:{table_name}', self._warm_query,
+                                      top_k=warm_top_k, rate=warm_rate)
+            self.warmer.request()
         logging.debug(f"Initialized MySQLDatabase with table: {table_name}, columns: {self.column_names}")
 
     def create_table(self, table_name):
@@ -65,13 +157,9 @@ class MySQLDatabase(DatabaseInterface):
         
     def read(self):
         logging.debug("Reading all records")
-        session = self.Session()
-        try:
-            result = session.query(self.Record).all()
-            logging.debug(f"Read {len(result)} records")
-            return [record.__dict__ for record in result]
-        finally:
-            session.close()
+        records = [dict(row) for row in self._scan_rows()]
+        logging.debug(f"Read {len(records)} records")
+        return records
     
     def write(self):
         pass
@@ -83,6 +171,7 @@ class MySQLDatabase(DatabaseInterface):
             new_record = self.Record(**dict(zip(self.column_names, record)))
             session.add(new_record)
             session.commit()
+            self.router.mark_written()
             logging.debug("Record added successfully")
 
             # Update Redis cache
@@ -92,7 +181,10 @@ class MySQLDatabase(DatabaseInterface):
             logging.debug(f"Record dictionary: {record_dict} of type {type(record_dict)}")
             self.redis.set(record_key, record_dict)
             self.redis.add_to_bloom_filter(record_key)
-            self._invalidate_related_query_cache(new_record.C1)
+            if self._statistics is not None:
+                self._statistics.add_row(record_dict)
+            self.redis.bump_generations([self.generation_key])
+            self._request_warm_up()
         except Exception as e:
             logging.error(f"Error adding record: {e}")
             logging.error(traceback.format_exc())
@@ -102,165 +194,500 @@ class MySQLDatabase(DatabaseInterface):
 
     def update_record(self, conditions, target_column, new_value):
         logging.debug(f"Updating records with conditions: {conditions}, setting {target_column} to {new_value}")
-        session = self.Session()
+        if target_column not in self.column_names:
+            logging.error(f"Error updating records: unknown column {target_column}")
+            return
         try:
-            query = session.query(self.Record)
-            for key, value in conditions.items():
-                query = query.filter(getattr(self.Record, key) == value)
-            records = query.all()
-            updated_count = query.update({getattr(self.Record, target_column): new_value})
-            session.commit()
-            logging.debug(f"Updated {updated_count} records")
-
-            # Update Redis cache
-            for record in records:
-                updated_record = session.query(self.Record).filter(self.Record.C1 == record.C1).first()
-                record_dict = updated_record.to_dict()
-                logging.debug(f"Setting Redis key: record:{updated_record.C1} with value: {record_dict}")
-                self.redis.set(f'record:{updated_record.C1}', record_dict)
-                self._invalidate_related_query_cache(updated_record.C1)
+            with self.engine.begin() as connection:
+                # the matched rows are locked until the UPDATE commits, so the rows read here
+                # plus the new value are exactly what the UPDATE writes, with no re-fetch
+                old_rows = self._lock_rows(connection, conditions)
+                if not old_rows:
+                    return
+                result = connection.execute(
+                    self.table.update().where(self._conditions_clause(conditions)).values({target_column: new_value}))
+            self.router.mark_written()
+            logging.debug(f"Updated {result.rowcount} records")
         except Exception as e:
             logging.error(f"Error updating records: {e}")
             logging.error(traceback.format_exc())
-            session.rollback()
-        finally:
-            session.close()
-    
+            return
+        if self._statistics is not None:
+            for row in old_rows:
+                self._statistics.update_value(target_column, row[target_column], new_value)
+
+        # Update Redis cache
+        updated_rows = [dict(row, **{target_column: new_value}) for row in old_rows]
+        try:
+            if target_column == 'C1':
+                # a row whose C1 is set to its current value keeps its record key
+                old_ids = [row['C1'] for row in old_rows]
+                self.redis.refresh_records(updated_rows, [record_id for record_id in old_ids if record_id != new_value],
+                                           [] if new_value in old_ids else [new_value],
+                                           generation_keys=[self.generation_key])
+            else:
+                self.redis.refresh_records(updated_rows, generation_keys=[f'{self.generation_key}:{target_column}'])
+        except redis.RedisError as e:
+            # the update is committed; the cached copies expire with their TTL
+            logging.error(f"Error refreshing the cache after an update: {e}")
+            return
+        self._request_warm_up()
+
     def delete_record(self, conditions):
         logging.debug(f"Deleting records with conditions: {conditions}")
-        session = self.Session()
         try:
-            query = session.query(self.Record)
-            for key, value in conditions.items():
-                query = query.filter(getattr(self.Record, key) == value)
-            records = query.all()
-            deleted_count = query.delete()
-            session.commit()
-            logging.debug(f"Deleted {deleted_count} records successfully")
-
-            # Update Redis cache
-            for record in records:
-                logging.debug(f"Deleting Redis key: record:{record.C1}")
-                self.redis.delete(f'record:{record.C1}')
-                self._invalidate_related_query_cache(record.C1)
+            with self.engine.begin() as connection:
+                removed_rows = self._lock_rows(connection, conditions)
+                if not removed_rows:
+                    return
+                result = connection.execute(self.table.delete().where(self._conditions_clause(conditions)))
+            self.router.mark_written()
+            logging.debug(f"Deleted {result.rowcount} records successfully")
         except Exception as e:
             logging.error(f"Error deleting records: {e}")
-            session.rollback()
-        finally:
-            session.close()
+            return
+        if self._statistics is not None:
+            for row in removed_rows:
+                self._statistics.remove_row(row)
+
+        # Update Redis cache
+        try:
+            self.redis.refresh_records([], [row['C1'] for row in removed_rows], generation_keys=[self.generation_key])
+        except redis.RedisError as e:
+            logging.error(f"Error refreshing the cache after a delete: {e}")
+            return
+        self._request_warm_up()
+
+    def _conditions_clause(self, conditions):
+        return and_(*[self.table.c[column] == value for column, value in conditions.items()])
+
+    def _lock_rows(self, connection, conditions):
+        """Returns the rows matching the equality conditions as dictionaries, locking them until the transaction ends"""
+        statement = self.table.select().where(self._conditions_clause(conditions)).with_for_update()
+        return [dict(row) for row in connection.execute(statement).mappings()]
 
-    def query_records(self, query_conditions):
-        logging.debug(f"Querying records with conditions: {query_conditions}")
-        query_key = f"query:{query_conditions}"
-        cached_result = self.redis.get_query_result(query_key)
+    def query_records(self, query_conditions, columns=None, limit=None, offset=0):
+        logging.debug(f"Querying records with conditions: {query_conditions}, columns: {columns}, limit: {limit}, offset: {offset}")
+        expression = from_conditions(query_conditions)
+        self._check_columns(self._filter_columns(expression) + list(columns or []))
+        if self.warmer is not None:
+            self.warmer.record(json.dumps([to_data(expression), columns, limit, offset]))
+        return self._query(expression, columns, limit, offset)
+
+    def _filter_columns(self, expression):
+        if expression is None:
+            return []
+        return [predicate.column for predicate in expression.predicates() if predicate.column != '*']
+
+    def _check_columns(self, columns):
+        unknown_columns = [column for column in dict.fromkeys(columns) if column not in self.column_names]
+        if unknown_columns:
+            raise ValueError(f"Unknown columns: {', '.join(unknown_columns)}")
+
+    def _warm_query(self, query):
+        expression, columns, limit, offset = json.loads(query)
+        # warm-ups are not lookups users made, so the cache policy does not count them
+        self._query(from_data(expression), columns, limit, offset, count_access=False)
+
+    def _request_warm_up(self):
+        # the write moved generations, so the hot queries are no longer cached
+        if self.warmer is not None:
+            self.warmer.request()
+
+    def _query(self, expression, columns, limit, offset, count_access=True):
+        # identifies the query across generations
+        query = repr(expression)
+        if columns is not None or limit is not None or offset:
+            query = f"{query}|{columns}|{limit}|{offset}"
+        # the generations are read before the database is queried: a result cached while a
+        # write commits ends up under the older generations, which the write bumps past
+        keys = self._generation_keys(expression)
+        generations, query_key, cached_result = self.redis.lookup_query(keys, query)
+        self.cache_policy.observe_generations(keys, generations)
+        if count_access:
+            self.cache_policy.record_access(query, cached_result is not None)
         if cached_result is not None:
             logging.debug("Cache hit for query")
-            results = []
-            for record_id in cached_result:
-                record_key = f"record:{record_id}"
-                if self.redis.check_bloom_filter(record_key) is None:
-                    return []
-                record = self.redis.get(record_key)
-                if record:
-                    results.append(record)
-                else:
-                    lock = self.redis.acquire_lock(record_key)
-                    if lock:
-                        try:
-                            record = self._query_database_by_id(record_id)
-                            if record:
-                                result.append(record)
-                                self.redis.set(record_id, record.to_dict(), ex=3600)
-                            else:
-                                self.redis.cache_null(record_key)
-                        finally:
-                            self.redis.release_lock(lock)
-                    else:
-                        # If lock is not acquired, retry after a short delay
-                        time.sleep(0.1)
-                        record = self.redis.get(record_key)
-                        if record:
-                            results.append(record)
-            return results
-        else:
-            lock = self.redis.acquire_lock(query_key)
+            return self._project(self._cached_records(cached_result), columns)
+        # concurrent misses of the same query in this process share one load
+        records = self.single_flight.do(
+            query_key, lambda: self._load_query(query_key, query, expression, columns, limit, offset))
+        return self._project(records, columns)
+
+    def _load_query(self, query_key, query, expression, columns, limit, offset):
+        """
+        Loads the result of a query missing from the cache. Across processes, the Redlock lets
+        one process query the database while the others wait for it to announce the result.
+        Database errors are raised to the caller.
+        """
+        for _ in range(LOCK_ATTEMPTS):
+            # the lock has a key of its own, since Redlock stores its token under the key it locks
+            lock = self.redis.acquire_lock(f'lock:{query_key}', LOCK_TTL_MS)
             if lock:
                 try:
-                    # double check if query was cached by another thread
+                    # double check if query was cached by another process
                     cached_result = self.redis.get_query_result(query_key)
                     if cached_result is not None:
-                        return [self.redis.get(f"record:{record_id}") for record_id in cached_result]
-                    session = self.Session()
-                    try:
-                        query = session.query(self.Record)
-                        conditions_list = []
-                        for condition in query_conditions:
-                            column, operator, value, logic = condition
-                            if operator == '==':
-                                cond = getattr(self.Record, column) == value
-                            elif operator == '!=':
-                                cond = getattr(self.Record, column) != value
-                            elif operator == '$=':
-                                cond = getattr(self.Record, column).ilike(f'%{value}%')
-                            elif operator == '&=':
-                                cond = getattr(self.Record, column).contains(value)
-                            else:
-                                raise ValueError(f"Unsupported operator: {operator}")
-                            
-                            conditions_list.append((cond, logic))
-
-                        # Combine conditions with AND/OR logic
-                        combined_conditions = []
-                        current_conditions = []
-
-                        for cond, logic in conditions_list:
-                            current_conditions.append(cond)
-                            if logic.lower() == 'or':
-                                combined_conditions.append(and_(*current_conditions))
-                                current_conditions = []
-                        
-                        if current_conditions:
-                            combined_conditions.append(and_(*current_conditions))
-                        
-                        if combined_conditions:
-                            final_condition = or_(*combined_conditions)
-                            query = query.filter(final_condition)
-
-                        result = query.all()
-                        logging.debug(f"Queried {len(result)} records")
-                        record_ids = [record.C1 for record in result]
-                        self.redis.set_query_result(query_key, record_ids, ex=3600)
-                        for record in result:
-                            record_key = f"record:{record.C1}"
-                            self.redis.set(record_key, record.to_dict(), ex=3600)
-                            self.redis.add_related_query_key(record.C1, query_key)
-                        return [record.to_dict() for record in result]
-                    except Exception as e:
-                        logging.error(f"Error querying records: {e}")
-                        session.close()
-                    finally:
-                        session.close()
+                        return self._cached_records(cached_result)
+                    return self._select_and_cache(query_key, query, expression, columns, limit, offset)
                 finally:
                     self.redis.release_lock(lock)
+            cached_result = self.redis.wait_for_query_result(query_key, LOCK_TTL_MS / 1000)
+            if cached_result is not None:
+                return self._cached_records(cached_result)
+        logging.warning(f"Could not lock {query_key}, querying without the lock")
+        return self._select_and_cache(query_key, query, expression, columns, limit, offset)
+
+    def _select_and_cache(self, query_key, query, expression, columns, limit, offset):
+        start = time.perf_counter()
+        records = self._select_rows(expression, columns, limit, offset)
+        self._record_query(expression, time.perf_counter() - start)
+        logging.debug(f"Queried {len(records)} records")
+        record_ids = [record['C1'] for record in records]
+        cached_records = records if columns is None else ()
+        ttl = self.cache_policy.ttl(self._generation_keys(expression))
+        admitted, evicted = self.cache_policy.admit(
+            query_key, query, self.cache_policy.estimate_size(record_ids, cached_records), ttl)
+        if evicted:
+            self.redis.delete_many(evicted)
+        if admitted:
+            self.redis.cache_query_result(query_key, record_ids, cached_records, ex=ttl, record_ex=RECORD_TTL)
+        return records
+
+    def aggregate_records(self, query_conditions, function, column=None, limit=None, offset=0):
+        """
+        Computes an aggregate over the rows matching the query conditions with a SQL aggregate.
+
+        Aggregates are not cached in Redis.
+
+        :param query_conditions: An expression node or a legacy condition list; None or empty matches every row.
+        :param function: 'count', 'count_distinct' or 'group_count'.
+        :param column: The counted or grouped column.
+        :param limit: For 'group_count', the number of groups to return.
+        :param offset: For 'group_count', the number of groups to skip.
+        :return: [{'count': n}] for counts, or [{column: value, 'count': n}, ...] ordered by
+            descending count for group counts.
+        """
+        logging.debug(f"Aggregating {function}({column}) with conditions: {query_conditions}")
+        expression = from_conditions(query_conditions)
+        self._check_columns(self._filter_columns(expression) + ([column] if column is not None else []))
+        final_condition = self._build_filter(expression)
+        if function == 'count':
+            statement = select(func.count()).select_from(self.table)
+        elif function == 'count_distinct':
+            statement = select(func.count(distinct(self.table.c[column])))
+        elif function == 'group_count':
+            grouped = self.table.c[column]
+            count = func.count().label('count')
+            statement = select(grouped, count)
+        else:
+            raise ValueError(f"Unsupported aggregate: {function}")
+        if final_condition is not None:
+            statement = statement.where(final_condition)
+        if function == 'group_count':
+            statement = statement.group_by(grouped).order_by(count.desc(), grouped).offset(offset)
+            if limit is not None:
+                statement = statement.limit(limit)
+        start = time.perf_counter()
+        with self.router.read_connection() as connection:
+            result = connection.execute(statement)
+            if function != 'group_count':
+                aggregates = [{'count': result.scalar()}]
             else:
-                # If lock is not acquired, retry after a short delay
-                time.sleep(0.1)
-                return self.query_records(query_conditions)
-    
-    def _query_database_by_id(self, record_id):
-        session = self.Session()
+                aggregates = [{column: value, 'count': group_count} for value, group_count in result]
+        self._record_query(expression, time.perf_counter() - start)
+        return aggregates
+
+    def _select_rows(self, expression, columns=None, limit=None, offset=0):
+        """
+        Runs the query as a Core select and returns the rows as plain dictionaries.
+
+        Condition values and paging are sent as bound parameters, so queries of the same shape
+        share one compiled statement in the engine's statement cache. The result is streamed
+        from a server-side cursor in chunks of STREAM_CHUNK_SIZE rows, and no ORM objects or
+        identity map entries are created.
+
+        :param expression: An expression node, or None to match every row.
+        :param columns: The columns to select; the primary key is always selected so that the
+            result ids can be cached. None selects every column.
+        :param limit: Maximum number of rows to return.
+        :param offset: Number of matching rows to skip.
+        :return: List of dictionaries keyed by the selected column names.
+        """
+        if columns is None:
+            selected = self.column_names
+        else:
+            selected = ['C1'] + [column for column in columns if column != 'C1']
+        statement = select(*[self.table.c[column] for column in selected])
+        if expression is not None:
+            statement = statement.where(self._compile_expression(expression))
+        if limit is not None or offset:
+            # Pages must come back in a stable order
+            statement = statement.order_by(self.table.c.C1).offset(offset)
+            if limit is not None:
+                statement = statement.limit(limit)
+        records = []
+        with self.router.read_connection() as connection:
+            result = connection.execution_options(stream_results=True, yield_per=STREAM_CHUNK_SIZE).execute(statement)
+            for partition in result.partitions():
+                records.extend(dict(zip(selected, row)) for row in partition)
+        return records
+
+    def _build_filter(self, query_conditions):
+        """
+        Compiles a filter into a SQLAlchemy clause.
+
+        :param query_conditions: An expression node, a legacy condition list or None.
+        :return: The clause, or None when every row matches.
+        """
+        expression = from_conditions(query_conditions)
+        if expression is None:
+            return None
+        return self._compile_expression(expression)
+
+    def _compile_expression(self, node):
+        if isinstance(node, Predicate):
+            return self._compile_predicate(node.column, node.operator, node.value)
+        clauses = [self._compile_expression(child) for child in node.children]
+        return and_(*clauses) if isinstance(node, And) else or_(*clauses)
+
+    def _compile_predicate(self, column, operator, value):
+        if column == '*':
+            # any column matches; for != no column equals the value
+            clauses = [self._compile_predicate(name, operator, value) for name in self.column_names]
+            return and_(*clauses) if operator == '!=' else or_(*clauses)
+        table_column = self.table.c[column]
+        if operator == '==':
+            return table_column == value
+        elif operator == '!=':
+            return table_column != value
+        elif operator == '$=':
+            return self._full_text_narrowed(column, value, table_column.ilike(f'%{value}%'))
+        elif operator == '&=':
+            return self._full_text_narrowed(column, value, table_column.contains(value))
+        elif operator == '<':
+            return table_column < value
+        elif operator == '<=':
+            return table_column <= value
+        elif operator == '>':
+            return table_column > value
+        elif operator == '>=':
+            return table_column >= value
+        elif operator == '^=':
+            # a left-anchored LIKE can be served by a B-tree index
+            return table_column.startswith(value, autoescape=True)
+        elif operator == 'IN':
+            return table_column.in_(list(value))
+        raise ValueError(f"Unsupported operator: {operator}")
+
+    def _full_text_narrowed(self, column, value, clause):
+        """
+        Prefixes a substring clause with a full-text match when the column has an ngram
+        full-text index, so that the index finds the candidate rows; the LIKE then checks them.
+
+        Only indexes known to be built without stopwords are used: with InnoDB's default
+        stopword list an ngram index leaves out every ngram containing one, and the match
+        would drop rows the LIKE alone finds.
+        """
+        if (self.engine.dialect.name != 'mysql' or (column, FULLTEXT) not in self._existing_indexes()
+                or column not in self._stopword_free or len(value) < NGRAM_TOKEN_SIZE or '"' in value or any(character.isspace() for character in value)):
+            return clause
+        # a quoted phrase in boolean mode matches the value's ngrams in sequence
+        return and_(self.table.c[column].match(f'"{value}"'), clause)
+
+    def _existing_indexes(self):
+        """Return the set of (column, kind) the table has an index on, by the index's leading column"""
+        if self._indexes is None:
+            indexes = {(column.name, BTREE) for column in list(self.table.primary_key.columns)[:1]}
+            for index in inspect(self.engine).get_indexes(self.table.name):
+                column_names = index.get('column_names') or []
+                if not column_names or column_names[0] is None:
+                    continue
+                flavor = index.get('type') or index.get('dialect_options', {}).get('mysql_prefix')
+                indexes.add((column_names[0], FULLTEXT if flavor == 'FULLTEXT' else BTREE))
+            if self.engine.dialect.name == 'mysql' and any(kind == FULLTEXT for _, kind in indexes):
+                self._stopword_free = self._stopword_free_columns()
+            self._indexes = indexes
+        return self._indexes
+
+    def _stopword_free_columns(self):
+        """Return the columns whose full-text index carries the comment of one built without stopwords"""
+        statement = text("SELECT COLUMN_NAME FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() "
+                         "AND TABLE_NAME = :table AND INDEX_TYPE = 'FULLTEXT' AND SEQ_IN_INDEX = 1 "
+                         "AND INDEX_COMMENT = :comment")
+        with self.engine.connect() as connection:
+            return set(connection.execute(statement, {'table': self.table.name, 'comment': STOPWORD_FREE_COMMENT})
+                       .scalars())
+
+    def _record_query(self, expression, seconds):
+        self.advisor.record(expression, seconds)
+        if not self.auto_index or time.monotonic() < self._next_index_check:
+            return
+        self._next_index_check = time.monotonic() + INDEX_CHECK_INTERVAL
+        for column, kind in self.advisor.due(self._existing_indexes()):
+            # built in the background, the query that crossed the threshold does not wait for it
+            threading.Thread(target=self.create_advised_index, args=(column, kind), daemon=True).start()
+
+    def _prefix_length(self, column):
+        """Return a prefix length covering nearly every value of column, or None if the whole column should be indexed"""
+        declared = getattr(self.table.c[column].type, 'length', None)
+        statistics = self.statistics
+        column_statistics = statistics.columns.get(column)
+        if declared is None or column_statistics is None or not statistics.row_count:
+            return None
+        for bits in range(3, 8):
+            length = 1 << bits
+            if length >= declared:
+                break
+            if column_statistics.fraction_at_least(length, statistics.row_count) <= PREFIX_INDEX_OVERFLOW:
+                return length
+        return None
+
+    def _index_statement(self, column, kind):
+        """
+        Returns the name and the DDL statement of an advised index, or a None statement if
+        this database cannot build that kind of index. On MySQL the index is built online.
+        """
+        quote = self.engine.dialect.identifier_preparer.quote
+        name = f"{'ft' if kind == FULLTEXT else 'ix'}_{self.table.name}_{column}"
+        table, quoted_column, quoted_name = quote(self.table.name), quote(column), quote(name)
+        if self.engine.dialect.name != 'mysql':
+            if kind == FULLTEXT:
+                return name, None
+            return name, f'CREATE INDEX {quoted_name} ON {table} ({quoted_column})'
+        if kind == FULLTEXT:
+            # InnoDB builds full-text indexes in place, but blocks writes while it does; the
+            # statement must run after FULLTEXT_STOPWORDS_OFF in the same session
+            return name, (f'ALTER TABLE {table} ADD FULLTEXT INDEX {quoted_name} ({quoted_column}) WITH PARSER ngram '
+                          f"COMMENT '{STOPWORD_FREE_COMMENT}', ALGORITHM=INPLACE, LOCK=SHARED")
+        prefix = self._prefix_length(column)
+        part = f'{quoted_column}({prefix})' if prefix else quoted_column
+        return name, f'ALTER TABLE {table} ADD INDEX {quoted_name} ({part}), ALGORITHM=INPLACE, LOCK=NONE'
+
+    def _describe_index(self, column, kind):
+        name, statement = self._index_statement(column, kind)
+        if statement is not None and kind == FULLTEXT:
+            statement = f'{FULLTEXT_STOPWORDS_OFF}; {statement}'
+        return {'name': name, 'statement': statement}
+
+    def create_advised_index(self, column, kind):
+        """
+        Creates an index the advisor recommends, and starts measuring its impact.
+
+        :param column: The indexed column.
+        :param kind: index_advisor.BTREE or index_advisor.FULLTEXT.
+        """
+        name, statement = self._index_statement(column, kind)
+        if statement is None:
+            self.advisor.mark_failed(column, kind, f"{kind} indexes are not supported on {self.engine.dialect.name}")
+            return
+        logging.info(f"Creating index {name}: {statement}")
         try:
-            record = session.query(self.Record).filter(self.Record.C1 == record_id).first()
-            return record.to_dict()
-        finally:
-            session.close()
+            with self.engine.begin() as connection:
+                if kind == FULLTEXT:
+                    connection.execute(text(FULLTEXT_STOPWORDS_OFF))
+                try:
+                    connection.execute(text(statement))
+                finally:
+                    if kind == FULLTEXT:
+                        # the connection goes back to the pool
+                        connection.execute(text(FULLTEXT_STOPWORDS_DEFAULT))
+        except Exception as e:
+            logging.error(f"Error creating index {name}: {e}")
+            self.advisor.mark_failed(column, kind, e)
+            return
+        self._indexes = None
+        self.advisor.mark_created(column, kind, name)
+
+    def index_advice(self):
+        """
+        Lists the indexes the query log calls for: every column and index kind that recorded
+        queries could use, with the number and mean latency of those queries, whether the index
+        exists, was created by the advisor or is recommended, the statement that would create
+        it, and for created indexes the latency of their queries before and after.
+        """
+        return self.advisor.report(self._existing_indexes(), self._describe_index)
+
+    def _generation_keys(self, expression):
+        """Return the keys of the table's generation and those of the columns the filter reads"""
+        columns = set()
+        if expression is not None:
+            for predicate in expression.predicates():
+                columns.update(self.column_names if predicate.column == '*' else [predicate.column])
+        return [self.generation_key] + [f'{self.generation_key}:{column}' for column in sorted(columns)]
+
+    def _project(self, records, columns):
+        if columns is None:
+            return records
+        return [{column: record.get(column) for column in columns} for record in records if record]
+
+    def _cached_records(self, record_ids):
+        """
+        Returns the records of a cached query result: one MGET for the cached records, and one
+        SELECT for the ones missing from the cache, which are then cached in one pipeline.
+
+        :param record_ids: The ids of the result's records, in order.
+        :return: The records in the order of record_ids, leaving out records that no longer exist.
+        """
+        records = self.redis.get_many([f"record:{record_id}" for record_id in record_ids])
+        missing = [record_id for record_id, record in zip(record_ids, records) if record is None]
+        if missing:
+            found = self._query_database_by_ids(missing)
+            self.redis.set_many({f"record:{record_id}": found.get(record_id) for record_id in missing}, ex=RECORD_TTL)
+            records = [record if record is not None else found.get(record_id)
+                       for record_id, record in zip(record_ids, records)]
+        return [record for record in records if record]
+
+    def _query_database_by_ids(self, record_ids):
+        """Return {C1: record} for the records with the given ids that exist"""
+        with self.router.read_connection() as connection:
+            rows = connection.execute(select(self.table).where(self.table.c.C1.in_(record_ids))).mappings()
+            return {row['C1']: dict(row) for row in rows}
+
+    @property
+    def statistics(self):
+        if self._statistics is None or self._statistics.needs_rebuild():
+            self._statistics = TableStatistics(self.column_names, self._scan_rows())
+        return self._statistics
+
+    def _scan_record_keys(self):
+        with self.router.read_connection() as connection:
+            result = connection.execution_options(stream_results=True).execute(select(self.table.c.C1))
+            for partition in result.scalars().partitions(STREAM_CHUNK_SIZE):
+                for record_id in partition:
+                    yield f'record:{record_id}'
+
+    def _scan_rows(self):
+        # streamed in chunks, so building the statistics never holds the whole table in memory
+        with self.router.read_connection() as connection:
+            result = connection.execution_options(stream_results=True).execute(self.table.select())
+            for partition in result.mappings().partitions(STREAM_CHUNK_SIZE):
+                yield from partition
+
+    def get_statistics(self, top=10):
+        """
+        Returns the table's row count and per-column distinct counts, most common values
+        and value-length histograms.
+
+        The statistics are computed with one streamed scan the first time they are needed and
+        then updated by this instance's writes; writes made by other processes are only picked
+        up when enough local deletes trigger a rebuild.
+
+        :param top: Number of most common values to list per column.
+        """
+        return self.statistics.to_dict(top)
+
+    def estimate_rows(self, query_conditions):
+        """Return an estimate of the number of rows matching the query conditions"""
+        return self.statistics.estimate_rows(from_conditions(query_conditions))
 
-    def _invalidate_related_query_cache(self, record_id):
-        related_query_keys = self.redis.get_related_query_keys(record_id)
-        for query_key in related_query_keys:
-            logging.debug(f"Deleting related Redis query key: {query_key}")
-            self.redis.delete(query_key)
-            self.redis.remove_related_query_key(record_id, query_key)
+    def version_tag(self):
+        """
+        Return a string identifying the version of the table shared by every process: the
+        generations of the table and of each of its columns, which all writes bump.
+        """
+        keys = self._generation_keys(None) + [f'{self.generation_key}:{column}' for column in self.column_names]
+        return '.'.join(str(generation) for generation in self.redis.get_generations(keys))
 
     def get_columns(self):
         return self.column_names
\ No newline at end of file
@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+
+# returned by get() for absent and expired keys, since None can be a cached value
+MISSING = object()
+# invalidation counters are kept per stripe of keys rather than per key, so they take fixed memory
+INVALIDATION_STRIPES = 1024
+
+
+class NearCache:
+    """
+    A bounded in-process LRU cache with a time to live, kept in front of Redis.
+
+    Values are stored decoded and handed out as they are, so callers must not modify them.
+    The TTL bounds how stale an entry can get when an invalidation never arrives.
+
+    A value read from Redis can be invalidated while it is in flight. Callers take a version of
+    the key before the read and store the value with fill(), which drops it if the key was
+    invalidated since, instead of putting the old value back.
+    """
+
+    def __init__(self, capacity=10000, ttl=5.0, clock=time.monotonic):
+        """
+        :param capacity: Maximum number of entries; the least recently used entry is evicted first.
+        :param ttl: Seconds an entry stays valid after it was stored.
+        :param clock: Function returning the current time in seconds.
+        """
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._invalidations = [0] * INVALIDATION_STRIPES
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the value cached under key, or MISSING"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._set(key, value)
+
+    def _set(self, key, value):
+        self._entries[key] = (value, self.clock() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def version(self, key):
+        """Return a token that changes whenever key is invalidated, to pass to fill()"""
+        return self._invalidations[hash(key) % INVALIDATION_STRIPES]
+
+    def fill(self, key, value, version):
+        """
+        Stores a value read from the backing store, unless key was invalidated since version was taken.
+
+        :return: True if the value was stored.
+        """
+        with self._lock:
+            if self._invalidations[hash(key) % INVALIDATION_STRIPES] != version:
+                return False
+            self._set(key, value)
+            return True
+
+    def delete(self, keys):
+        """Evicts every key in keys"""
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                self._invalidations[hash(key) % INVALIDATION_STRIPES] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._invalidations = [count + 1 for count in self._invalidations]
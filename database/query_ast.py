@@ -0,0 +1,201 @@
+"""
+Boolean filter expressions shared by the query parser and every engine.
+
+A filter is a tree of Predicate, And and Or nodes. 'and' binds tighter than 'or', and
+parentheses group explicitly. The planner reorders the children of And/Or nodes so the
+cheapest and most decisive predicates run first, and evaluation short-circuits.
+"""
+
+# Per-row evaluation cost of each operator, relative to an equality check
+OPERATOR_COSTS = {
+    '==': 1.0, '!=': 1.0, 'IN': 1.2,
+    '<': 1.1, '<=': 1.1, '>': 1.1, '>=': 1.1,
+    '^=': 1.5, '$=': 3.0, '&=': 4.0,
+}
+
+# Fraction of rows a predicate is assumed to match when nothing better is known
+DEFAULT_SELECTIVITY = {
+    '==': 0.05, '!=': 0.95, 'IN': 0.05,
+    '<': 0.33, '<=': 0.33, '>': 0.33, '>=': 0.33,
+    '^=': 0.1, '$=': 0.05, '&=': 0.2,
+}
+
+
+class Predicate:
+    """A single condition: column operator value. The column may be '*' for all columns."""
+
+    __slots__ = ('column', 'operator', 'value')
+
+    def __init__(self, column, operator, value):
+        self.column = column
+        self.operator = operator
+        self.value = value
+
+    def evaluate(self, row, check_condition):
+        return check_condition(row, (self.column, self.operator, self.value))
+
+    def predicates(self):
+        yield self
+
+    def __eq__(self, other):
+        return isinstance(other, Predicate) and (self.column, self.operator, self.value) == (other.column, other.operator, other.value)
+
+    def __hash__(self):
+        return hash((self.column, self.operator, self.value))
+
+    def __repr__(self):
+        return f"Predicate({self.column!r}, {self.operator!r}, {self.value!r})"
+
+
+class _Group:
+    __slots__ = ('children',)
+
+    def __init__(self, children):
+        self.children = list(children)
+
+    def predicates(self):
+        for child in self.children:
+            yield from child.predicates()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.children == other.children
+
+    def __hash__(self):
+        return hash((type(self).__name__, tuple(self.children)))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.children!r})"
+
+
+class And(_Group):
+    """True when every child is true; stops at the first false child."""
+
+    __slots__ = ()
+
+    def evaluate(self, row, check_condition):
+        for child in self.children:
+            if not child.evaluate(row, check_condition):
+                return False
+        return True
+
+
+class Or(_Group):
+    """True when any child is true; stops at the first true child."""
+
+    __slots__ = ()
+
+    def evaluate(self, row, check_condition):
+        for child in self.children:
+            if child.evaluate(row, check_condition):
+                return True
+        return False
+
+
+def make_group(group_class, children):
+    """Build an And/Or node, flattening nested groups of the same kind and single-child groups"""
+    flattened = []
+    for child in children:
+        if isinstance(child, group_class):
+            flattened.extend(child.children)
+        else:
+            flattened.append(child)
+    if len(flattened) == 1:
+        return flattened[0]
+    return group_class(flattened)
+
+
+def from_conditions(query_conditions):
+    """
+    Converts the flat (column, operator, value, logic) condition list into an expression,
+    with 'and' binding tighter than 'or'.
+
+    :param query_conditions: A condition list, an expression node, or None.
+    :return: An expression node, or None when there is no filter.
+    """
+    if query_conditions is None or isinstance(query_conditions, (Predicate, _Group)):
+        return query_conditions
+    if not query_conditions:
+        return None
+    terms = []
+    current = []
+    for column, operator, value, logic in query_conditions:
+        current.append(Predicate(column, operator, value))
+        if logic.lower() == 'or':
+            terms.append(make_group(And, current))
+            current = []
+    if current:
+        terms.append(make_group(And, current))
+    return make_group(Or, terms)
+
+
+def default_estimate(predicate):
+    """
+    Estimates a predicate's per-row cost and selectivity from its operator alone.
+
+    :return: A tuple of (cost, selectivity).
+    """
+    cost = OPERATOR_COSTS.get(predicate.operator, 1.0)
+    selectivity = DEFAULT_SELECTIVITY.get(predicate.operator, 0.5)
+    if predicate.operator == 'IN':
+        selectivity = min(1.0, selectivity * len(predicate.value))
+    return cost, selectivity
+
+
+def plan(node, estimate=default_estimate):
+    """
+    Reorders an expression so evaluation does the least work.
+
+    Children of an And are sorted by cost / (1 - selectivity), so cheap predicates that
+    reject most rows run first; children of an Or are sorted by cost / selectivity, so cheap
+    predicates that accept most rows run first. This is the classic optimal ordering for
+    independent short-circuited predicates.
+
+    :param node: The expression to plan, or None.
+    :param estimate: Callable mapping a Predicate to (cost, selectivity).
+    :return: A tuple of (planned node, cost, selectivity).
+    """
+    if node is None:
+        return None, 0.0, 1.0
+    if isinstance(node, Predicate):
+        cost, selectivity = estimate(node)
+        return node, cost, selectivity
+
+    planned = [plan(child, estimate) for child in node.children]
+    if isinstance(node, And):
+        planned.sort(key=lambda item: item[1] / max(1.0 - item[2], 1e-9))
+    else:
+        planned.sort(key=lambda item: item[1] / max(item[2], 1e-9))
+
+    total_cost = 0.0
+    reach = 1.0
+    for _, cost, selectivity in planned:
+        total_cost += reach * cost
+        # probability the next child still has to be evaluated
+        reach *= selectivity if isinstance(node, And) else (1.0 - selectivity)
+    selectivity = reach if isinstance(node, And) else 1.0 - reach
+    return type(node)([child for child, _, _ in planned]), total_cost, selectivity
+
+
+def to_data(node):
+    """
+    Converts an expression into nested lists of JSON-serializable values, the inverse of from_data.
+
+    :param node: An expression node, or None.
+    """
+    if node is None:
+        return None
+    if isinstance(node, Predicate):
+        value = list(node.value) if node.operator == 'IN' else node.value
+        return [node.column, node.operator, value]
+    return ['and' if isinstance(node, And) else 'or', [to_data(child) for child in node.children]]
+
+
+def from_data(data):
+    """Rebuilds an expression from the output of to_data"""
+    if data is None:
+        return None
+    if len(data) == 2:
+        group_class = And if data[0] == 'and' else Or
+        return group_class([from_data(child) for child in data[1]])
+    column, operator, value = data
+    return Predicate(column, operator, tuple(value) if operator == 'IN' else value)
@@ -1,11 +1,195 @@
+import json
 import re
+import base64
+import hashlib
+
+from database.query_ast import And, Or, Predicate, make_group
+from database.lexer import tokenize, unescape, STRING, WORD, OPERATOR, PUNCT, QUOTED_PATTERN, OPERATOR_PATTERN
+
+# Deepest parenthesis nesting accepted, well below the interpreter's recursion limit
+MAX_NESTING = 64
+
+CLAUSE_KEYWORDS = ('LIMIT', 'OFFSET', 'CURSOR')
+
+
+class Aggregate:
+    """
+    An aggregate a query asks for instead of rows.
+
+    Attributes:
+        function: 'count' for COUNT(*), 'count_distinct' for COUNT(DISTINCT column), or
+            'group_count' for the row count of every value of column (GROUP BY column).
+        column: The counted or grouped column; None for 'count'.
+    """
+
+    FUNCTIONS = ('count', 'count_distinct', 'group_count')
+
+    def __init__(self, function, column=None):
+        self.function = function
+        self.column = column
+
+    def __eq__(self, other):
+        return isinstance(other, Aggregate) and (self.function, self.column) == (other.function, other.column)
+
+    def __hash__(self):
+        return hash((self.function, self.column))
+
+    def __repr__(self):
+        return f"Aggregate({self.function!r}, {self.column!r})"
+
+
+class ParsedQuery:
+    """
+    The result of parsing a query string.
+
+    Attributes:
+        conditions: The filter as a query_ast expression, or None when every row matches.
+        columns: The projected column names, or None to return whole rows.
+        limit: The maximum number of rows to return, or None for no limit.
+        offset: The number of matching rows to skip.
+        cursor: The continuation cursor the query was resumed from, if any.
+        aggregate: The Aggregate to compute instead of returning rows, or None.
+    """
+
+    def __init__(self, conditions, columns=None, limit=None, offset=0, cursor=None, aggregate=None):
+        self.conditions = conditions
+        self.columns = columns
+        self.limit = limit
+        self.offset = offset
+        self.cursor = cursor
+        self.aggregate = aggregate
+
+    def normalized(self):
+        """
+        Returns a canonical string for the query, identical for queries that only differ in
+        whitespace, keyword case or how the page position was expressed (OFFSET or CURSOR).
+        """
+        return repr((self.conditions, self.columns, self.aggregate, self.limit, self.offset))
+
+    def fingerprint(self):
+        """
+        Returns a short hash of the parts of the query a cursor must stay bound to,
+        so a cursor cannot be replayed against a different filter or projection.
+        """
+        shape = repr((self.conditions, self.columns, self.aggregate))
+        return hashlib.sha1(shape.encode('utf-8')).hexdigest()[:12]
+
+    def next_cursor(self, returned_count):
+        """
+        Builds the opaque continuation cursor for the page following this one.
+
+        :param returned_count: Number of rows returned for the current page.
+        :return: A URL-safe cursor string.
+        """
+        payload = json.dumps({'o': self.offset + returned_count, 'f': self.fingerprint()}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def resume(self, cursor):
+        """
+        Positions the query at the page described by a cursor produced by next_cursor.
+
+        :param cursor: The opaque cursor string.
+        :raises ValueError: If the cursor is malformed or was issued for a different query.
+        """
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            offset, fingerprint = int(payload['o']), payload['f']
+        except (ValueError, KeyError, TypeError):
+            raise ValueError("Invalid cursor: " + cursor)
+        if fingerprint != self.fingerprint():
+            raise ValueError("Cursor does not belong to this query")
+        self.offset = offset
+        self.cursor = cursor
+
+
+# Pads the token list, so looking ahead never needs a bounds check
+_END = ('end', '')
+
+# Flat queries - predicates joined by and/or, optionally followed by LIMIT and OFFSET - are
+# matched by these patterns without building a token list; anything else (parentheses, SELECT,
+# GROUP BY, CURSOR, errors) falls back to the lexer and the recursive descent parser. Keywords
+# are matched in ASCII only, as the lexer's words are.
+_FLAGS = re.ASCII | re.IGNORECASE | re.DOTALL
+_WORD_END = r'(?![A-Za-z0-9_])'
+_FLAT_PREDICATE = re.compile(
+    rf'\s*(\*|[A-Za-z0-9_]+)(?:\s*({OPERATOR_PATTERN})\s*({QUOTED_PATTERN})'
+    rf'|\s+IN\s*\(\s*((?:{QUOTED_PATTERN})(?:\s*,\s*(?:{QUOTED_PATTERN}))*)\s*\))'
+    rf'\s*(?:(?:(AND)|(OR)){_WORD_END})?', _FLAGS)
+_FLAT_CLAUSE = re.compile(rf'(LIMIT|OFFSET)\s+([0-9]+){_WORD_END}\s*', _FLAGS)
+_QUOTED = re.compile(QUOTED_PATTERN, re.DOTALL)
+
+
+class _TokenStream:
+    """A cursor over the (kind, value) tokens of one query"""
+
+    __slots__ = ('text', 'tokens', 'index')
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.tokens += (_END, _END, _END)
+        self.index = 0
+
+    def peek(self, ahead=0):
+        return self.tokens[self.index + ahead]
+
+    def next(self):
+        token = self.tokens[self.index]
+        if token is _END:
+            self.error("unexpected end of query")
+        self.index += 1
+        return token
+
+    def accept_word(self, *keywords):
+        kind, value = self.tokens[self.index]
+        if kind == WORD and value.upper() in keywords:
+            self.index += 1
+            return value
+        return None
+
+    def accept_punct(self, value):
+        if self.tokens[self.index] == (PUNCT, value):
+            self.index += 1
+            return True
+        return False
+
+    def expect(self, kind, description):
+        token = self.next()
+        if token[0] != kind:
+            self.error(f"expected {description}, got {token[1]!r}")
+        return token[1]
+
+    def expect_punct(self, value):
+        token = self.next()
+        if token != (PUNCT, value):
+            self.error(f"expected '{value}', got {token[1]!r}")
+
+    def at_end(self):
+        return self.tokens[self.index] is _END
+
+    def error(self, reason):
+        raise ValueError(f"Error parsing query: {reason}: {self.text}")
+
 
 class QueryParser:
     """
     A class for filtering data rows based on specified conditions.
     Each condition can check a specific column or all columns (*) with support for
-    different operators (==, !=, $= for case-insensitive match, and &= for containment check).
-    Conditions can be combined with 'and'/'or' logical operations.
+    different operators (==, !=, $= for case-insensitive match, &= for containment check,
+    <, <=, >, >= for range checks, ^= for prefix match, and IN ("a", "b") for set membership).
+    Range checks compare values as strings. Conditions can be combined with 'and'/'or' logical
+    operations, where 'and' binds tighter than 'or', and grouped with parentheses.
+
+    A query may also start with 'SELECT col1, col2 WHERE' to project columns and end with
+    'LIMIT n', 'OFFSET n' and 'CURSOR "token"' clauses to page through the matches.
+
+    Instead of rows a query can ask for an aggregate: 'SELECT COUNT(*) WHERE ...',
+    'SELECT COUNT(DISTINCT col) WHERE ...', or 'SELECT col, COUNT(*) WHERE ... GROUP BY col',
+    which returns the count of each value, most frequent first, so LIMIT n gives the top n.
+
+    Queries are split by the shared single-pass lexer and parsed by recursive descent over
+    its tokens; quoted values arrive already unescaped. Flat queries, the common case, are
+    matched straight from the string into the same tree.
     """
 
     def __init__(self):
@@ -17,26 +201,208 @@ class QueryParser:
 
     def parse_command(self, query_str):
         """
-        Parses a query string into a list of conditions.
+        Parses a query string into a ParsedQuery.
 
-        Each condition is represented as a tuple containing the column name or '*',
-        an operator ('==', '!=', '$=', '&='), the value to compare, and a logical
-        operator ('and', 'or') if any, indicating the relation to the next condition.
+        The filter becomes an expression tree of query_ast Predicate, And and Or nodes. Each
+        predicate holds the column name or '*', an operator ('==', '!=', '$=', '&=', '<', '<=',
+        '>', '>=', '^=', 'IN') and the value to compare (a tuple of values for IN).
 
         :param query_str: The query string to be parsed.
-        :return: A list of tuples representing the parsed conditions.
+        :return: A ParsedQuery holding the filter, projection and paging clauses.
         :raises ValueError: If the query string cannot be parsed.
         """
-        # print(query_str)
-        matches = re.findall(r'(\*|[A-Za-z0-9_]+)\s*(==|!=|\$=|&=)\s*"(.*?)(?<!\\)"(\s+and\s+|\s+or\s+|$)', query_str, re.DOTALL)
-        # print(matches)
-        if not matches:
-            raise ValueError("Error parsing query: " + query_str)
-        
-        parsed_conditions = []
-        for column, operator, value, logic in matches:
-            # Handle escaped quotes
-            value = value.replace('\\"', '"')
-            parsed_conditions.append((column, operator, value, logic.strip())) # strip out space for and/or
-
-        return parsed_conditions
\ No newline at end of file
+        query = self._parse_flat(query_str)
+        if query is not None:
+            return query
+        stream = _TokenStream(query_str)
+        columns = None
+        aggregate = None
+        selected_column = None
+        expression = None
+        has_select = stream.accept_word('SELECT') is not None
+        if has_select:
+            columns, aggregate, selected_column = self._parse_select(stream)
+        if not has_select or stream.accept_word('WHERE'):
+            expression = self._parse_or(stream, 0)
+
+        group_by = None
+        if stream.accept_word('GROUP'):
+            if not stream.accept_word('BY'):
+                stream.error("expected BY after GROUP")
+            group_by = stream.expect(WORD, "a column after GROUP BY")
+
+        limit, offset, cursor = None, 0, None
+        while not stream.at_end():
+            keyword = stream.accept_word(*CLAUSE_KEYWORDS)
+            if keyword is None:
+                stream.error(f"unexpected {stream.peek()[1]!r}")
+            keyword = keyword.upper()
+            if keyword == 'CURSOR':
+                cursor = stream.expect(STRING, 'a quoted cursor')
+                continue
+            argument = stream.expect(WORD, f'a number after {keyword}')
+            if not argument.isdigit():
+                stream.error(f"{keyword} takes a number, got {argument!r}")
+            if keyword == 'LIMIT':
+                limit = int(argument)
+            else:
+                offset = int(argument)
+
+        if aggregate is not None or group_by is not None:
+            if not has_select or columns:
+                raise ValueError("GROUP BY requires SELECT column, COUNT(*)")
+            aggregate = self._parse_aggregate(selected_column, aggregate, group_by)
+            if aggregate.function != 'group_count' and (limit is not None or offset or cursor is not None):
+                raise ValueError("LIMIT, OFFSET and CURSOR only apply to rows or GROUP BY counts")
+
+        query = ParsedQuery(expression, columns=columns, limit=limit, offset=offset, aggregate=aggregate)
+        if cursor is not None:
+            query.resume(cursor)
+        return query
+
+    def _parse_flat(self, query_str):
+        """
+        Parses a flat query straight from the query string.
+
+        :param query_str: The query string to be parsed.
+        :return: The ParsedQuery the token parser would build, or None if the query is not flat.
+        """
+        match = _FLAT_PREDICATE.match(query_str)
+        if match is None or match.group(1).upper() == 'SELECT':
+            return None
+        groups, terms = [], []
+        while True:
+            column, operator, value, values, conjunction, disjunction = match.groups()
+            if operator is None:
+                value = tuple(unescape(quoted[1:-1]) for quoted in _QUOTED.findall(values))
+                terms.append(Predicate(column, 'IN', value))
+            else:
+                terms.append(Predicate(column, operator, unescape(value[1:-1])))
+            if conjunction is None:
+                # the children of each group are predicates, so there is nothing for make_group to flatten
+                groups.append(And(terms) if len(terms) > 1 else terms[0])
+                if disjunction is None:
+                    break
+                terms = []
+            match = _FLAT_PREDICATE.match(query_str, match.end())
+            if match is None:
+                return None
+
+        limit, offset = None, 0
+        position, length = match.end(), len(query_str)
+        while position < length:
+            clause = _FLAT_CLAUSE.match(query_str, position)
+            if clause is None:
+                return None
+            if clause.group(1).upper() == 'LIMIT':
+                limit = int(clause.group(2))
+            else:
+                offset = int(clause.group(2))
+            position = clause.end()
+        return ParsedQuery(Or(groups) if len(groups) > 1 else groups[0], limit=limit, offset=offset)
+
+    def _parse_select(self, stream):
+        """
+        Parses what follows SELECT.
+
+        :return: A tuple of (projected columns or None, counted expression or None, column selected
+            next to COUNT or None). The counted expression is '*' or ('DISTINCT', column).
+        """
+        if stream.accept_punct('*'):
+            return None, None, None
+        columns = []
+        while True:
+            if self._at_count(stream):
+                if len(columns) > 1:
+                    stream.error("COUNT(*) can only be selected with one GROUP BY column")
+                return None, self._parse_count(stream), (columns[0] if columns else None)
+            columns.append(stream.expect(WORD, 'a column name'))
+            if not stream.accept_punct(','):
+                return columns, None, None
+
+    def _at_count(self, stream):
+        kind, value = stream.peek()
+        return kind == WORD and value.upper() == 'COUNT' and stream.peek(1) == (PUNCT, '(')
+
+    def _parse_count(self, stream):
+        stream.next()
+        stream.expect_punct('(')
+        if stream.accept_punct('*'):
+            counted = '*'
+        elif stream.accept_word('DISTINCT'):
+            counted = ('DISTINCT', stream.expect(WORD, 'a column after DISTINCT'))
+        else:
+            stream.error("expected * or DISTINCT column in COUNT()")
+        stream.expect_punct(')')
+        return counted
+
+    def _parse_aggregate(self, selected_column, counted, group_by):
+        if counted is None:
+            raise ValueError("GROUP BY requires SELECT column, COUNT(*)")
+        if counted != '*':
+            if selected_column is not None or group_by is not None:
+                raise ValueError("COUNT(DISTINCT column) cannot be grouped")
+            return Aggregate('count_distinct', counted[1])
+        if group_by is None:
+            if selected_column is not None:
+                raise ValueError(f"SELECT {selected_column}, COUNT(*) requires GROUP BY {selected_column}")
+            return Aggregate('count')
+        if selected_column is not None and selected_column != group_by:
+            raise ValueError(f"Selected column {selected_column} is not the GROUP BY column {group_by}")
+        return Aggregate('group_count', group_by)
+
+    def parse_conditions(self, query_str):
+        """
+        Parses the filter part of a query string into an expression.
+
+        :param query_str: The filter expression, e.g. '(C1 == "a" or C1 == "b") and C2 &= "c"'.
+        :return: The root query_ast node.
+        :raises ValueError: If the query string cannot be parsed.
+        """
+        stream = _TokenStream(query_str)
+        expression = self._parse_or(stream, 0)
+        if not stream.at_end():
+            stream.error(f"unexpected {stream.peek()[1]!r}")
+        return expression
+
+    def _parse_or(self, stream, depth):
+        children = [self._parse_and(stream, depth)]
+        while stream.accept_word('OR'):
+            children.append(self._parse_and(stream, depth))
+        return make_group(Or, children)
+
+    def _parse_and(self, stream, depth):
+        children = [self._parse_operand(stream, depth)]
+        while stream.accept_word('AND'):
+            children.append(self._parse_operand(stream, depth))
+        return make_group(And, children)
+
+    def _parse_operand(self, stream, depth):
+        if stream.accept_punct('('):
+            if depth >= MAX_NESTING:
+                stream.error("parentheses nested too deeply")
+            expression = self._parse_or(stream, depth + 1)
+            stream.expect_punct(')')
+            return expression
+
+        tokens, index = stream.tokens, stream.index
+        kind, column = tokens[index]
+        operator, value = tokens[index + 1], tokens[index + 2]
+        if operator[0] == OPERATOR and value[0] == STRING and (kind == WORD or column == '*'):
+            # the common column operator "value" shape, read without going through the stream helpers
+            stream.index = index + 3
+            return Predicate(column, operator[1], value[1])
+
+        kind, column = stream.next()
+        if kind != WORD and column != '*':
+            stream.error(f"expected a column, got {column!r}")
+        if stream.accept_word('IN'):
+            stream.expect_punct('(')
+            values = [stream.expect(STRING, 'a quoted value')]
+            while stream.accept_punct(','):
+                values.append(stream.expect(STRING, 'a quoted value'))
+            stream.expect_punct(')')
+            return Predicate(column, 'IN', tuple(values))
+        operator = stream.expect(OPERATOR, f"an operator after {column}")
+        value = stream.expect(STRING, 'a quoted value')
+        return Predicate(column, operator, value)
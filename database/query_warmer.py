@@ -0,0 +1,141 @@
+"""
+Keeps the query cache warm by re-running the hottest queries in the background.
+
+Every process counts the queries it serves and periodically adds its counts to a Redis sorted
+set shared by all processes, which is trimmed to the most frequent queries and decayed by
+half every decay_interval, so it follows what is hot now. A warm-up re-runs the top_k of
+them at a limited rate: on startup, so that the first users after a deploy hit a warm cache,
+and after writes, whose generation bumps leave the cached results unreachable.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+
+import redis
+
+
+class QueryWarmer:
+    def __init__(self, client, key, load, top_k=50, rate=10.0, flush_interval=60.0, decay_interval=3600.0,
+                 settle=1.0, clock=time.monotonic, sleep=time.sleep):
+        """
+        :param client: The Redis client holding the shared counts.
+        :param key: The Redis key of the sorted set of query counts.
+        :param load: Function running a query given as recorded, which caches its result.
+        :param top_k: Number of queries a warm-up re-runs.
+        :param rate: Maximum number of queries a warm-up runs per second.
+        :param flush_interval: Seconds between additions of this process's counts to the shared set.
+        :param decay_interval: Seconds between halvings of the shared counts.
+        :param settle: Seconds a warm-up waits after the first request it serves, so a burst of writes starts
+            one warm-up; later requests do not push it back, so a steady stream of writes still gets warm-ups.
+        :param clock: Function returning the current time in seconds.
+        :param sleep: Function sleeping for a number of seconds.
+        """
+        self.client = client
+        self.key = key
+        self.load = load
+        self.top_k = top_k
+        self.rate = rate
+        self.flush_interval = flush_interval
+        self.decay_interval = decay_interval
+        self.settle = settle
+        self.clock = clock
+        self.sleep = sleep
+        # the shared set keeps a margin of candidates below the top_k
+        self.tracked = top_k * 4
+        self._pending = Counter()
+        self._next_flush = clock() + flush_interval
+        self._lock = threading.Lock()
+        self._requested_at = None
+        self._thread = None
+        self._flusher = None
+
+    def record(self, query):
+        """
+        Counts one served query.
+
+        :param query: The query as a string that load accepts.
+        """
+        with self._lock:
+            # the number of distinct pending queries is capped, so a flood of one-off queries
+            # cannot grow it without bound; queries already pending keep being counted
+            if query in self._pending or len(self._pending) < self.tracked * 4:
+                self._pending[query] += 1
+            flusher = None
+            if self._flusher is None and self.clock() >= self._next_flush:
+                self._next_flush = self.clock() + self.flush_interval
+                # the round trip is made off the request thread
+                flusher = self._flusher = threading.Thread(target=self._flush_in_background, daemon=True)
+        if flusher is not None:
+            flusher.start()
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            with self._lock:
+                self._flusher = None
+
+    def flush(self):
+        """Adds this process's counts to the shared set in one round trip, trims it and decays it when due"""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        try:
+            pipeline = self.client.pipeline(transaction=False)
+            for query, count in pending.items():
+                pipeline.zincrby(self.key, count, query)
+            pipeline.zremrangebyrank(self.key, 0, -self.tracked - 1)
+            pipeline.set(f'{self.key}:decayed', 1, nx=True, ex=int(self.decay_interval))
+            decay = pipeline.execute()[-1]
+            # the first process to flush in an interval decays the counts for everyone
+            if decay:
+                self.client.zunionstore(self.key, {self.key: 0.5})
+        except redis.RedisError as e:
+            logging.warning(f"Could not record hot queries: {e}")
+
+    def hottest(self):
+        """Return the top_k queries of the shared set, most frequent first"""
+        queries = self.client.zrevrange(self.key, 0, self.top_k - 1)
+        return [query.decode('utf-8') if isinstance(query, bytes) else query for query in queries]
+
+    def warm(self):
+        """Re-runs the hottest queries at no more than rate queries per second"""
+        self.flush()
+        try:
+            queries = self.hottest()
+        except redis.RedisError as e:
+            logging.warning(f"Could not read hot queries: {e}")
+            return 0
+        for i, query in enumerate(queries):
+            if i:
+                self.sleep(1.0 / self.rate)
+            try:
+                self.load(query)
+            except Exception as e:
+                logging.warning(f"Could not warm query {query}: {e}")
+        logging.info(f"Warmed {len(queries)} hot queries")
+        return len(queries)
+
+    def request(self):
+        """Starts a warm-up in the background; requests made before it starts are served by it"""
+        with self._lock:
+            if self._requested_at is None:
+                self._requested_at = self.clock()
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._requested_at is None:
+                    self._thread = None
+                    return
+                wait = self._requested_at + self.settle - self.clock()
+                if wait <= 0:
+                    self._requested_at = None
+            if wait > 0:
+                self.sleep(wait)
+                continue
+            self.warm()
@@ -1,56 +1,434 @@
 import redis
 import json
-from pybloom_live import ScalableBloomFilter
+import logging
+import threading
+import time
+import uuid
 from redlock import Redlock
+from metrics import CACHE_REQUESTS, REDIS_LATENCY
+from database.bloom_filter import SharedBloomFilter
+from database.cache_codec import get_codec
+from database.near_cache import NearCache, MISSING
+
+# the pub/sub channel on which every process announces the keys its writes changed
+INVALIDATION_CHANNEL = 'cache_invalidation'
+# the pub/sub channel on which the process that ran a query announces that its result is cached
+QUERY_READY_CHANNEL = 'query_ready'
+# seconds to wait before subscribing again after the subscription broke
+RESUBSCRIBE_DELAY = 1.0
+
+# KEYS are the generation keys a query reads and ARGV[1] the query; returns the generations
+# followed by the result cached under them, the key being built the way query_key() builds it
+LOOKUP_SCRIPT = """
+local generations = redis.call('MGET', unpack(KEYS))
+for i = 1, #KEYS do
+    if not generations[i] then
+        generations[i] = '0'
+    end
+end
+generations[#KEYS + 1] = redis.call('GET', 'query:' .. table.concat(generations, '.', 1, #KEYS) .. ':' .. ARGV[1])
+return generations
+"""
+
+
+def query_key(generations, query):
+    """Return the key of a query's result cached under the given generations of the data it reads"""
+    return f"query:{'.'.join(str(generation) for generation in generations)}:{query}"
+
 
 class RedisManager:
-    def __init__(self, redis_url='redis://localhost:6379/0'):
+    def __init__(self, redis_url='redis://localhost:6379/0', near_cache_size=0, near_cache_ttl=5.0,
+                 bloom_capacity=1000000, bloom_error_rate=0.01, codec='json'):
+        """
+        :param redis_url: URL of the Redis server.
+        :param near_cache_size: Number of decoded records and query results to keep in an in-process
+            cache in front of Redis; 0 disables it. Writes announce the keys they change over pub/sub,
+            and every process with a near cache evicts them.
+        :param near_cache_ttl: Seconds a near-cache entry stays valid, which bounds its staleness if
+            an invalidation is lost.
+        :param bloom_capacity: Number of records the shared Bloom filter of existing records is sized for.
+        :param bloom_error_rate: The filter's false positive rate at that capacity.
+        :param codec: Encoding of the cached values, 'json' or 'packed'. The packed codec also reads
+            JSON values, so a cache can be switched to it without a flush once every process reads it.
+        """
         self.client = redis.StrictRedis.from_url(redis_url)
-        self.bloom_filter = ScalableBloomFilter(mode=ScalableBloomFilter.SMALL_SET_GROWTH)
+        self.codec = get_codec(codec)
+        self.bloom_filter = SharedBloomFilter(self.client, capacity=bloom_capacity, error_rate=bloom_error_rate)
+        self._lookup_script = self.client.register_script(LOOKUP_SCRIPT)
         self.lock_manager = Redlock([redis_url])
+        self.near_cache = None
+        self._closed = False
+        # tags this process's invalidations, so that it skips its own
+        self.origin = uuid.uuid4().hex
+        self._listener = None
+        self._listener_lock = threading.Lock()
+        # query key -> Event set when another process announces the query's result is cached
+        self._waiters = {}
+        if near_cache_size:
+            self.near_cache = NearCache(near_cache_size, near_cache_ttl)
+            self._start_listener()
+
+    def _start_listener(self):
+        with self._listener_lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        while not self._closed:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL, QUERY_READY_CHANNEL)
+                for message in pubsub.listen():
+                    if self._closed:
+                        return
+                    self._handle_message(message)
+            except redis.RedisError as e:
+                logging.warning(f"Cache invalidation subscription lost: {e}")
+            # invalidations published while unsubscribed are lost, so nothing cached can be trusted
+            if self.near_cache is not None:
+                self.near_cache.clear()
+            # and so are announcements: waiters look at the cache again
+            for event in list(self._waiters.values()):
+                event.set()
+            time.sleep(RESUBSCRIBE_DELAY)
+
+    def _handle_message(self, message):
+        channel = message.get('channel')
+        if isinstance(channel, bytes):
+            channel = channel.decode('utf-8')
+        if channel == QUERY_READY_CHANNEL:
+            data = message.get('data')
+            event = self._waiters.get(data.decode('utf-8') if isinstance(data, bytes) else data)
+            if event is not None:
+                event.set()
+        elif self.near_cache is not None:
+            self._handle_invalidation(message)
+
+    def _handle_invalidation(self, message):
+        if message.get('type') != 'message':
+            return
+        try:
+            payload = json.loads(message['data'])
+        except (TypeError, ValueError):
+            logging.warning(f"Ignoring malformed cache invalidation: {message.get('data')!r}")
+            return
+        if payload.get('origin') != self.origin:
+            self.near_cache.delete(payload.get('keys', []))
+
+    def _invalidate(self, keys):
+        """Evicts keys from this process's near cache and tells the other processes to do the same"""
+        if self.near_cache is None or not keys:
+            return
+        self.near_cache.delete(keys)
+        with REDIS_LATENCY.time('publish'):
+            self.client.publish(INVALIDATION_CHANNEL, json.dumps({'origin': self.origin, 'keys': keys}))
+
+    def _near_get(self, key, cache):
+        if self.near_cache is None:
+            return MISSING
+        value = self.near_cache.get(key)
+        CACHE_REQUESTS.inc(cache, 'near_miss' if value is MISSING else 'near_hit')
+        return value
+
+    def _near_set(self, key, value):
+        if self.near_cache is not None:
+            self.near_cache.set(key, value)
+
+    def _near_versions(self, keys):
+        """Return the near-cache versions of keys, taken before they are read from Redis"""
+        if self.near_cache is None:
+            return {}
+        return {key: self.near_cache.version(key) for key in keys}
+
+    def _near_fill(self, key, value, versions):
+        # a value read from Redis is dropped if a write invalidated the key while it was read
+        if self.near_cache is not None:
+            self.near_cache.fill(key, value, versions[key])
 
     def add_to_bloom_filter(self, key):
-        self.bloom_filter.add(key)
+        self.bloom_filter.update(added=[key])
+
+    def rebuild_bloom_filter(self, keys):
+        """
+        Fills the shared Bloom filter with the keys of the records that exist, or loads it if
+        another process just did. Until it succeeds, every key passes the filter.
+
+        :param keys: Function returning an iterable of the keys of every record.
+        """
+        try:
+            self.bloom_filter.rebuild_or_load(keys)
+        except redis.RedisError as e:
+            logging.warning(f"Could not build the Bloom filter, record lookups are not filtered: {e}")
 
     def check_bloom_filter(self, key):
         return key in self.bloom_filter
 
     def get(self, key):
         if not self.check_bloom_filter(key):
+            CACHE_REQUESTS.inc('record', 'filtered')
             return None
-        value = self.client.get(key)
-        return json.loads(value) if value else None
+        near = self._near_get(key, 'record')
+        if near is not MISSING:
+            return near
+        versions = self._near_versions([key])
+        with REDIS_LATENCY.time('get'):
+            value = self.client.get(key)
+        CACHE_REQUESTS.inc('record', 'hit' if value else 'miss')
+        record = self.codec.decode(value) if value else None
+        if record is not None:
+            self._near_fill(key, record, versions)
+        return record
+
+    def get_many(self, keys):
+        """
+        Reads several keys in one round trip.
+
+        Keys the Bloom filter rules out are not requested, and keys held by the near cache
+        are answered from it.
+
+        :param keys: List of keys.
+        :return: List of the decoded values in the order of keys, with None for missing keys.
+        """
+        wanted = [key for key in keys if self.check_bloom_filter(key)]
+        if len(wanted) < len(keys):
+            CACHE_REQUESTS.inc('record', 'filtered', amount=len(keys) - len(wanted))
+        found = {}
+        if self.near_cache is not None:
+            for key in wanted:
+                value = self.near_cache.get(key)
+                if value is not MISSING:
+                    found[key] = value
+            CACHE_REQUESTS.inc('record', 'near_hit', amount=len(found))
+            CACHE_REQUESTS.inc('record', 'near_miss', amount=len(wanted) - len(found))
+            wanted = [key for key in wanted if key not in found]
+        if wanted:
+            versions = self._near_versions(wanted)
+            with REDIS_LATENCY.time('mget'):
+                values = self.client.mget(wanted)
+            hits = sum(1 for value in values if value)
+            CACHE_REQUESTS.inc('record', 'hit', amount=hits)
+            CACHE_REQUESTS.inc('record', 'miss', amount=len(values) - hits)
+            for key, value in zip(wanted, values):
+                record = self.codec.decode(value) if value else None
+                if record is not None:
+                    self._near_fill(key, record, versions)
+                found[key] = record
+        return [found.get(key) for key in keys]
+
+    def set_many(self, values, ex=None, null_ex=60):
+        """
+        Writes several keys in one round trip.
+
+        :param values: Dictionary of key -> value; None values are cached as nulls, like cache_null.
+        :param ex: Expiry in seconds of the non-null values.
+        :param null_ex: Expiry in seconds of the nulls.
+        """
+        if not values:
+            return
+        with REDIS_LATENCY.time('pipeline'):
+            pipeline = self.client.pipeline(transaction=False)
+            for key, value in values.items():
+                pipeline.set(key, self.codec.encode(value), ex=ex if value is not None else null_ex)
+                if value is not None:
+                    self._near_set(key, value)
+            pipeline.execute()
 
     def set(self, key, value, ex=None):
-        self.client.set(key, json.dumps(value), ex=ex)
+        with REDIS_LATENCY.time('set'):
+            self.client.set(key, self.codec.encode(value), ex=ex)
+        # set() writes a changed value; fills of unchanged values go through set_many
+        self._invalidate([key])
+        self._near_set(key, value)
 
     def delete(self, key):
-        self.client.delete(key)
+        with REDIS_LATENCY.time('delete'):
+            self.client.delete(key)
+        self._invalidate([key])
 
-    def get_related_query_keys(self, record_id):
-        return self.client.smembers(f'record_queries:{record_id}')
-    
-    def add_related_query_key(self, record_id, query_key):
-        self.client.sadd(f'record_queries:{record_id}', query_key)
+    def delete_many(self, keys):
+        """Deletes several keys in one round trip"""
+        if not keys:
+            return
+        with REDIS_LATENCY.time('delete'):
+            self.client.delete(*keys)
+        self._invalidate(keys)
+
+    def get_generations(self, keys):
+        """
+        Reads generation counters in one round trip, or none when the near cache holds them.
+
+        :param keys: List of generation keys.
+        :return: List of the generations in the order of keys, 0 for keys never bumped.
+        """
+        generations = self._near_generations(keys)
+        missing = [key for key in keys if key not in generations]
+        if missing:
+            # a bump made while the counters are read must not be undone by caching the old value
+            versions = self._near_versions(missing)
+            with REDIS_LATENCY.time('mget'):
+                values = self.client.mget(missing)
+            for key, value in zip(missing, values):
+                generations[key] = int(value) if value else 0
+                self._near_fill(key, generations[key], versions)
+        return [generations[key] for key in keys]
+
+    def _near_generations(self, keys):
+        """Return {key: generation} of the keys the near cache holds"""
+        generations = {}
+        if self.near_cache is not None:
+            for key in keys:
+                value = self.near_cache.get(key)
+                if value is not MISSING:
+                    generations[key] = value
+        return generations
+
+    def lookup_query(self, generation_keys, query):
+        """
+        Looks up the result of a query cached under the current generations of the data it reads.
+
+        The generations and the result are read in one round trip by a script; when the near
+        cache holds the generations only the result is read, and nothing when it holds that too.
+
+        :param generation_keys: The generation keys of the data the query reads.
+        :param query: The string identifying the query across generations.
+        :return: A tuple of (the generations, the query key, the cached record ids or None).
+        """
+        generations = self._near_generations(generation_keys)
+        if len(generations) == len(generation_keys):
+            generations = [generations[key] for key in generation_keys]
+            key = query_key(generations, query)
+            return generations, key, self.get_query_result(key)
+        versions = self._near_versions(generation_keys)
+        with REDIS_LATENCY.time('lookup'):
+            values = self._lookup_script(keys=generation_keys, args=[query])
+        generations = [int(value) for value in values[:len(generation_keys)]]
+        for key, generation in zip(generation_keys, generations):
+            self._near_fill(key, generation, versions)
+        key = query_key(generations, query)
+        value = values[len(generation_keys)] if len(values) > len(generation_keys) else None
+        CACHE_REQUESTS.inc('query', 'hit' if value else 'miss')
+        record_ids = self.codec.decode(value) if value else None
+        if record_ids is not None:
+            # the key embeds the generations, so the result cached under it never goes stale
+            self._near_set(key, record_ids)
+        return generations, key, record_ids
+
+    def bump_generations(self, keys):
+        """Increments generation counters in one round trip, making every query cached under them unreachable"""
+        if not keys:
+            return
+        with REDIS_LATENCY.time('pipeline'):
+            pipeline = self.client.pipeline(transaction=False)
+            for key in keys:
+                pipeline.incr(key)
+            pipeline.execute()
+        self._invalidate(keys)
+
+    def refresh_records(self, records, deleted_ids=(), created_ids=(), generation_keys=()):
+        """
+        Caches changed records, drops deleted ones, updates the Bloom filter and bumps the
+        generations the change affects, in one round trip however many records changed.
+
+        Queries are not invalidated one by one: their keys embed the generations of the data
+        they read, so bumping those makes the stale results unreachable until they expire.
+
+        :param records: Dictionaries of the records as they are now, keyed by column name.
+        :param deleted_ids: Primary keys of records that no longer exist.
+        :param created_ids: Primary keys among records that did not exist before.
+        :param generation_keys: Generation keys to increment.
+        """
+        record_ids = [record['C1'] for record in records] + list(deleted_ids)
+        if not record_ids and not generation_keys:
+            return
+        with REDIS_LATENCY.time('pipeline'):
+            pipeline = self.client.pipeline(transaction=False)
+            for record in records:
+                record_key = f"record:{record['C1']}"
+                pipeline.set(record_key, self.codec.encode(record))
+            for record_id in deleted_ids:
+                pipeline.delete(f'record:{record_id}')
+            self.bloom_filter.update([f'record:{record_id}' for record_id in created_ids],
+                                     [f'record:{record_id}' for record_id in deleted_ids], pipeline=pipeline)
+            for key in generation_keys:
+                pipeline.incr(key)
+            pipeline.execute()
+        self._invalidate([f'record:{record_id}' for record_id in record_ids] + list(generation_keys))
+        for record in records:
+            self._near_set(f"record:{record['C1']}", record)
+
+    def cache_query_result(self, query_key, record_ids, records=(), ex=None, record_ex=None):
+        """
+        Caches a query result in one round trip: the result's record ids and the records themselves,
+        and announces it to processes waiting for it.
+
+        :param query_key: The key of the query.
+        :param record_ids: The ids of the records in the result, in order.
+        :param records: Whole records to cache under record:<C1>; empty for projected results.
+        :param ex: Expiry of the query key in seconds.
+        :param record_ex: Expiry of the record keys in seconds. Record keys are shared by every
+            query returning the record, so they do not take the expiry of this query.
+        """
+        with REDIS_LATENCY.time('pipeline'):
+            pipeline = self.client.pipeline(transaction=False)
+            pipeline.set(query_key, self.codec.encode(record_ids), ex=ex)
+            for record in records:
+                record_key = f"record:{record['C1']}"
+                pipeline.set(record_key, self.codec.encode(record), ex=record_ex)
+                self._near_set(record_key, record)
+            pipeline.publish(QUERY_READY_CHANNEL, query_key)
+            pipeline.execute()
+        self._near_set(query_key, record_ids)
+
+    def wait_for_query_result(self, query_key, timeout):
+        """
+        Waits until another process announces that it cached the result of a query.
 
-    def remove_related_query_key(self, record_id, query_key):
-        self.client.srem(f'record_queries:{record_id}', query_key)
+        :param query_key: The key of the query.
+        :param timeout: Maximum number of seconds to wait.
+        :return: The cached record ids, or None if the result was not cached within timeout.
+        """
+        self._start_listener()
+        event = threading.Event()
+        self._waiters[query_key] = event
+        try:
+            # the result may have been cached before this process started listening
+            record_ids = self.get_query_result(query_key)
+            if record_ids is None and event.wait(timeout):
+                record_ids = self.get_query_result(query_key)
+            return record_ids
+        finally:
+            self._waiters.pop(query_key, None)
 
     def get_query_result(self, query_key):
-        value = self.client.get(query_key)
-        return json.loads(value) if value else None
+        near = self._near_get(query_key, 'query')
+        if near is not MISSING:
+            return near
+        versions = self._near_versions([query_key])
+        with REDIS_LATENCY.time('get'):
+            value = self.client.get(query_key)
+        CACHE_REQUESTS.inc('query', 'hit' if value else 'miss')
+        record_ids = self.codec.decode(value) if value else None
+        if record_ids is not None:
+            self._near_fill(query_key, record_ids, versions)
+        return record_ids
 
     def set_query_result(self, query_key, record_ids, ex=None):
-        self.client.set(query_key, json.dumps(record_ids), ex=ex)
+        with REDIS_LATENCY.time('set'):
+            self.client.set(query_key, self.codec.encode(record_ids), ex=ex)
 
     def cache_null(self, key, ex=60):
-        self.client.set(key, json.dumps(None), ex=ex)
+        with REDIS_LATENCY.time('set'):
+            self.client.set(key, self.codec.encode(None), ex=ex)
     
     def acquire_lock(self, lock_key, ttl=1000):
-        return self.lock_manager.lock(lock_key, ttl)
+        with REDIS_LATENCY.time('lock'):
+            return self.lock_manager.lock(lock_key, ttl)
     
     def release_lock(self, lock):
-        self.lock_manager.unlock(lock)
+        with REDIS_LATENCY.time('unlock'):
+            self.lock_manager.unlock(lock)
 
     def close(self):
-        self.client.close()
\ No newline at end of file
+        self._closed = True
+        self.client.close()
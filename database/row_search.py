@@ -0,0 +1,95 @@
+from bisect import bisect_right
+from itertools import accumulate
+
+# Every cell is stored as CELL_START + value + CELL_END, so a search for CELL_START + value + CELL_END
+# only hits whole cells and a search for a bare value can never span two cells
+CELL_START = '\x02'
+CELL_END = '\x03'
+
+SEARCH_OPERATORS = ('==', '!=', '$=', '&=', '^=', 'IN')
+
+
+class TableSearchText:
+    """
+    The whole table as one string, for answering '*' predicates with str.find.
+
+    A search costs one C-level scan of the text plus work proportional to the number of
+    hits, instead of a Python-level comparison of every cell of every row. Row positions
+    are recovered from hit offsets by bisecting the row start offsets.
+    """
+
+    def __init__(self, rows, columns):
+        """
+        :param rows: List of row dictionaries; results are positions in this list.
+        :param columns: The columns to search.
+        """
+        self.columns = columns
+        self.row_count = len(rows)
+        boundary = CELL_END + CELL_START
+        texts = [CELL_START + boundary.join([row.get(column) or '' for column in columns]) + CELL_END for row in rows]
+        self.text, self.offsets = ''.join(texts), self._offsets(texts)
+        self._lowered = None
+
+    @staticmethod
+    def _offsets(texts):
+        offsets = [0]
+        offsets.extend(accumulate(len(text) for text in texts))
+        offsets.pop()
+        return offsets
+
+    def _lowered_text(self):
+        # lowercasing can change a string's length, so the lowered text gets its own offsets
+        if self._lowered is None:
+            ends = self.offsets[1:] + [len(self.text)]
+            texts = [self.text[start:end].lower() for start, end in zip(self.offsets, ends)]
+            self._lowered = (''.join(texts), self._offsets(texts))
+        return self._lowered
+
+    @staticmethod
+    def supports(operator, value):
+        """Return True if the predicate '*' operator value can be answered from the text"""
+        if operator not in SEARCH_OPERATORS:
+            return False
+        values = value if operator == 'IN' else (value,)
+        return not any(CELL_START in item or CELL_END in item for item in values)
+
+    def _find_rows(self, text, offsets, needle):
+        if not needle:
+            return list(range(self.row_count))
+        rows = []
+        find = text.find
+        position = find(needle)
+        while position != -1:
+            row = bisect_right(offsets, position) - 1
+            rows.append(row)
+            # continue after this row, it already matched
+            next_start = offsets[row + 1] if row + 1 < len(offsets) else len(text)
+            position = find(needle, next_start)
+        return rows
+
+    def rows_matching(self, operator, value):
+        """
+        Returns the positions of the rows where any column matches, or for '!=' where no column equals value.
+
+        :param operator: One of SEARCH_OPERATORS.
+        :param value: The condition value; a tuple of values for IN.
+        :return: Sorted list of row positions.
+        """
+        if operator == '==':
+            return self._find_rows(self.text, self.offsets, CELL_START + value + CELL_END)
+        elif operator == '!=':
+            equal = set(self._find_rows(self.text, self.offsets, CELL_START + value + CELL_END))
+            return [row for row in range(self.row_count) if row not in equal]
+        elif operator == 'IN':
+            matched = set()
+            for item in set(value):
+                matched.update(self._find_rows(self.text, self.offsets, CELL_START + item + CELL_END))
+            return sorted(matched)
+        elif operator == '&=':
+            return self._find_rows(self.text, self.offsets, value)
+        elif operator == '^=':
+            return self._find_rows(self.text, self.offsets, CELL_START + value)
+        elif operator == '$=':
+            text, offsets = self._lowered_text()
+            return self._find_rows(text, offsets, CELL_START + value.lower() + CELL_END)
+        raise ValueError(f"Operator {operator} cannot use the search text")
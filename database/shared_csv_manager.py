@@ -0,0 +1,164 @@
+import threading
+from contextlib import contextmanager
+
+from database.csv_manager import CSVFileManager
+from database.csv_index import SortedIndex
+from database.shared_table import SharedTableReader
+from database.column_stats import TableStatistics
+from database.row_search import TableSearchText
+
+
+class TableSnapshot:
+    """One published version of the table and the structures derived from it, built lazily"""
+
+    def __init__(self, version, columns, rows):
+        self.version = version
+        self.columns = columns
+        self.rows = rows
+        self.derived = {}
+
+
+class SharedCSVFileManager(CSVFileManager):
+    """
+    A read-only CSV engine serving the table that a writer process publishes into shared memory.
+
+    Every server process attaches to the same published table instead of loading its own copy
+    of the CSV file; writes are applied by the single writer process, and each query first checks
+    whether a newer version has been published.
+
+    Each query pins the snapshot it started on for its thread, so that a version loaded by a
+    concurrent query never mixes its rows with the structures derived from another version.
+    """
+
+    read_only = True
+
+    def __init__(self, table_name):
+        """
+        Attaches to the shared table published under table_name.
+
+        :param table_name: The name the writer process publishes the table under.
+        """
+        self.filepath = None
+        self.table_name = table_name
+        self.reader = SharedTableReader(table_name)
+        self.data_modified = False
+        self._indexed_columns = []
+        # guards the reader and the snapshots' derived structures
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._snapshot = TableSnapshot(self.reader.version, self.reader.columns, self.reader.rows)
+
+    def _refresh(self):
+        """Return the snapshot of the latest published version, loading it if it is new"""
+        with self._lock:
+            if self.reader.refresh():
+                self._snapshot = TableSnapshot(self.reader.version, self.reader.columns, self.reader.rows)
+            return self._snapshot
+
+    def _current(self):
+        return getattr(self._local, 'snapshot', None) or self._snapshot
+
+    @contextmanager
+    def _pinned(self):
+        previous = getattr(self._local, 'snapshot', None)
+        self._local.snapshot = previous or self._refresh()
+        try:
+            yield
+        finally:
+            self._local.snapshot = previous
+
+    @property
+    def data(self):
+        return self._current().rows
+
+    def _for_version(self, name, build):
+        # structures derived from the table are rebuilt lazily for each published version,
+        # since the writer's incremental updates are not shared
+        snapshot = self._current()
+        with self._lock:
+            if name not in snapshot.derived:
+                snapshot.derived[name] = build(snapshot)
+            return snapshot.derived[name]
+
+    @property
+    def statistics(self):
+        return self._for_version('statistics', lambda snapshot: TableStatistics(list(snapshot.columns), snapshot.rows))
+
+    @property
+    def row_seq(self):
+        return self._for_version('row_seq', lambda snapshot: {id(row): position
+                                                              for position, row in enumerate(snapshot.rows)})
+
+    @property
+    def indexes(self):
+        return self._for_version('indexes', self._build_indexes)
+
+    def _build_indexes(self, snapshot):
+        row_seq = self.row_seq
+        indexes = {}
+        for column in self._indexed_columns:
+            index = SortedIndex(column)
+            index.build((row_seq[id(row)], row) for row in snapshot.rows)
+            indexes[column] = index
+        return indexes
+
+    def create_index(self, column):
+        """
+        Indexes a column of every published version; each version's index is built by the first query that needs it.
+
+        :param column: The column to index.
+        :raises ValueError: If the column does not exist.
+        """
+        if column not in self.get_columns():
+            raise ValueError(f"Cannot index unknown column: {column}")
+        with self._lock:
+            if column not in self._indexed_columns:
+                self._indexed_columns.append(column)
+                self._snapshot.derived.pop('indexes', None)
+
+    def drop_index(self, column):
+        with self._lock:
+            if column in self._indexed_columns:
+                self._indexed_columns.remove(column)
+                self._snapshot.derived.pop('indexes', None)
+
+    def _table_search(self):
+        return self._for_version('search', lambda snapshot: TableSearchText(snapshot.rows, list(snapshot.columns)))
+
+    def read(self):
+        return self._refresh().rows
+
+    def write(self):
+        pass
+
+    def add_record(self, record):
+        raise PermissionError("Writes to a shared table are applied by the writer process")
+
+    def delete_record(self, conditions):
+        raise PermissionError("Writes to a shared table are applied by the writer process")
+
+    def update_record(self, conditions, target_column, new_value):
+        raise PermissionError("Writes to a shared table are applied by the writer process")
+
+    def query_records(self, query_conditions, columns=None, limit=None, offset=0):
+        with self._pinned():
+            return super().query_records(query_conditions, columns=columns, limit=limit, offset=offset)
+
+    def aggregate_records(self, query_conditions, function, column=None, limit=None, offset=0):
+        with self._pinned():
+            return super().aggregate_records(query_conditions, function, column=column, limit=limit, offset=offset)
+
+    def get_statistics(self, top=10):
+        with self._pinned():
+            return super().get_statistics(top)
+
+    def estimate_rows(self, query_conditions):
+        with self._pinned():
+            return super().estimate_rows(query_conditions)
+
+    def version_tag(self):
+        """Return a string identifying the latest published version of the table"""
+        return self.reader.current_segment()
+
+    def get_columns(self):
+        return list(self._current().columns)
@@ -0,0 +1,277 @@
+import os
+import struct
+import threading
+import time
+import uuid
+import logging
+from array import array
+from itertools import accumulate
+from multiprocessing import shared_memory
+
+try:
+    from multiprocessing import resource_tracker
+except ImportError:
+    resource_tracker = None
+
+# Control block: magic, sequence counter (odd while being updated), table version,
+# name of the shared memory segment holding that version. Segment names carry a
+# per-writer token, so a name identifies one version even across writer restarts.
+CONTROL_FORMAT = '<4sQQ64s'
+CONTROL_MAGIC = b'CSVC'
+CONTROL_SIZE = struct.calcsize(CONTROL_FORMAT)
+# followed by the process id of the writer that owns the control block
+OWNER_FORMAT = '<Q'
+OWNER_OFFSET = CONTROL_SIZE
+CONTROL_BLOCK_SIZE = CONTROL_SIZE + struct.calcsize(OWNER_FORMAT)
+
+# Table segment: magic, column count, row count, byte length of the cell text,
+# followed by the column names, the cell offsets and the cell text
+TABLE_HEADER_FORMAT = '<4sIIQ'
+TABLE_MAGIC = b'CSVT'
+TABLE_HEADER_SIZE = struct.calcsize(TABLE_HEADER_FORMAT)
+
+# Old segments are kept around for readers that are still attaching to them
+RETAINED_SEGMENTS = 2
+
+_attach_lock = threading.Lock()
+
+
+def pack_table(columns, rows):
+    """
+    Packs a table into the compact shared layout.
+
+    Cell values are concatenated into one UTF-8 text block with a table of 32-bit
+    character offsets, so a reader decodes the text in a single call and slices the
+    cells out of it instead of decoding every cell separately.
+
+    :param columns: List of column names.
+    :param rows: List of row dictionaries.
+    :return: The packed bytes.
+    """
+    cells = [row.get(column) or '' for row in rows for column in columns]
+    offsets = array('I', [0])
+    try:
+        offsets.extend(accumulate(len(cell) for cell in cells))
+    except OverflowError:
+        raise ValueError("Table is too large for the shared layout")
+    text = ''.join(cells).encode('utf-8')
+    names = b''.join(struct.pack('<I', len(encoded)) + encoded for encoded in (c.encode('utf-8') for c in columns))
+    header = struct.pack(TABLE_HEADER_FORMAT, TABLE_MAGIC, len(columns), len(rows), len(text))
+    return header + names + offsets.tobytes() + text
+
+
+def unpack_table(buffer):
+    """
+    Decodes a buffer produced by pack_table.
+
+    :param buffer: A bytes-like object or memoryview over the packed table.
+    :return: A tuple of (columns, rows) where rows is a list of dictionaries.
+    """
+    magic, column_count, row_count, text_length = struct.unpack_from(TABLE_HEADER_FORMAT, buffer, 0)
+    if magic != TABLE_MAGIC:
+        raise ValueError("Not a shared table segment")
+    position = TABLE_HEADER_SIZE
+    columns = []
+    for _ in range(column_count):
+        (length,) = struct.unpack_from('<I', buffer, position)
+        position += 4
+        columns.append(bytes(buffer[position:position + length]).decode('utf-8'))
+        position += length
+    cell_count = column_count * row_count
+    offsets = array('I')
+    offsets.frombytes(bytes(buffer[position:position + (cell_count + 1) * offsets.itemsize]))
+    position += (cell_count + 1) * offsets.itemsize
+    text = bytes(buffer[position:position + text_length]).decode('utf-8')
+
+    rows = []
+    cell = 0
+    for _ in range(row_count):
+        row = {}
+        for column in columns:
+            row[column] = text[offsets[cell]:offsets[cell + 1]]
+            cell += 1
+        rows.append(row)
+    return columns, rows
+
+
+def _attach(name):
+    # Attaching would register the segment with the resource tracker, which is shared with
+    # the writer after a fork and would unlink the segment when this reader exits
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    if resource_tracker is None:
+        return shared_memory.SharedMemory(name=name)
+    # before Python 3.13 the registration can only be skipped by swapping the module's register
+    # for the duration of the attach; attaches are serialized so that an overlapping one cannot
+    # restore the swapped function, and registrations of anything else still go through
+    with _attach_lock:
+        register = resource_tracker.register
+
+        def register_others(resource_name, rtype):
+            if rtype != 'shared_memory' or resource_name.lstrip('/') != name:
+                register(resource_name, rtype)
+
+        resource_tracker.register = register_others
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # exists, but belongs to another user
+        return True
+    return True
+
+
+class SharedTableWriter:
+    """
+    Publishes versions of a table into shared memory for SharedTableReader instances
+    in other processes.
+
+    Every publish writes a new segment and then switches the control block to it under
+    a sequence counter, so readers never observe a half-written table.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.version = 0
+        self.token = uuid.uuid4().hex[:8]
+        self._segments = []
+        try:
+            self.control = shared_memory.SharedMemory(name=f'{name}_ctl', create=True, size=CONTROL_BLOCK_SIZE)
+        except FileExistsError:
+            self._remove_stale_control()
+            self.control = shared_memory.SharedMemory(name=f'{name}_ctl', create=True, size=CONTROL_BLOCK_SIZE)
+        struct.pack_into(CONTROL_FORMAT, self.control.buf, 0, CONTROL_MAGIC, 0, 0, b'')
+        struct.pack_into(OWNER_FORMAT, self.control.buf, OWNER_OFFSET, os.getpid())
+
+    def _remove_stale_control(self):
+        """
+        Unlinks a control block left behind by a writer that did not shut down cleanly.
+
+        :raises FileExistsError: If the writer that owns it is still running.
+        """
+        stale = shared_memory.SharedMemory(name=f'{self.name}_ctl')
+        try:
+            owner = None
+            if len(stale.buf) >= CONTROL_BLOCK_SIZE and bytes(stale.buf[:4]) == CONTROL_MAGIC:
+                (owner,) = struct.unpack_from(OWNER_FORMAT, stale.buf, OWNER_OFFSET)
+            if owner and _process_alive(owner):
+                raise FileExistsError(f"Shared table '{self.name}' is already published by process {owner}")
+        finally:
+            stale.close()
+        stale.unlink()
+
+    def publish(self, columns, rows):
+        """
+        Publishes a new version of the table.
+
+        :param columns: List of column names.
+        :param rows: List of row dictionaries.
+        :return: The new version number.
+        """
+        payload = pack_table(columns, rows)
+        version = self.version + 1
+        segment_name = f'{self.name}_{self.token}_v{version}'
+        segment = shared_memory.SharedMemory(name=segment_name, create=True, size=max(len(payload), 1))
+        segment.buf[:len(payload)] = payload
+
+        (sequence,) = struct.unpack_from('<Q', self.control.buf, 4)
+        struct.pack_into('<Q', self.control.buf, 4, sequence + 1)
+        struct.pack_into('<Q64s', self.control.buf, 12, version, segment_name.encode('ascii'))
+        struct.pack_into('<Q', self.control.buf, 4, sequence + 2)
+        self.version = version
+
+        self._segments.append(segment)
+        while len(self._segments) > RETAINED_SEGMENTS:
+            old = self._segments.pop(0)
+            old.close()
+            old.unlink()
+        logging.debug(f"Published shared table '{self.name}' version {version} ({len(payload)} bytes)")
+        return version
+
+    def close(self):
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        self._segments = []
+        self.control.close()
+        self.control.unlink()
+
+
+class SharedTableReader:
+    """
+    Attaches to a table published by a SharedTableWriter.
+
+    Checking for a new version is a read of the control block's version field, cheap
+    enough to do before every query; the table is only decoded when the version changed.
+    """
+
+    def __init__(self, name, attach_timeout=10.0):
+        self.name = name
+        self.version = 0
+        self.segment_name = None
+        self.columns = []
+        self.rows = []
+        deadline = time.monotonic() + attach_timeout
+        while True:
+            try:
+                self.control = _attach(f'{name}_ctl')
+                break
+            except FileNotFoundError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+        self.refresh()
+
+    def current_version(self):
+        return struct.unpack_from('<Q', self.control.buf, 12)[0]
+
+    def current_segment(self):
+        """Return the name of the latest published segment, which uniquely identifies its version"""
+        return self._read_control()[1]
+
+    def _read_control(self):
+        while True:
+            magic, sequence, version, segment_name = struct.unpack_from(CONTROL_FORMAT, self.control.buf, 0)
+            if magic != CONTROL_MAGIC:
+                raise ValueError(f"Shared memory '{self.name}_ctl' is not a shared table control block")
+            if sequence % 2 == 0 and struct.unpack_from('<Q', self.control.buf, 4)[0] == sequence:
+                return version, segment_name.rstrip(b'\0').decode('ascii')
+            time.sleep(0)
+
+    def refresh(self):
+        """
+        Loads the latest published version if it is newer than the one held.
+
+        :return: True if a new version was loaded.
+        """
+        if self.current_version() == self.version:
+            return False
+        while True:
+            version, segment_name = self._read_control()
+            if version == self.version or not segment_name:
+                return False
+            try:
+                segment = _attach(segment_name)
+            except FileNotFoundError:
+                # superseded and unlinked between reading the control block and attaching
+                continue
+            try:
+                self.columns, self.rows = unpack_table(segment.buf)
+            finally:
+                segment.close()
+            self.version = version
+            self.segment_name = segment_name
+            return True
+
+    def close(self):
+        self.control.close()
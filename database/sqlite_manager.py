@@ -0,0 +1,368 @@
+import logging
+import sqlite3
+import threading
+
+from database.database_interface import DatabaseInterface
+from database.query_ast import Predicate, And, from_conditions
+from database.column_stats import TableStatistics
+
+DEFAULT_COLUMNS = ('C1', 'C2', 'C3')
+
+# the trigram tokenizer indexes every run of three characters, so shorter values cannot be searched
+TRIGRAM_LENGTH = 3
+
+COMPARISON_OPERATORS = ('==', '!=', '<', '<=', '>', '>=')
+
+
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def fts_phrase(value):
+    """Quote a value as an FTS5 phrase, so it is matched literally"""
+    return '"' + value.replace('"', '""') + '"'
+
+
+def glob_prefix(value):
+    """Return a GLOB pattern matching the strings that start with value"""
+    return ''.join('[' + character + ']' if character in '*?[' else character for character in value) + '*'
+
+
+def _lower(value):
+    return value.lower() if value is not None else None
+
+
+class SQLiteDatabase(DatabaseInterface):
+    """
+    An embedded engine storing the table in an SQLite file, for durable indexed storage
+    without a database server.
+
+    The database runs in WAL mode, so readers never block the writer or each other, and
+    every thread gets its own connection. Writes are collected in one transaction that
+    write() commits, so a whole write batch costs one fsync. '&=' and '$=' predicates are
+    narrowed with an FTS5 trigram index when the SQLite library provides one.
+    """
+
+    def __init__(self, filepath, table_name='record', columns=DEFAULT_COLUMNS, indexed_columns=None, full_text=True):
+        """
+        Opens the database file, creating the table if it does not exist yet.
+
+        :param filepath: Path to the SQLite database file.
+        :param table_name: The table holding the records.
+        :param columns: Column names of a newly created table; an existing table keeps its own.
+        :param indexed_columns: Columns to create an index on.
+        :param full_text: Maintain an FTS5 trigram index for substring and case-insensitive searches.
+        """
+        self.filepath = filepath
+        self.table_name = table_name
+        self.fts_table = f'{table_name}_fts'
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._statistics = None
+
+        connection = self._connection()
+        # WAL is a property of the database file, so setting it once covers every connection
+        connection.execute('PRAGMA journal_mode=WAL')
+        self.columns = self._table_columns(connection)
+        if not self.columns:
+            self._create_table(connection, columns)
+            self.columns = list(columns)
+        self.full_text = full_text and self._fts_available(connection)
+        if self.full_text:
+            self._create_full_text_index(connection)
+        for column in indexed_columns or []:
+            self.create_index(column)
+        logging.debug(f"Opened SQLite database {filepath}, table: {table_name}, columns: {self.columns}")
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # autocommit mode, transactions are opened explicitly by the first write; the connection
+            # is only used by this thread, the check is off so that close() can close it
+            connection = sqlite3.connect(self.filepath, isolation_level=None, timeout=30, check_same_thread=False)
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.create_function('py_lower', 1, _lower, deterministic=True)
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def _table_columns(self, connection):
+        rows = connection.execute(f'PRAGMA table_info({quote_identifier(self.table_name)})').fetchall()
+        return [row[1] for row in rows]
+
+    def _create_table(self, connection, columns):
+        definitions = ', '.join(f"{quote_identifier(column)} TEXT NOT NULL DEFAULT ''" for column in columns)
+        connection.execute(f'CREATE TABLE {quote_identifier(self.table_name)} ({definitions})')
+        logging.info(f"Table '{self.table_name}' created successfully.")
+
+    @staticmethod
+    def _fts_available(connection):
+        try:
+            connection.execute("CREATE VIRTUAL TABLE temp.fts_probe USING fts5(value, tokenize='trigram')")
+            connection.execute('DROP TABLE temp.fts_probe')
+            return True
+        except sqlite3.OperationalError as e:
+            logging.info(f"SQLite {sqlite3.sqlite_version} has no FTS5 trigram tokenizer, searches will scan: {e}")
+            return False
+
+    def _create_full_text_index(self, connection):
+        """Creates the external-content FTS5 table and the triggers keeping it in sync with the table"""
+        exists = connection.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (self.fts_table,)).fetchone()
+        if exists:
+            return
+        table, fts = quote_identifier(self.table_name), quote_identifier(self.fts_table)
+        names = ', '.join(quote_identifier(column) for column in self.columns)
+        new_values = ', '.join('new.' + quote_identifier(column) for column in self.columns)
+        old_values = ', '.join('old.' + quote_identifier(column) for column in self.columns)
+        delete_old = f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.rowid, {old_values});"
+        insert_new = f"INSERT INTO {fts}(rowid, {names}) VALUES (new.rowid, {new_values});"
+        connection.executescript(f"""
+            BEGIN;
+            CREATE VIRTUAL TABLE {fts} USING fts5({names}, content={table}, content_rowid=rowid, tokenize='trigram');
+            CREATE TRIGGER {quote_identifier(self.fts_table + '_insert')} AFTER INSERT ON {table} BEGIN {insert_new} END;
+            CREATE TRIGGER {quote_identifier(self.fts_table + '_delete')} AFTER DELETE ON {table} BEGIN {delete_old} END;
+            CREATE TRIGGER {quote_identifier(self.fts_table + '_update')} AFTER UPDATE ON {table} BEGIN {delete_old} {insert_new} END;
+            INSERT INTO {fts}({fts}) VALUES ('rebuild');
+            COMMIT;
+        """)
+
+    def create_index(self, column):
+        """
+        Creates an index on a column, if it does not exist yet.
+
+        :param column: The column to index.
+        :raises ValueError: If the column does not exist.
+        """
+        if column not in self.columns:
+            raise ValueError(f"Cannot index unknown column: {column}")
+        index = quote_identifier(f'ix_{self.table_name}_{column}')
+        self._connection().execute(f'CREATE INDEX IF NOT EXISTS {index} ON {quote_identifier(self.table_name)} '
+                                   f'({quote_identifier(column)})')
+
+    def drop_index(self, column):
+        self._connection().execute(f"DROP INDEX IF EXISTS {quote_identifier(f'ix_{self.table_name}_{column}')}")
+
+    def read(self):
+        return self._select(None, self.columns)
+
+    def write(self):
+        """Commits the writes made since the last call in one transaction"""
+        connection = self._connection()
+        if connection.in_transaction:
+            connection.execute('COMMIT')
+        if self._statistics is not None and self._statistics.needs_rebuild():
+            self._statistics = None
+
+    def _begin(self):
+        connection = self._connection()
+        if not connection.in_transaction:
+            # take the write lock up front, instead of upgrading a read lock mid-transaction
+            connection.execute('BEGIN IMMEDIATE')
+        return connection
+
+    def add_record(self, record):
+        values = dict(zip(self.columns, record))
+        row = {column: values.get(column, '') for column in self.columns}
+        names = ', '.join(quote_identifier(column) for column in self.columns)
+        placeholders = ', '.join('?' for _ in self.columns)
+        self._begin().execute(f'INSERT INTO {quote_identifier(self.table_name)} ({names}) VALUES ({placeholders})',
+                              [row[column] for column in self.columns])
+        if self._statistics is not None:
+            self._statistics.add_row(row)
+
+    def _equality_clause(self, conditions):
+        """Return the WHERE clause and parameters for column == value conditions, or None if nothing can match"""
+        if any(column not in self.columns for column in conditions):
+            return None
+        clause = ' AND '.join(f'{quote_identifier(column)} = ?' for column in conditions) or '1'
+        return clause, list(conditions.values())
+
+    def delete_record(self, conditions):
+        equality = self._equality_clause(conditions)
+        if equality is None:
+            return
+        clause, params = equality
+        connection = self._begin()
+        if self._statistics is not None:
+            for row in self._select_sql(connection, self.columns, clause, params):
+                self._statistics.remove_row(row)
+        connection.execute(f'DELETE FROM {quote_identifier(self.table_name)} WHERE {clause}', params)
+
+    def update_record(self, conditions, target_column, new_value):
+        equality = self._equality_clause(conditions)
+        if equality is None:
+            return
+        if target_column not in self.columns:
+            logging.error(f"Error updating records: unknown column {target_column}")
+            return
+        clause, params = equality
+        connection = self._begin()
+        if self._statistics is not None:
+            for row in self._select_sql(connection, [target_column], clause, params):
+                self._statistics.update_value(target_column, row[target_column], new_value)
+        connection.execute(f'UPDATE {quote_identifier(self.table_name)} SET {quote_identifier(target_column)} = ? '
+                           f'WHERE {clause}', [new_value] + params)
+
+    def query_records(self, query_conditions, columns=None, limit=None, offset=0):
+        """
+        Returns the rows matching the query conditions, in insertion order.
+
+        :param query_conditions: An expression node or a legacy condition list; None or empty matches every row.
+        :param columns: Column names to project, or None for whole rows.
+        :param limit: Maximum number of rows to return, or None for no limit.
+        :param offset: Number of matching rows to skip.
+        :return: List of matching rows as dictionaries.
+        """
+        if columns is not None:
+            unknown_columns = [column for column in columns if column not in self.columns]
+            if unknown_columns:
+                raise ValueError(f"Unknown columns: {', '.join(unknown_columns)}")
+        if limit == 0:
+            return []
+        return self._select(from_conditions(query_conditions), columns or self.columns, limit, offset)
+
+    def _select(self, expression, columns, limit=None, offset=0):
+        params = []
+        clause = self._compile_expression(expression, params) if expression is not None else '1'
+        suffix = ''
+        if limit is not None or offset:
+            suffix = ' LIMIT ? OFFSET ?'
+            params += [-1 if limit is None else limit, offset]
+        return self._select_sql(self._connection(), columns, clause, params, suffix)
+
+    def _select_sql(self, connection, columns, clause, params, suffix=''):
+        names = ', '.join(quote_identifier(column) for column in columns)
+        cursor = connection.execute(f'SELECT {names} FROM {quote_identifier(self.table_name)} WHERE {clause} '
+                                    f'ORDER BY rowid{suffix}', params)
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def aggregate_records(self, query_conditions, function, column=None, limit=None, offset=0):
+        """
+        Computes an aggregate over the rows matching the query conditions with a SQL aggregate.
+
+        :param query_conditions: An expression node or a legacy condition list; None or empty matches every row.
+        :param function: 'count', 'count_distinct' or 'group_count'.
+        :param column: The counted or grouped column.
+        :param limit: For 'group_count', the number of groups to return.
+        :param offset: For 'group_count', the number of groups to skip.
+        :return: [{'count': n}] for counts, or [{column: value, 'count': n}, ...] ordered by
+            descending count for group counts.
+        """
+        if column is not None and column not in self.columns:
+            raise ValueError(f"Unknown columns: {column}")
+        expression = from_conditions(query_conditions)
+        params = []
+        clause = self._compile_expression(expression, params) if expression is not None else '1'
+        table = quote_identifier(self.table_name)
+        connection = self._connection()
+        if function == 'count':
+            count = connection.execute(f'SELECT count(*) FROM {table} WHERE {clause}', params).fetchone()[0]
+            return [{'count': count}]
+        elif function == 'count_distinct':
+            count = connection.execute(f'SELECT count(DISTINCT {quote_identifier(column)}) FROM {table} '
+                                       f'WHERE {clause}', params).fetchone()[0]
+            return [{'count': count}]
+        elif function != 'group_count':
+            raise ValueError(f"Unsupported aggregate: {function}")
+        grouped = quote_identifier(column)
+        cursor = connection.execute(f'SELECT {grouped}, count(*) AS n FROM {table} WHERE {clause} GROUP BY {grouped} '
+                                    f'ORDER BY n DESC, {grouped} LIMIT ? OFFSET ?',
+                                    params + [-1 if limit is None else limit, offset])
+        return [{column: value, 'count': count} for value, count in cursor]
+
+    def _compile_expression(self, node, params):
+        """
+        Compiles an expression into an SQL condition, appending its values to params.
+
+        The condition reproduces CSVFileManager's semantics: unknown columns read as empty
+        strings, and text comparisons are by code point, as SQLite's BINARY collation compares
+        UTF-8 bytes in code point order.
+        """
+        if isinstance(node, Predicate):
+            return self._compile_predicate(node.column, node.operator, node.value, params)
+        clauses = [self._compile_expression(child, params) for child in node.children]
+        return '(' + (' AND ' if isinstance(node, And) else ' OR ').join(clauses) + ')'
+
+    def _compile_predicate(self, column, operator, value, params):
+        if column == '*':
+            # any column matches; for != no column equals the value
+            search = self._search_clause(None, operator, value, params)
+            clauses = [self._compile_predicate(name, operator, value, params) for name in self.columns]
+            clause = '(' + (' AND ' if operator == '!=' else ' OR ').join(clauses) + ')'
+            return f'({search} AND {clause})' if search else clause
+        if column in self.columns:
+            cell = quote_identifier(column)
+        else:
+            cell = "''"
+        if operator in COMPARISON_OPERATORS:
+            params.append(value)
+            return f"{cell} {'=' if operator == '==' else operator} ?"
+        elif operator == 'IN':
+            params.extend(value)
+            return f"{cell} IN ({', '.join('?' for _ in value)})"
+        elif operator == '^=':
+            # a GLOB with a literal prefix is answered from an index on the column
+            params.append(glob_prefix(value))
+            return f'{cell} GLOB ?'
+        elif operator == '&=':
+            search = self._search_clause(column, operator, value, params)
+            params.append(value)
+            clause = f'instr({cell}, ?) > 0'
+        elif operator == '$=':
+            search = self._search_clause(column, operator, value, params)
+            params.append(value.lower())
+            clause = f'py_lower({cell}) = ?'
+        else:
+            raise ValueError(f"Unsupported operator: {operator}")
+        return f'({search} AND {clause})' if search else clause
+
+    def _search_clause(self, column, operator, value, params):
+        """
+        Returns a condition narrowing a '&=' or '$=' predicate to the rows the FTS index finds,
+        or None when the index cannot answer it.
+
+        The trigram index folds case, so it finds a superset of the rows; the exact predicate
+        is still evaluated on them. '$=' is only narrowed for ASCII values, whose case folding
+        agrees with str.lower().
+        """
+        if not self.full_text or operator not in ('&=', '$=') or len(value) < TRIGRAM_LENGTH:
+            return None
+        if column is not None and column not in self.columns:
+            return None
+        if operator == '$=' and not value.isascii():
+            return None
+        fts = quote_identifier(self.fts_table)
+        phrase = fts_phrase(value)
+        params.append(phrase if column is None else f'{quote_identifier(column)} : {phrase}')
+        return f'rowid IN (SELECT rowid FROM {fts} WHERE {fts} MATCH ?)'
+
+    @property
+    def statistics(self):
+        if self._statistics is None or self._statistics.needs_rebuild():
+            self._statistics = TableStatistics(self.columns, self.read())
+        return self._statistics
+
+    def get_statistics(self, top=10):
+        """
+        Returns the table's row count and per-column distinct counts, most common values
+        and value-length histograms.
+
+        :param top: Number of most common values to list per column.
+        """
+        return self.statistics.to_dict(top)
+
+    def estimate_rows(self, query_conditions):
+        """Return an estimate of the number of rows matching the query conditions"""
+        return self.statistics.estimate_rows(from_conditions(query_conditions))
+
+    def get_columns(self):
+        return list(self.columns)
+
+    def close(self):
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
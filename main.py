@@ -1,25 +1,23 @@
-from flask import Flask, request, jsonify
-from flask_sqlalchemy import SQLAlchemy
+from flask import Flask, Response, request, jsonify
 from concurrent.futures import ThreadPoolExecutor
-from database.csv_manager import CSVFileManager
-from database.mysql_manager import MySQLDatabase
+from database import get_backend
 from business_logic import BusinessLogic
 from threading_lib.read_write_lock import FairReadWriteLock
-from threading_lib.task_queue import LocalQueue, RabbitMQQueue
+from threading_lib import get_queue
+from response_utils import json_response, not_modified_response, etag_matches
+from metrics import registry, STAGE_LATENCY, WRITE_BATCH_SIZE, WRITE_BATCH_SECONDS
 import threading 
 import logging
+import hashlib
 import time
+import uuid
 import config
-import pymysql
-
-pymysql.install_as_MySQLdb()
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.config.from_object('config')
-db = SQLAlchemy(app)
 
 
 class CSVDatabase:
@@ -33,30 +31,51 @@ class CSVDatabase:
         data_filter: An instance of DataFilter to filter data based on queries.
     """
 
-    def __init__(self, db_type, db_url, max_workers=10, batch_size=10, delay=5, use_rabbitmq=False):
+    def __init__(self, db_type, db_url, max_workers=10, batch_size=10, delay=5, use_rabbitmq=False, task_queue=None,
+                 indexes=None, db_options=None):
         """
         Initializes the CSVDatabase with the given CSV file path.
 
         :param filepath: Path to the CSV file.
+        :param task_queue: Queue to send write commands through; overrides use_rabbitmq.
+        :param indexes: Columns to build sorted indexes on, for engines that support them.
+        :param db_options: Extra keyword arguments for the engine, such as replica_urls for mysql.
         """
         self.lock = FairReadWriteLock()
-        self.task_queue = RabbitMQQueue() if use_rabbitmq else LocalQueue()
+        if task_queue is not None:
+            self.task_queue = task_queue
+        else:
+            self.task_queue = get_queue('rabbitmq' if use_rabbitmq else 'local')()
         self.executor = ThreadPoolExecutor(max_workers=max_workers)
         self.batch_size = batch_size
         self.delay = delay
         self.db_type = db_type
         self.db_url = db_url
+        self.indexes = indexes or []
+        self.db_options = db_options or {}
+        # bumped after every applied write batch; the instance id keeps ETags from
+        # surviving a restart that reloaded different data
+        self.version = 0
+        self.instance_id = uuid.uuid4().hex
         self._init_db()
-        self._start_batch_consumer()
+        # read-only engines forward their writes to the process that owns the table
+        if not getattr(self.db, 'read_only', False):
+            self._start_batch_consumer()
         self._init_business_logic()
 
     def _init_db(self):
-        if self.db_type == 'csv':
-            self.db = CSVFileManager(self.db_url)
-        elif self.db_type == 'mysql':
-            self.db = MySQLDatabase(self.db_url)
-        else:
-            raise ValueError("Unsupported database type")
+        # backends are imported here, only once /init has selected one
+        backend = get_backend(self.db_type)
+        try:
+            self.db = backend(self.db_url, **self.db_options)
+        except TypeError as e:
+            if not self.db_options:
+                raise
+            raise ValueError(f"Invalid options for database type '{self.db_type}': {e}")
+        for column in self.indexes:
+            if not hasattr(self.db, 'create_index'):
+                raise ValueError(f"Database type '{self.db_type}' does not support indexes")
+            self.db.create_index(column)
     
     def _init_business_logic(self):
         BusinessLogic.initialize(self.db)
@@ -67,36 +86,90 @@ class CSVDatabase:
                 time.sleep(self.delay)
                 commands = self.task_queue.get(self.batch_size)
                 if commands:
-                    self._process_write_commands(commands)
-                    for _ in commands:
-                        self.task_queue.task_done()
+                    try:
+                        self._process_write_commands(commands)
+                    except Exception:
+                        # the consumer must outlive a failing batch, or every later write stays queued
+                        logger.exception("Error applying a batch of write commands")
+                    finally:
+                        for _ in commands:
+                            self.task_queue.task_done()
 
         consumer_thread = threading.Thread(target=batch_processor)
         consumer_thread.daemon = True
         consumer_thread.start()
 
     def _process_write_commands(self, commands):
+        # the shutdown sentinel and anything queued after it are not applied, nor counted
+        if None in commands:
+            commands = commands[:commands.index(None)]
+        WRITE_BATCH_SIZE.observe(len(commands))
+        start = time.perf_counter()
+        # parsed before taking the lock, so readers only wait for the writes themselves
+        with STAGE_LATENCY.time('write_parse'):
+            operations = BusinessLogic.parse_batch(commands)
+        lock_start = time.perf_counter()
         with self.lock.write_lock():
-            for command in commands:
-                if command is None:
-                    break
-                # self.data_modifier.parse_command(command)
-            # if self.file_manager.data_modified:
-            #     self.file_manager.write()  
-                BusinessLogic.modify_data(command)
+            STAGE_LATENCY.observe(time.perf_counter() - lock_start, 'write_lock_wait')
+            BusinessLogic.apply_batch(operations)
             self.db.write()
+            self.version += 1
+        WRITE_BATCH_SECONDS.observe(time.perf_counter() - start)
 
     def query_data(self, query_str):
         """
         Parses the query string and filters the data accordingly.
 
         :param query_str: A SQL-like query string.
-        :return: Filtered data based on the query.
+        :return: A tuple of (filtered rows, next page cursor or None).
         """
+        start = time.perf_counter()
         with self.lock.read_lock():
-            return BusinessLogic.query_data(query_str)
+            STAGE_LATENCY.observe(time.perf_counter() - start, 'read_lock_wait')
+            return BusinessLogic.query_page(query_str)
              
 
+    def statistics(self, query_str=None, top=10):
+        """
+        Returns the table statistics, and the estimated number of rows a query would match.
+
+        :param query_str: A SQL-like query string to estimate, or None.
+        :param top: Number of most common values to list per column.
+        :return: The statistics dictionary, with 'estimated_rows' when a query was given.
+        :raises ValueError: If the query string cannot be parsed.
+        """
+        with self.lock.read_lock():
+            statistics = self.db.get_statistics(top)
+            if query_str:
+                statistics['estimated_rows'] = BusinessLogic.estimate_rows(query_str)
+        return statistics
+
+    def index_advice(self):
+        """
+        Returns the engine's index recommendations, built from the queries it has run.
+
+        :raises ValueError: If the engine does not record its queries.
+        """
+        if not hasattr(self.db, 'index_advice'):
+            raise ValueError(f"Database type '{self.db_type}' does not advise indexes")
+        return self.db.index_advice()
+
+    def query_etag(self, query_str):
+        """
+        Computes the entity tag for a query: a hash of the table version and the normalized query.
+
+        :param query_str: A SQL-like query string.
+        :return: A hex digest usable as an ETag.
+        :raises ValueError: If the query string cannot be parsed.
+        """
+        normalized = BusinessLogic.normalize_query(query_str)
+        if hasattr(self.db, 'version_tag'):
+            # engines shared with other processes know the table version better than this process
+            tag = f"{self.db.version_tag()}:{normalized}"
+        else:
+            tag = f"{self.instance_id}:{self.version}:{normalized}"
+        return hashlib.sha1(tag.encode('utf-8')).hexdigest()
+
     def modify_data(self, command):
         """
         Parses the modification command and applies it to the data.
@@ -117,13 +190,16 @@ def initialize_database():
     db_url = data.get('db_url')
     use_rabbitmq = data.get('use_rabbitmq', False)
     max_workers = data.get('max_workers', 10)
+    indexes = data.get('indexes', [])
+    db_options = data.get('db_options', {})
 
     if not db_type or not db_url:
         return jsonify({'msg': 'db_type and db_url are required'}), 400
     
     global csv_database
     try:
-        csv_database = CSVDatabase(db_type, db_url, max_workers=max_workers, use_rabbitmq=use_rabbitmq)
+        csv_database = CSVDatabase(db_type, db_url, max_workers=max_workers, use_rabbitmq=use_rabbitmq,
+                                   indexes=indexes, db_options=db_options)
         return jsonify({'result': 'Database initialized successfully'})
     except ValueError as e:
         return jsonify({'msg': str(e)}), 400
@@ -139,11 +215,26 @@ def handle_query_request():
     """
     query = request.args.get('query')
     if query:
-        logger.debug(f"Received query: {query}")
+        logger.debug("Received query: %s", query)
+        try:
+            # computed before the query runs, so a concurrent write can only make the tag stale, never the body
+            etag = csv_database.query_etag(query)
+        except ValueError as e:
+            return jsonify({'msg': str(e)}), 400
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return not_modified_response(etag)
         future = csv_database.executor.submit(csv_database.query_data, query)
-        results = future.result()
-        logger.debug(f"Query results: {results}")
-        return jsonify({'result': results})
+        try:
+            with STAGE_LATENCY.time('execute'):
+                results, next_cursor = future.result()
+        except ValueError as e:
+            return jsonify({'msg': str(e)}), 400
+        logger.debug("Query results: %s", results)
+        response = {'result': results}
+        if next_cursor is not None:
+            response['next_cursor'] = next_cursor
+        with STAGE_LATENCY.time('serialize'):
+            return json_response(response, etag=etag, accept_encoding=request.headers.get('Accept-Encoding'))
     else:
         logger.debug("No valid parameters provided")
         return jsonify({'msg': 'No valid parameters provided'}), 400
@@ -154,13 +245,86 @@ def handle_modify_request():
     data = request.get_json()
     job = data.get('job')
     if job:
-        logger.debug(f"Received job: {job}")
+        logger.debug("Received job: %s", job)
         csv_database.modify_data(job)
         return jsonify({'result': 'Success'})
     else:
         logger.debug("No valid job parameter provided")
         return jsonify({'msg': 'No valid job parameter provided'}), 400
 
+# Route to expose table statistics
+@app.route('/stats', methods=['GET'])
+def handle_stats_request():
+    try:
+        statistics = csv_database.statistics(request.args.get('query'), top=request.args.get('top', 10, type=int))
+    except ValueError as e:
+        return jsonify({'msg': str(e)}), 400
+    return json_response({'result': statistics}, accept_encoding=request.headers.get('Accept-Encoding'))
+
+# Route to list the indexes recommended from the query log
+@app.route('/indexes', methods=['GET'])
+def handle_index_advice_request():
+    try:
+        advice = csv_database.index_advice()
+    except ValueError as e:
+        return jsonify({'msg': str(e)}), 400
+    return jsonify({'result': advice})
+
+def collect_lock_stats():
+    if 'csv_database' not in globals():
+        return []
+    stats = csv_database.lock.stats()
+    lines = []
+    for name, metric_type, key in (('rw_lock_acquired_total', 'counter', 'acquired'),
+                                   ('rw_lock_contended_total', 'counter', 'contended'),
+                                   ('rw_lock_timeouts_total', 'counter', 'timeouts'),
+                                   ('rw_lock_wait_seconds_total', 'counter', 'wait_total'),
+                                   ('rw_lock_wait_seconds_max', 'gauge', 'wait_max'),
+                                   ('rw_lock_hold_seconds_total', 'counter', 'hold_total'),
+                                   ('rw_lock_hold_seconds_max', 'gauge', 'hold_max')):
+        lines.append(f"# TYPE {name} {metric_type}")
+        for mode in ('read', 'write'):
+            lines.append(f'{name}{{mode="{mode}"}} {stats[mode][key]}')
+    lines.append("# TYPE rw_lock_waiting gauge")
+    lines.append(f'rw_lock_waiting{{mode="read"}} {stats["readers_waiting"]}')
+    lines.append(f'rw_lock_waiting{{mode="write"}} {stats["writers_waiting"]}')
+    return lines
+
+registry.register_collector(collect_lock_stats)
+
+def collect_query_cache_stats():
+    if 'csv_database' not in globals():
+        return []
+    cache_policy = getattr(csv_database.db, 'cache_policy', None)
+    if cache_policy is None:
+        return []
+    stats = cache_policy.stats()
+    lines = []
+    for name, key in (('query_cache_bytes', 'bytes'),
+                      ('query_cache_budget_bytes', 'budget_bytes'),
+                      ('query_cache_entries', 'entries')):
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {stats[key]}")
+    if stats['hit_ratio'] is not None:
+        lines.append("# TYPE query_cache_hit_ratio gauge")
+        lines.append(f"query_cache_hit_ratio {stats['hit_ratio']}")
+    lines.append("# TYPE query_cache_lookups_total counter")
+    lines.append(f'query_cache_lookups_total{{result="hit"}} {stats["hits"]}')
+    lines.append(f'query_cache_lookups_total{{result="miss"}} {stats["misses"]}')
+    lines.append("# TYPE query_cache_admissions_total counter")
+    lines.append(f'query_cache_admissions_total{{result="admitted"}} {stats["admitted"]}')
+    lines.append(f'query_cache_admissions_total{{result="rejected"}} {stats["rejected"]}')
+    lines.append("# TYPE query_cache_evictions_total counter")
+    lines.append(f"query_cache_evictions_total {stats['evicted']}")
+    return lines
+
+registry.register_collector(collect_query_cache_stats)
+
+# Route to expose pipeline metrics
+@app.route('/metrics', methods=['GET'])
+def handle_metrics_request():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
 # Main function to start the server
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
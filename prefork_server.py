@@ -0,0 +1,87 @@
+"""
+Runs the server as several pre-forked processes sharing one CSV table.
+
+The parent process owns the CSV file: it applies the write batches and publishes every
+new version of the table into shared memory. Each forked worker serves HTTP requests on
+the shared listening socket, answers queries from the published table and forwards write
+jobs to the parent through a process queue, so reads scale across cores instead of
+contending for one interpreter lock.
+
+Usage: python prefork_server.py data.csv [--workers 4] [--port 5000]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+
+from werkzeug.serving import make_server
+
+import main
+from threading_lib.task_queue import ProcessQueue
+
+logger = logging.getLogger(__name__)
+
+
+def serve_worker(listen_fd, host, port, table_name, mp_queue, max_workers):
+    main.csv_database = main.CSVDatabase('csv_shared', table_name, max_workers=max_workers,
+                                         task_queue=ProcessQueue(mp_queue))
+    server = make_server(host, port, main.app, threaded=True, fd=listen_fd)
+    logger.info(f"Worker {os.getpid()} serving table '{table_name}'")
+    server.serve_forever()
+
+
+def main_loop():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('csv_path')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--table-name', default=f'csvdb_{os.getpid()}')
+    parser.add_argument('--max-workers', type=int, default=10, help='query threads per worker process')
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--delay', type=float, default=5)
+    args = parser.parse_args()
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((args.host, args.port))
+    listener.listen(128)
+    listener.set_inheritable(True)
+
+    # Fork before the writer starts its consumer thread; workers wait for the first publish
+    context = multiprocessing.get_context('fork')
+    mp_queue = context.Queue()
+    workers = []
+    for _ in range(args.workers):
+        worker = context.Process(target=serve_worker, args=(listener.fileno(), args.host, args.port,
+                                                            args.table_name, mp_queue, args.max_workers))
+        worker.daemon = True
+        worker.start()
+        workers.append(worker)
+
+    writer = main.CSVDatabase('csv', args.csv_path, batch_size=args.batch_size, delay=args.delay,
+                              task_queue=ProcessQueue(mp_queue))
+    writer.db.publish_to(args.table_name)
+    logger.info(f"Writer {os.getpid()} published '{args.csv_path}' as '{args.table_name}' "
+                f"for {args.workers} workers on {args.host}:{args.port}")
+
+    def shutdown(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, shutdown)
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        writer.db.shared_table.close()
+        listener.close()
+
+
+if __name__ == '__main__':
+    main_loop()
@@ -0,0 +1,114 @@
+import gzip
+import json
+import zlib
+from flask import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Bodies smaller than this are sent uncompressed, the header overhead is not worth it
+MIN_COMPRESS_SIZE = 1024
+
+
+def encode_json(payload):
+    """
+    Serializes a response payload to UTF-8 JSON bytes.
+
+    Uses orjson when it is installed, and otherwise the stdlib encoder with compact
+    separators and no key sorting, which is noticeably faster than jsonify on large result lists.
+
+    :param payload: A JSON-serializable object.
+    :return: The encoded bytes.
+    """
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Picks the content coding to use from an Accept-Encoding header.
+
+    :param accept_encoding: The raw header value, may be None.
+    :return: 'gzip', 'deflate' or None for identity.
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(','):
+        parts = item.strip().split(';')
+        coding = parts[0].strip().lower()
+        quality = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    for coding in ('gzip', 'deflate'):
+        if accepted.get(coding, accepted.get('*', 0.0)) > 0:
+            return coding
+    return None
+
+
+def compress_body(body, encoding):
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=5)
+    if encoding == 'deflate':
+        return zlib.compress(body, 5)
+    return body
+
+
+def json_response(payload, status=200, etag=None, accept_encoding=None):
+    """
+    Builds a JSON response, compressed according to the client's Accept-Encoding.
+
+    :param payload: A JSON-serializable object.
+    :param status: HTTP status code.
+    :param etag: Optional entity tag (without quotes) to attach as a weak validator.
+    :param accept_encoding: The request's Accept-Encoding header.
+    :return: A flask Response.
+    """
+    body = encode_json(payload)
+    response = Response(status=status, mimetype='application/json')
+    encoding = negotiate_encoding(accept_encoding) if len(body) >= MIN_COMPRESS_SIZE else None
+    if encoding:
+        body = compress_body(body, encoding)
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    if etag is not None:
+        response.headers['ETag'] = f'W/"{etag}"'
+    response.set_data(body)
+    return response
+
+
+def not_modified_response(etag):
+    response = Response(status=304)
+    response.headers['ETag'] = f'W/"{etag}"'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Checks an If-None-Match header against an entity tag using weak comparison.
+
+    :param if_none_match: The raw header value, may be None.
+    :param etag: The current entity tag (without quotes).
+    :return: True if the client's copy is still current.
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate.strip('"') == etag:
+            return True
+    return False
@@ -0,0 +1,128 @@
+"""Stand-ins for Redis and the clock shared by the unit tests."""
+from database.bloom_filter import COUNTER_MAX
+from database.redis_manager import LOOKUP_SCRIPT, query_key
+
+
+class FakeClock:
+    """A clock that only moves when a test sets it or something sleeps on it"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeRedis:
+    """
+    Keeps strings and sorted sets in dictionaries, without expiry; pipelines run their commands
+    on execute(). The Bloom filter's update script runs on 'u4' fields the way Redis lays them
+    out, the query lookup script and the Redlock unlock script run as they would in Redis, and
+    published messages are kept in order.
+    """
+
+    def __init__(self):
+        self.strings = {}
+        self.sets = {}
+        self.published = []
+
+    def get(self, key):
+        return self.strings.get(key)
+
+    def mget(self, keys):
+        return [self.strings.get(key) for key in keys]
+
+    def set(self, key, value, nx=False, ex=None, px=None):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value if isinstance(value, bytes) else str(value).encode()
+        return True
+
+    def delete(self, *keys):
+        return sum(self.strings.pop(key, None) is not None for key in keys)
+
+    def incr(self, key):
+        value = int(self.strings.get(key, b'0')) + 1
+        self.strings[key] = str(value).encode()
+        return value
+
+    def rename(self, source, destination):
+        self.strings[destination] = self.strings.pop(source)
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+        return 0
+
+    def eval(self, script, numkeys, *keys_and_args):
+        # the Redlock unlock script: the lock is deleted only by the holder of its value
+        key, value = keys_and_args
+        stored = self.strings.get(key)
+        if stored is not None and stored == (value if isinstance(value, bytes) else str(value).encode()):
+            return self.delete(key)
+        return 0
+
+    def close(self):
+        pass
+
+    def zincrby(self, key, amount, member):
+        scores = self.sets.setdefault(key, {})
+        scores[member] = scores.get(member, 0) + amount
+        return scores[member]
+
+    def _ranked(self, key):
+        return sorted(self.sets.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+
+    def zremrangebyrank(self, key, start, end):
+        ranked = self._ranked(key)
+        end = len(ranked) + end if end < 0 else end
+        for member, _ in ranked[start:end + 1]:
+            del self.sets[key][member]
+
+    def zrevrange(self, key, start, end):
+        return [member.encode() for member, _ in reversed(self._ranked(key))][start:end + 1]
+
+    def zunionstore(self, destination, weights):
+        (key, weight), = weights.items()
+        self.sets[destination] = {member: score * weight for member, score in self.sets.get(key, {}).items()}
+
+    def register_script(self, script):
+        if script == LOOKUP_SCRIPT:
+            return lambda keys, args, client=None: (client or self).run_lookup_script(keys, args[0])
+        return lambda keys, args, client=None: (client or self).run_update_script(keys[0], args)
+
+    def run_lookup_script(self, keys, query):
+        # what LOOKUP_SCRIPT does: the generations, then the result cached under them
+        generations = [self.strings.get(key) or b'0' for key in keys]
+        return generations + [self.strings.get(query_key([int(generation) for generation in generations], query))]
+
+    def run_update_script(self, key, arguments):
+        # what UPDATE_SCRIPT does: saturated counters are skipped, the others incremented with OVERFLOW SAT
+        data = bytearray(self.strings.get(key, b''))
+        for offset, delta in zip(arguments[::2], arguments[1::2]):
+            index = int(offset[1:])
+            data.extend(b'\0' * max(0, index // 2 + 1 - len(data)))
+            shift = 4 if index % 2 == 0 else 0
+            value = (data[index // 2] >> shift) & 0x0F
+            if value == COUNTER_MAX:
+                continue
+            value = min(max(value + delta, 0), COUNTER_MAX)
+            data[index // 2] = (data[index // 2] & ~(0x0F << shift) & 0xFF) | (value << shift)
+        self.strings[key] = bytes(data)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
@@ -14,6 +14,10 @@ class TestRedisManager(unittest.TestCase):
         
         # Initialize RedisManager
         self.redis_manager = RedisManager()
+        # start from an empty shared Bloom filter
+        self.mock_redis.get.return_value = b''
+        self.redis_manager.bloom_filter.load()
+        self.mock_redis.reset_mock()
 
     def test_set_and_get(self):
         key = 'test_key'
@@ -44,29 +48,191 @@ class TestRedisManager(unittest.TestCase):
         self.redis_manager.delete(key)
         self.mock_redis.delete.assert_called_once_with(key)
 
+    def test_delete_many(self):
+        self.redis_manager.delete_many(['query:0:a', 'query:0:b'])
+        self.mock_redis.delete.assert_called_once_with('query:0:a', 'query:0:b')
+
+        self.mock_redis.delete.reset_mock()
+        self.redis_manager.delete_many([])
+        self.mock_redis.delete.assert_not_called()
+
     def test_bloom_filter(self):
         key = 'test_key'
         self.redis_manager.add_to_bloom_filter(key)
         self.assertTrue(self.redis_manager.check_bloom_filter(key))
 
-    def test_get_related_query_keys(self):
-        record_id = 'record_id'
-        expected_keys = {b'key1', b'key2'}
-        self.mock_redis.smembers.return_value = expected_keys
+    def test_get_generations(self):
+        self.mock_redis.mget.return_value = [b'3', None]
+
+        self.assertEqual(self.redis_manager.get_generations(['generation:record', 'generation:record:C2']), [3, 0])
+        self.mock_redis.mget.assert_called_once_with(['generation:record', 'generation:record:C2'])
+
+    def test_lookup_query(self):
+        lookup_script = self.mock_redis.register_script.return_value
+        lookup_script.return_value = [b'3', b'0', json.dumps(['1'])]
+
+        result = self.redis_manager.lookup_query(['generation:record', 'generation:record:C2'], 'q')
+
+        # the generations and the result under them come back from one script call
+        self.assertEqual(result, ([3, 0], 'query:3.0:q', ['1']))
+        lookup_script.assert_called_once_with(keys=['generation:record', 'generation:record:C2'], args=['q'])
+        self.mock_redis.get.assert_not_called()
+        self.mock_redis.mget.assert_not_called()
+
+    @patch('database.redis_manager.threading.Thread', autospec=True)
+    def test_lookup_query_from_the_near_cache(self, mock_thread):
+        redis_manager = self._near_cached_manager()
+        lookup_script = self.mock_redis.register_script.return_value
+        lookup_script.return_value = [b'3', json.dumps(['1'])]
+
+        redis_manager.lookup_query(['generation:record'], 'q')
+        self.assertEqual(redis_manager.lookup_query(['generation:record'], 'q'), ([3], 'query:3:q', ['1']))
+        lookup_script.assert_called_once_with(keys=['generation:record'], args=['q'])
+        self.mock_redis.get.assert_not_called()
+
+    def test_bump_generations(self):
+        pipeline = self.mock_redis.pipeline.return_value
+
+        self.redis_manager.bump_generations(['generation:record'])
+
+        pipeline.incr.assert_called_once_with('generation:record')
+        pipeline.execute.assert_called_once_with()
+
+    def test_get_many(self):
+        self.redis_manager.add_to_bloom_filter('record:1')
+        self.redis_manager.add_to_bloom_filter('record:2')
+        self.mock_redis.mget.return_value = [json.dumps({'C1': '1'}), None]
+
+        result = self.redis_manager.get_many(['record:1', 'record:3', 'record:2'])
+
+        # one round trip, and the key the Bloom filter rules out is not requested
+        self.mock_redis.mget.assert_called_once_with(['record:1', 'record:2'])
+        self.assertEqual(result, [{'C1': '1'}, None, None])
+
+    def test_set_many(self):
+        pipeline = self.mock_redis.pipeline.return_value
+
+        self.redis_manager.set_many({'record:1': {'C1': '1'}, 'record:2': None}, ex=3600)
+
+        pipeline.set.assert_any_call('record:1', json.dumps({'C1': '1'}), ex=3600)
+        pipeline.set.assert_any_call('record:2', json.dumps(None), ex=60)
+        pipeline.execute.assert_called_once_with()
+        # the Bloom filter tracks the records that exist, which filling the cache does not change
+        self.assertFalse(self.redis_manager.check_bloom_filter('record:1'))
+
+    def test_cache_query_result(self):
+        pipeline = self.mock_redis.pipeline.return_value
+
+        self.redis_manager.cache_query_result('query:q', ['1', '2'], [{'C1': '1'}, {'C1': '2'}], ex=60,
+                                              record_ex=3600)
+
+        self.mock_redis.pipeline.assert_called_once_with(transaction=False)
+        pipeline.set.assert_any_call('query:q', json.dumps(['1', '2']), ex=60)
+        # the record keys are shared with other queries, so they keep their own expiry
+        pipeline.set.assert_any_call('record:2', json.dumps({'C1': '2'}), ex=3600)
+        pipeline.sadd.assert_not_called()
+        pipeline.publish.assert_called_once_with('query_ready', 'query:q')
+        pipeline.execute.assert_called_once_with()
+        self.mock_redis.set.assert_not_called()
+
+    def test_refresh_records(self):
+        pipeline = self.mock_redis.pipeline.return_value
+
+        self.redis_manager.add_to_bloom_filter('record:2')
+        self.redis_manager.refresh_records([{'C1': '1', 'C2': 'x'}], deleted_ids=['2'], created_ids=['1'],
+                                           generation_keys=['generation:record'])
+
+        # one round trip, and no per-query invalidation
+        self.mock_redis.pipeline.assert_called_once_with(transaction=False)
+        pipeline.smembers.assert_not_called()
+        pipeline.set.assert_called_once_with('record:1', json.dumps({'C1': '1', 'C2': 'x'}))
+        pipeline.delete.assert_called_once_with('record:2')
+        pipeline.incr.assert_called_once_with('generation:record')
+        # the Bloom filter update is queued on the same pipeline
+        update_script = self.mock_redis.register_script.return_value
+        self.assertEqual(update_script.call_args.kwargs['client'], pipeline)
+        self.assertEqual(update_script.call_args.kwargs['keys'], ['bloom:record'])
+        self.assertTrue(self.redis_manager.check_bloom_filter('record:1'))
+        self.assertFalse(self.redis_manager.check_bloom_filter('record:2'))
+
+    def test_refresh_records_without_changes(self):
+        self.redis_manager.refresh_records([])
+        self.mock_redis.pipeline.assert_not_called()
+
+    def _near_cached_manager(self):
+        with patch('database.redis_manager.redis.StrictRedis.from_url', return_value=self.mock_redis):
+            return RedisManager(near_cache_size=10)
+
+    @patch('database.redis_manager.threading.Thread', autospec=True)
+    def test_near_cache(self, mock_thread):
+        redis_manager = self._near_cached_manager()
+        mock_thread.return_value.start.assert_called_once_with()
+        redis_manager.add_to_bloom_filter('record:1')
+        self.mock_redis.get.return_value = json.dumps({'C1': '1'})
+
+        self.assertEqual(redis_manager.get('record:1'), {'C1': '1'})
+        self.assertEqual(redis_manager.get('record:1'), {'C1': '1'})
+        # the second read is served by the process
+        self.mock_redis.get.assert_called_once_with('record:1')
+
+        redis_manager.delete('record:1')
+        channel, message = self.mock_redis.publish.call_args[0]
+        self.assertEqual(json.loads(message), {'origin': redis_manager.origin, 'keys': ['record:1']})
+        redis_manager.get('record:1')
+        self.assertEqual(self.mock_redis.get.call_count, 2)
+
+    @patch('database.redis_manager.threading.Thread', autospec=True)
+    def test_bump_during_generation_read_is_not_undone(self, mock_thread):
+        redis_manager = self._near_cached_manager()
+
+        def bump_while_reading(keys):
+            # this process's write lands between the MGET and the near-cache fill
+            redis_manager.bump_generations(['generation:record'])
+            return [b'3']
+
+        self.mock_redis.mget.side_effect = bump_while_reading
+        self.assertEqual(redis_manager.get_generations(['generation:record']), [3])
+        self.mock_redis.mget.side_effect = None
+        self.mock_redis.mget.return_value = [b'4']
+        self.assertEqual(redis_manager.get_generations(['generation:record']), [4])
+
+    @patch('database.redis_manager.threading.Thread', autospec=True)
+    def test_invalidation_messages(self, mock_thread):
+        redis_manager = self._near_cached_manager()
+        redis_manager.cache_query_result('query:q', ['1'], [{'C1': '1'}])
+
+        # a process skips the invalidations it published itself
+        own = json.dumps({'origin': redis_manager.origin, 'keys': ['query:q']})
+        redis_manager._handle_invalidation({'type': 'message', 'data': own.encode()})
+        self.assertEqual(redis_manager.get_query_result('query:q'), ['1'])
+        self.mock_redis.get.assert_not_called()
+
+        other = json.dumps({'origin': 'other', 'keys': ['query:q', 'record:1']})
+        redis_manager._handle_invalidation({'type': 'message', 'data': other.encode()})
+        redis_manager._handle_invalidation({'type': 'message', 'data': b'not json'})
+        self.mock_redis.get.return_value = None
+        self.assertIsNone(redis_manager.get_query_result('query:q'))
+        self.assertEqual(len(redis_manager.near_cache), 0)
 
-        result = self.redis_manager.get_related_query_keys(record_id)
-        self.mock_redis.smembers.assert_called_once_with(f'record_queries:{record_id}')
-        self.assertEqual(result, expected_keys)
+    @patch('database.redis_manager.threading.Thread', autospec=True)
+    def test_wait_for_query_result(self, mock_thread):
+        self.mock_redis.get.side_effect = [None, json.dumps(['1'])]
 
-    def test_add_and_remove_related_query_key(self):
-        record_id = 'record_id'
-        query_key = 'query_key'
+        def announce(timeout):
+            self.redis_manager._handle_message({'type': 'message', 'channel': b'query_ready', 'data': b'query:q'})
+            return True
 
-        self.redis_manager.add_related_query_key(record_id, query_key)
-        self.mock_redis.sadd.assert_called_once_with(f'record_queries:{record_id}', query_key)
+        with patch('database.redis_manager.threading.Event') as mock_event:
+            mock_event.return_value.wait.side_effect = announce
+            self.assertEqual(self.redis_manager.wait_for_query_result('query:q', 1.0), ['1'])
+        mock_event.return_value.set.assert_called_once_with()
+        mock_thread.return_value.start.assert_called_once_with()
+        self.assertEqual(self.redis_manager._waiters, {})
 
-        self.redis_manager.remove_related_query_key(record_id, query_key)
-        self.mock_redis.srem.assert_called_once_with(f'record_queries:{record_id}', query_key)
+    @patch('database.redis_manager.threading.Thread', autospec=True)
+    def test_wait_for_query_result_times_out(self, mock_thread):
+        self.assertIsNone(self.redis_manager.wait_for_query_result('query:q', 0.01))
+        self.assertEqual(self.mock_redis.get.call_count, 1)
 
     @patch('database.redis_manager.Redlock.lock', autospec=True)
     @patch('database.redis_manager.Redlock.unlock', autospec=True)
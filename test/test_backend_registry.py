@@ -0,0 +1,39 @@
+import subprocess
+import sys
+import unittest
+
+from database import get_backend
+from database.csv_manager import CSVFileManager
+from threading_lib import get_queue
+from threading_lib.task_queue import LocalQueue
+
+
+class TestBackendRegistry(unittest.TestCase):
+    def test_get_backend(self):
+        self.assertIs(get_backend('csv'), CSVFileManager)
+        with self.assertRaises(ValueError):
+            get_backend('oracle')
+
+    def test_get_queue(self):
+        self.assertIs(get_queue('local'), LocalQueue)
+        with self.assertRaises(ValueError):
+            get_queue('kafka')
+
+    def test_local_queue_batches(self):
+        q = LocalQueue()
+        for i in range(3):
+            q.put(i)
+        self.assertEqual(q.get(2), [0, 1])
+        self.assertEqual(q.get(2), [2])
+        self.assertEqual(q.get(2), [])
+
+    def test_csv_worker_does_not_import_other_backends(self):
+        code = ("import sys, main; main.CSVDatabase('csv', 'test/test_dataset.csv'); "
+                "print(sorted(m for m in ('sqlalchemy', 'flask_sqlalchemy', 'pymysql', 'pika', 'redis', 'redlock') "
+                "if m in sys.modules))")
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip().splitlines()[-1], '[]')
+
+
+if __name__ == '__main__':
+    unittest.main()
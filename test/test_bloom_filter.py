@@ -0,0 +1,127 @@
+import threading
+import unittest
+
+from database.bloom_filter import SharedBloomFilter, optimal_size, COUNTER_MAX, LOAD_RETRY_INTERVAL
+from test.fakes import FakeClock, FakeRedis
+
+
+class TestSharedBloomFilter(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeRedis()
+        self.clock = FakeClock()
+        self.filter = self._filter()
+
+    def _filter(self):
+        return SharedBloomFilter(self.client, capacity=1000, error_rate=0.01, refresh_interval=30.0, clock=self.clock)
+
+    def test_optimal_size(self):
+        self.assertEqual(optimal_size(1000, 0.01), (9586, 7))
+
+    def test_unloaded_filter_lets_everything_through(self):
+        self.assertIn('record:1', self.filter)
+
+    def test_rebuild_is_shared(self):
+        self.filter.rebuild(f'record:{i}' for i in range(100))
+        other = self._filter()
+        other.load()
+        for i in range(100):
+            self.assertIn(f'record:{i}', other)
+        false_positives = sum(f'record:{i}' in other for i in range(100, 1100))
+        self.assertLess(false_positives, 30)
+
+    def test_updates_reach_redis_and_other_processes(self):
+        self.filter.rebuild([])
+        other = self._filter()
+        other.load()
+        self.filter.update(added=['record:1', 'record:2'])
+        self.assertIn('record:1', self.filter)
+        self.assertNotIn('record:1', other)
+        # the other process sees the addition once its copy is refreshed in the background
+        self.clock.now = 30.0
+        self._reload(other)
+        self.assertIn('record:1', other)
+        other.update(removed=['record:1'])
+        self.assertNotIn('record:1', other)
+        self.assertIn('record:2', other)
+        self.clock.now = 60.0
+        self._reload(self.filter)
+        self.assertNotIn('record:1', self.filter)
+
+    def _reload(self, bloom_filter):
+        # a check that finds the copy due starts the reload and answers from the old copy
+        'record:0' in bloom_filter
+        reloader = bloom_filter._reloader
+        if reloader is not None:
+            reloader.join(5)
+        self.assertIsNone(bloom_filter._reloader)
+
+    def test_reload_does_not_block_checks(self):
+        self.filter.rebuild([])
+        loading = threading.Event()
+        release = threading.Event()
+        get = self.client.get
+
+        def slow_get(key):
+            loading.set()
+            release.wait(5)
+            return get(key)
+
+        self.client.get = slow_get
+        self.clock.now = 30.0
+        self.assertNotIn('record:1', self.filter)
+        self.assertTrue(loading.wait(5))
+        # the check while the array is fetched does not wait for it, nor start another reload
+        reloader = self.filter._reloader
+        self.assertNotIn('record:1', self.filter)
+        self.assertIs(self.filter._reloader, reloader)
+        release.set()
+        reloader.join(5)
+
+    def test_saturated_counters_are_not_decremented(self):
+        self.filter.rebuild([])
+        other = self._filter()
+        other.load()
+        for _ in range(COUNTER_MAX + 5):
+            self.filter.update(added=['record:1'])
+        # the other process's copy is not saturated, but Redis' counters are
+        other.update(removed=['record:1'])
+        other.load()
+        self.assertIn('record:1', other)
+        self.assertEqual(bytes(self.filter._counters), self.client.get(self.filter.key))
+
+    def test_filter_is_not_loaded_before_it_is_built(self):
+        # another worker holds the rebuild claim but has not stored the filter yet
+        self.client.set(f'{self.filter.key}:rebuilt', 1, nx=True)
+        self.filter.rebuild_or_load(lambda: self.fail('the table is scanned once'))
+        self.assertIsNone(self.filter._counters)
+        self.assertIn('record:1', self.filter)
+
+        builder = self._filter()
+        builder.rebuild(['record:1'])
+        # the next check after the retry interval loads the stored filter
+        self.clock.now = LOAD_RETRY_INTERVAL
+        self._reload(self.filter)
+        self.assertIn('record:1', self.filter)
+        self.assertNotIn('record:2', self.filter)
+
+    def test_local_copy_matches_redis(self):
+        self.filter.rebuild(['record:1'])
+        self.filter.update(added=['record:2', 'record:3'], removed=['record:1'])
+        self.assertEqual(bytes(self.filter._counters), self.client.get(self.filter.key))
+
+    def test_only_one_process_rebuilds(self):
+        scans = []
+
+        def keys():
+            scans.append(1)
+            return ['record:1']
+
+        self.filter.rebuild_or_load(keys)
+        other = self._filter()
+        other.rebuild_or_load(keys)
+        self.assertEqual(len(scans), 1)
+        self.assertIn('record:1', other)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import json
+import unittest
+
+from database.cache_codec import JsonCodec, PackedCodec, get_codec
+
+
+class TestPackedCodec(unittest.TestCase):
+    def setUp(self):
+        self.codec = PackedCodec(compress_threshold=64)
+
+    def test_round_trip(self):
+        for value in (['id1', 'id2', 'ü ✓'], [], {'C1': '1', 'C2': '', 'C3': 'ß'}, {}, None, 3,
+                      {'C1': '1', 'C2': None}, [1, 'a'], [''], ['a\x1fb', 'c'], {'C1': '\x1f'}):
+            self.assertEqual(self.codec.decode(self.codec.encode(value)), value)
+
+    def test_packed_is_smaller_than_json(self):
+        record_ids = [f'id{i:07d}' for i in range(1000)]
+        self.assertLess(len(PackedCodec(compress_threshold=float('inf')).encode(record_ids)), len(json.dumps(record_ids)))
+        self.assertLess(len(self.codec.encode(record_ids)), len(json.dumps(record_ids)) / 2)
+
+    def test_compresses_large_values_only(self):
+        small = self.codec.encode(['id1'])
+        self.assertEqual(small[2], 0)
+        large = self.codec.encode(['same value'] * 100)
+        self.assertEqual(large[2], 1)
+        self.assertEqual(self.codec.decode(large), ['same value'] * 100)
+
+    def test_reads_json_values(self):
+        legacy = JsonCodec()
+        for value in (['id1'], {'C1': '1'}, None):
+            self.assertEqual(self.codec.decode(legacy.encode(value).encode('utf-8')), value)
+            self.assertEqual(self.codec.decode(legacy.encode(value)), value)
+
+    def test_get_codec(self):
+        self.assertIsInstance(get_codec('packed'), PackedCodec)
+        with self.assertRaises(ValueError):
+            get_codec('pickle')
+
+
+if __name__ == '__main__':
+    unittest.main()
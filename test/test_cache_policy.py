@@ -0,0 +1,104 @@
+import unittest
+
+from database.cache_policy import CachePolicy, FrequencySketch
+from test.fakes import FakeClock
+
+
+class TestFrequencySketch(unittest.TestCase):
+    def test_estimate(self):
+        sketch = FrequencySketch(width=64)
+        for _ in range(3):
+            sketch.increment('a')
+        sketch.increment('b')
+        self.assertGreaterEqual(sketch.estimate('a'), 3)
+        self.assertGreaterEqual(sketch.estimate('b'), 1)
+        self.assertLess(sketch.estimate('b'), sketch.estimate('a'))
+
+    def test_aging_halves_counters(self):
+        sketch = FrequencySketch(width=64, sample_size=8)
+        for _ in range(7):
+            sketch.increment('a')
+        self.assertEqual(sketch.estimate('a'), 7)
+        sketch.increment('a')
+        self.assertEqual(sketch.estimate('a'), 4)
+
+
+class TestCachePolicy(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.policy = CachePolicy(byte_budget=100, min_ttl=10, max_ttl=1000, clock=self.clock)
+
+    def access(self, query, times, hit=False):
+        for _ in range(times):
+            self.policy.record_access(query, hit)
+
+    def test_admits_while_under_budget(self):
+        self.access('a', 1)
+        self.assertEqual(self.policy.admit('key:a', 'a', 60, 100), (True, []))
+        self.assertEqual(self.policy.stats()['bytes'], 60)
+
+    def test_rejects_result_larger_than_budget(self):
+        self.assertEqual(self.policy.admit('key:a', 'a', 101, 100), (False, []))
+        self.assertEqual(self.policy.stats()['rejected'], 1)
+
+    def test_rejects_colder_result(self):
+        self.access('hot', 5)
+        self.policy.admit('key:hot', 'hot', 60, 100)
+        self.access('cold', 1)
+        self.assertEqual(self.policy.admit('key:cold', 'cold', 60, 100), (False, []))
+        self.assertEqual(self.policy.stats()['entries'], 1)
+
+    def test_evicts_colder_result(self):
+        self.access('cold', 1)
+        self.policy.admit('key:cold', 'cold', 60, 100)
+        self.access('hot', 5)
+        self.assertEqual(self.policy.admit('key:hot', 'hot', 60, 100), (True, ['key:cold']))
+        stats = self.policy.stats()
+        self.assertEqual((stats['entries'], stats['bytes'], stats['evicted']), (1, 60, 1))
+
+    def test_expired_results_are_dropped_without_deleting(self):
+        self.access('cold', 5)
+        self.policy.admit('key:cold', 'cold', 60, 10)
+        self.clock.now = 11
+        self.access('new', 1)
+        self.assertEqual(self.policy.admit('key:new', 'new', 60, 10), (True, []))
+
+    def test_new_generation_replaces_older_result(self):
+        self.access('a', 1)
+        self.policy.admit('query:0:a', 'a', 30, 100)
+        self.assertEqual(self.policy.admit('query:1:a', 'a', 30, 100), (True, ['query:0:a']))
+        self.assertEqual(self.policy.stats()['bytes'], 30)
+
+    def test_hit_ratio(self):
+        self.assertIsNone(self.policy.stats()['hit_ratio'])
+        self.access('a', 1)
+        self.access('a', 3, hit=True)
+        self.assertEqual(self.policy.stats()['hit_ratio'], 0.75)
+
+    def test_ttl_follows_write_rate(self):
+        keys = ['generation:t']
+        self.assertEqual(self.policy.ttl(keys), 1000)
+        self.policy.observe_generations(keys, [0])
+        self.clock.now = 1
+        self.policy.observe_generations(keys, [1])
+        # one write a second, cached for two write intervals but no less than min_ttl
+        self.assertEqual(self.policy.ttl(keys), 10)
+        # a quiet spell since the last write lengthens it
+        self.clock.now = 101
+        self.assertEqual(self.policy.ttl(keys), 200)
+
+    def test_ttl_grows_when_writes_stop(self):
+        keys = ['generation:t']
+        self.policy.observe_generations(keys, [0])
+        self.clock.now = 1
+        self.policy.observe_generations(keys, [1])
+        self.clock.now = 1001
+        self.assertEqual(self.policy.ttl(keys), 1000)
+
+    def test_estimate_size(self):
+        self.assertEqual(CachePolicy.estimate_size(['id1', 'id2']), 8)
+        self.assertEqual(CachePolicy.estimate_size(['id1'], [{'C1': 'id1'}]), 4 + 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
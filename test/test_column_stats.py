@@ -0,0 +1,73 @@
+import unittest
+
+from database.column_stats import HyperLogLog, MostCommonValues, TableStatistics
+from database.query_ast import And, Predicate
+
+
+class TestHyperLogLog(unittest.TestCase):
+    def test_estimate_within_error(self):
+        sketch = HyperLogLog()
+        for i in range(50000):
+            sketch.add(f'value-{i % 20000}')
+        self.assertAlmostEqual(sketch.count(), 20000, delta=20000 * 0.05)
+
+    def test_small_cardinality(self):
+        sketch = HyperLogLog()
+        for value in ('a', 'b', 'c', 'a'):
+            sketch.add(value)
+        self.assertEqual(sketch.count(), 3)
+
+
+class TestMostCommonValues(unittest.TestCase):
+    def test_evicts_the_least_counted_value(self):
+        most_common = MostCommonValues(capacity=3)
+        for value in ['a'] * 5 + ['b'] * 3 + ['c'] * 4:
+            most_common.add(value)
+        most_common.remove('a')
+        most_common.remove('a')
+        # 'a' now has the fewest, so 'd' takes its place with its count plus one
+        most_common.add('d')
+        self.assertEqual(most_common.counts, {'b': 3, 'c': 4, 'd': 4})
+        self.assertFalse(most_common.exhaustive)
+
+    def test_heavy_hitters_survive_a_long_tail(self):
+        most_common = MostCommonValues(capacity=8)
+        for i in range(20000):
+            most_common.add('hot' if i % 3 == 0 else f'cold{i}')
+        self.assertEqual(most_common.top(1)[0][0], 'hot')
+        self.assertLessEqual(len(most_common._heap), 4 * most_common.capacity)
+
+
+class TestTableStatistics(unittest.TestCase):
+    def setUp(self):
+        rows = [{'C1': f'id{i}', 'C2': 'even' if i % 2 == 0 else 'odd', 'C3': 'x' * i} for i in range(200)]
+        self.stats = TableStatistics(['C1', 'C2', 'C3'], rows, mcv_capacity=16)
+
+    def test_summary(self):
+        summary = self.stats.to_dict(top=2)
+        self.assertEqual(summary['row_count'], 200)
+        self.assertEqual(summary['columns']['C2']['distinct'], 2)
+        self.assertEqual(summary['columns']['C2']['most_common'], [['even', 100], ['odd', 100]])
+        self.assertAlmostEqual(summary['columns']['C1']['distinct'], 200, delta=10)
+        self.assertEqual(summary['columns']['C3']['empty'], 1)
+        self.assertEqual(summary['columns']['C3']['length_histogram']['4-7'], 4)
+
+    def test_incremental_updates(self):
+        self.stats.add_row({'C1': 'new', 'C2': 'odd', 'C3': ''})
+        self.stats.remove_row({'C1': 'id0', 'C2': 'even', 'C3': ''})
+        self.stats.update_value('C2', 'even', 'odd')
+        summary = self.stats.to_dict()
+        self.assertEqual(summary['row_count'], 200)
+        self.assertEqual(dict(map(tuple, summary['columns']['C2']['most_common'])), {'even': 98, 'odd': 102})
+
+    def test_selectivity(self):
+        self.assertAlmostEqual(self.stats.selectivity('C2', '==', 'odd'), 0.5)
+        self.assertEqual(self.stats.selectivity('C2', '==', 'none'), 0.0)
+        self.assertAlmostEqual(self.stats.selectivity('C2', '!=', 'odd'), 0.5)
+        self.assertLess(self.stats.selectivity('C1', '==', 'id5'), 0.05)
+        self.assertEqual(self.stats.estimate_rows(And([Predicate('C2', '==', 'odd'), Predicate('C2', '!=', 'none')])), 100)
+        self.assertIsNone(self.stats.selectivity('*', '==', 'x'))
+
+
+if __name__ == '__main__':
+    unittest.main()
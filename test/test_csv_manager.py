@@ -0,0 +1,163 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from database.csv_manager import CSVFileManager
+from database.query_ast import And, Or, Predicate
+
+
+class TestCSVFileManagerQuery(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.tmp_dir, 'data.csv')
+        with open(self.filepath, 'w', newline='') as f:
+            f.write("C1,C2,C3\n")
+            for i in range(10):
+                f.write(f"id{i},{'even' if i % 2 == 0 else 'odd'},value {i}\n")
+        self.manager = CSVFileManager(self.filepath)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_empty_conditions_match_all(self):
+        self.assertEqual(len(self.manager.query_records([])), 10)
+
+    def test_projection(self):
+        rows = self.manager.query_records([('C2', '==', 'odd', '')], columns=['C1'])
+        self.assertEqual(rows, [{'C1': 'id1'}, {'C1': 'id3'}, {'C1': 'id5'}, {'C1': 'id7'}, {'C1': 'id9'}])
+
+    def test_limit_and_offset(self):
+        rows = self.manager.query_records([('C2', '==', 'even', '')], limit=2, offset=1)
+        self.assertEqual([row['C1'] for row in rows], ['id2', 'id4'])
+
+    def test_limit_stops_scan(self):
+        calls = []
+        original = self.manager.match_row
+
+        def counting_match(row, conditions):
+            calls.append(row)
+            return original(row, conditions)
+
+        self.manager.match_row = counting_match
+        self.manager.query_records([], limit=3)
+        self.assertEqual(len(calls), 3)
+
+    def test_range_prefix_and_in_operators(self):
+        rows = self.manager.query_records([('C1', '>=', 'id3', 'and'), ('C1', '<', 'id6', '')])
+        self.assertEqual([row['C1'] for row in rows], ['id3', 'id4', 'id5'])
+        rows = self.manager.query_records([('C3', '^=', 'value 1', '')])
+        self.assertEqual([row['C1'] for row in rows], ['id1'])
+        rows = self.manager.query_records([('C1', 'IN', ('id7', 'id2', 'nope'), '')])
+        self.assertEqual([row['C1'] for row in rows], ['id2', 'id7'])
+
+    def test_index_matches_scan(self):
+        queries = [
+            [('C1', '>', 'id2', 'and'), ('C2', '==', 'odd', '')],
+            [('C1', '<=', 'id4', '')],
+            [('C2', 'IN', ('odd',), 'and'), ('C1', '^=', 'id', '')],
+            [('C1', '==', 'id8', 'or'), ('C2', '==', 'odd', '')],
+        ]
+        expected = [self.manager.query_records(query) for query in queries]
+        self.manager.create_index('C1')
+        self.manager.create_index('C2')
+        self.assertEqual([self.manager.query_records(query) for query in queries], expected)
+
+    def test_index_follows_writes(self):
+        self.manager.create_index('C1')
+        self.manager.add_record(['id55', 'odd', 'new'])
+        self.manager.update_record({'C1': 'id3'}, 'C1', 'id99')
+        self.manager.delete_record({'C1': 'id4'})
+        rows = self.manager.query_records([('C1', '>=', 'id3', 'and'), ('C1', '<', 'id6', '')])
+        self.assertEqual([row['C1'] for row in rows], ['id5', 'id55'])
+        rows = self.manager.query_records([('C1', '^=', 'id9', '')])
+        # results keep table order, not index order
+        self.assertEqual([row['C1'] for row in rows], ['id99', 'id9'])
+        self.assertEqual(len(self.manager.indexes['C1']), 10)
+
+    def test_and_binds_tighter_than_or(self):
+        # folded left to right this used to read (C1 == id1 or C2 == even) and C3 == value 4
+        rows = self.manager.query_records([('C1', '==', 'id1', 'or'), ('C2', '==', 'even', 'and'), ('C3', '==', 'value 4', '')])
+        self.assertEqual([row['C1'] for row in rows], ['id1', 'id4'])
+
+    def test_parenthesized_expression(self):
+        expression = And([Or([Predicate('C1', '==', 'id1'), Predicate('C2', '==', 'even')]),
+                          Predicate('C3', '&=', '4')])
+        expected = self.manager.query_records(expression)
+        self.assertEqual([row['C1'] for row in expected], ['id4'])
+        self.manager.create_index('C1')
+        self.manager.create_index('C2')
+        self.assertEqual(self.manager.query_records(expression), expected)
+
+    def test_indexed_predicate_evaluated_first(self):
+        self.manager.create_index('C1')
+        checked = []
+        original = self.manager.check_condition
+
+        def recording_check(row, condition):
+            checked.append(condition)
+            return original(row, condition)
+
+        self.manager.check_condition = recording_check
+        rows = self.manager.query_records([('C3', '&=', 'value', 'and'), ('C1', '==', 'id6', '')])
+        self.assertEqual([row['C1'] for row in rows], ['id6'])
+        # the index answers C1 == id6 and only its one row is left for the substring check
+        self.assertEqual(checked, [('C3', '&=', 'value')])
+
+    def test_statistics_follow_writes(self):
+        self.manager.add_record(['id10', 'even', 'value 10'])
+        self.manager.delete_record({'C2': 'odd'})
+        statistics = self.manager.get_statistics()
+        self.assertEqual(statistics['row_count'], 6)
+        self.assertEqual(statistics['columns']['C2']['most_common'], [['even', 6]])
+        self.assertEqual(self.manager.estimate_rows([('C2', '==', 'even', '')]), 6)
+
+    def test_aggregates(self):
+        for indexed in (False, True):
+            if indexed:
+                self.manager.create_index('C1')
+                self.manager.create_index('C2')
+            self.assertEqual(self.manager.aggregate_records([], 'count'), [{'count': 10}])
+            self.assertEqual(self.manager.aggregate_records([('C1', '<', 'id3', '')], 'count'), [{'count': 3}])
+            self.assertEqual(self.manager.aggregate_records([('C3', '&=', '1', '')], 'count'), [{'count': 1}])
+            self.assertEqual(self.manager.aggregate_records(None, 'count_distinct', 'C2'), [{'count': 2}])
+            self.assertEqual(self.manager.aggregate_records([('C1', '>', 'id6', '')], 'group_count', 'C2'),
+                             [{'C2': 'odd', 'count': 2}, {'C2': 'even', 'count': 1}])
+            self.assertEqual(self.manager.aggregate_records(None, 'group_count', 'C2', limit=1, offset=1),
+                             [{'C2': 'odd', 'count': 5}])
+
+    def test_all_columns_predicates(self):
+        self.manager.add_record(['id10', 'VALUE 3', 'odd'])
+        queries = {
+            ('*', '==', 'odd'): ['id1', 'id3', 'id5', 'id7', 'id9', 'id10'],
+            ('*', '!=', 'even'): ['id1', 'id3', 'id5', 'id7', 'id9', 'id10'],
+            ('*', '$=', 'value 3'): ['id3', 'id10'],
+            ('*', '&=', '1'): ['id1', 'id10'],
+            ('*', '^=', 'VAL'): ['id10'],
+            ('*', 'IN', ('id2', 'value 4')): ['id2', 'id4'],
+            ('*', '>', 'value 8'): ['id9'],
+        }
+        for indexed in (False, True):
+            if indexed:
+                for column in ('C1', 'C2', 'C3'):
+                    self.manager.create_index(column)
+            for (column, operator, value), expected in queries.items():
+                rows = self.manager.query_records([(column, operator, value, '')])
+                self.assertEqual([row['C1'] for row in rows], expected, (operator, value, indexed))
+                scanned = [row['C1'] for row in self.manager.data if self.manager.check_condition(row, (column, operator, value))]
+                self.assertEqual(scanned, expected, (operator, value))
+
+    def test_all_columns_search_follows_writes(self):
+        self.assertEqual(len(self.manager.query_records([('*', '&=', 'value', '')])), 10)
+        self.manager.delete_record({'C2': 'odd'})
+        self.manager.update_record({'C1': 'id2'}, 'C3', 'changed')
+        rows = self.manager.query_records([('*', '&=', 'value', 'and'), ('C2', '==', 'even', '')])
+        self.assertEqual([row['C1'] for row in rows], ['id0', 'id4', 'id6', 'id8'])
+
+    def test_unknown_projection_column(self):
+        with self.assertRaises(ValueError):
+            self.manager.query_records([], columns=['C9'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, text
+
+from database.engine_router import EngineRouter
+
+
+def make_database(path, name):
+    # each SQLite file stands in for one server and records its own name
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE server (name VARCHAR(20))"))
+        connection.execute(text("INSERT INTO server VALUES (:name)"), {'name': name})
+    engine.dispose()
+    return f'sqlite:///{path}'
+
+
+def wait_for_health_check(router):
+    checker = router._checker
+    if checker is not None:
+        checker.join(5)
+
+
+def server_name(router):
+    with router.read_connection() as connection:
+        return connection.execute(text("SELECT name FROM server")).scalar()
+
+
+class TestEngineRouter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.primary_url = make_database(os.path.join(self.directory, 'primary.db'), 'primary')
+        self.replica_urls = [make_database(os.path.join(self.directory, f'replica{i}.db'), f'replica{i}')
+                             for i in range(2)]
+        self.routers = []
+
+    def tearDown(self):
+        for router in self.routers:
+            router.dispose()
+        shutil.rmtree(self.directory)
+
+    def make_router(self, replica_urls, **options):
+        router = EngineRouter(self.primary_url, replica_urls, **options)
+        self.routers.append(router)
+        return router
+
+    def test_reads_without_replicas_use_the_primary(self):
+        router = self.make_router([])
+        self.assertEqual(server_name(router), 'primary')
+
+    def test_round_robin(self):
+        router = self.make_router(self.replica_urls)
+        self.assertEqual([server_name(router) for _ in range(4)], ['replica0', 'replica1', 'replica0', 'replica1'])
+
+    def test_least_connections_avoids_busy_replica(self):
+        router = self.make_router(self.replica_urls, policy='least_connections')
+        with router.read_connection() as busy:
+            busy_name = busy.execute(text("SELECT name FROM server")).scalar()
+            names = {server_name(router) for _ in range(3)}
+        self.assertEqual(len(names), 1)
+        self.assertNotIn(busy_name, names)
+        self.assertEqual([replica.in_use for replica in router.replicas], [0, 0])
+
+    def test_reads_are_pinned_to_primary_after_write(self):
+        router = self.make_router(self.replica_urls, pin_seconds=60)
+        router.mark_written()
+        self.assertEqual(server_name(router), 'primary')
+        router._pinned_until = 0
+        self.assertTrue(server_name(router).startswith('replica'))
+
+    def test_unreachable_replica_is_ejected(self):
+        missing_directory = os.path.join(self.directory, 'missing')
+        unreachable = f"sqlite:///{os.path.join(missing_directory, 'replica.db')}"
+        router = self.make_router([unreachable, self.replica_urls[0]], retry_interval=60)
+        self.assertEqual([server_name(router) for _ in range(3)], ['replica0'] * 3)
+        self.assertEqual([replica.healthy for replica in router.replicas], [False, True])
+
+        # the ejected replica is probed again once its retry interval has passed
+        os.mkdir(missing_directory)
+        make_database(os.path.join(missing_directory, 'replica.db'), 'recovered')
+        router.replicas[0].retry_at = 0
+        # the read that finds the probe due starts it in the background and does not wait for it
+        self.assertEqual(server_name(router), 'replica0')
+        wait_for_health_check(router)
+        self.assertEqual({server_name(router) for _ in range(2)}, {'recovered', 'replica0'})
+
+    def test_falls_back_to_primary_when_no_replica_is_healthy(self):
+        unreachable = f"sqlite:///{os.path.join(self.directory, 'missing', 'replica.db')}"
+        router = self.make_router([unreachable])
+        self.assertEqual(server_name(router), 'primary')
+        self.assertEqual(server_name(router), 'primary')
+
+    def test_health_check_ejects_failed_replica(self):
+        router = self.make_router(self.replica_urls)
+        with patch.object(router, '_probe', side_effect=lambda replica: replica is router.replicas[1]):
+            router.check_health(force=True)
+        self.assertEqual([replica.healthy for replica in router.replicas], [False, True])
+        self.assertEqual(server_name(router), 'replica1')
+
+    def test_hung_replica_does_not_hold_up_reads(self):
+        router = self.make_router(self.replica_urls)
+        probing = threading.Event()
+        release = threading.Event()
+
+        def hung_probe(replica):
+            probing.set()
+            return release.wait(5)
+
+        router._next_health_check = 0
+        with patch.object(router, '_probe', side_effect=hung_probe):
+            self.assertTrue(server_name(router).startswith('replica'))
+            self.assertTrue(probing.wait(5))
+            # reads go on from the recorded health while the probe hangs
+            self.assertTrue(server_name(router).startswith('replica'))
+            release.set()
+            wait_for_health_check(router)
+        self.assertEqual([replica.healthy for replica in router.replicas], [True, True])
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            EngineRouter(self.primary_url, policy='random')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+
+from sqlalchemy import create_engine, Table, Column, MetaData, String
+
+from database.index_advisor import IndexAdvisor, BTREE, FULLTEXT, query_shape, shape_indexes
+from database.query_ast import And, Or, Predicate
+from database.mysql_manager import MySQLDatabase
+
+
+class TestQueryShape(unittest.TestCase):
+    def test_values_are_replaced(self):
+        self.assertEqual(query_shape(Predicate('C2', '==', 'a')), query_shape(Predicate('C2', '==', 'b')))
+        self.assertEqual(query_shape(Predicate('C2', 'IN', ('a', 'b'))), 'C2 IN (?)')
+        self.assertEqual(query_shape(None), '')
+
+    def test_children_are_sorted(self):
+        first = And([Predicate('C3', '&=', 'x'), Or([Predicate('C2', '==', 'a'), Predicate('C1', '<', 'b')])])
+        second = And([Or([Predicate('C1', '<', 'c'), Predicate('C2', '==', 'd')]), Predicate('C3', '&=', 'y')])
+        self.assertEqual(query_shape(first), '(C1 < ? or C2 == ?) and C3 &= ?')
+        self.assertEqual(query_shape(first), query_shape(second))
+
+    def test_shape_indexes(self):
+        expression = And([Predicate('C1', '^=', 'a'), Predicate('C2', '!=', 'b'), Predicate('C3', '$=', 'c'),
+                          Predicate('*', '==', 'd')])
+        self.assertEqual(shape_indexes(expression), {('C1', BTREE), ('C3', FULLTEXT)})
+
+
+class TestIndexAdvisor(unittest.TestCase):
+    def setUp(self):
+        self.advisor = IndexAdvisor(min_queries=3, min_mean_ms=10.0)
+
+    def test_recommends_after_thresholds(self):
+        for i in range(3):
+            self.advisor.record(Predicate('C2', '==', str(i)), 0.05)
+            self.advisor.record(Predicate('C3', '&=', str(i)), 0.001)
+        report = {(entry['column'], entry['kind']): entry for entry in self.advisor.report(set())}
+        self.assertEqual(report[('C2', BTREE)]['status'], 'recommended')
+        self.assertEqual(report[('C2', BTREE)]['queries'], 3)
+        self.assertEqual(report[('C2', BTREE)]['mean_ms'], 50.0)
+        # fast queries do not call for an index
+        self.assertEqual(report[('C3', FULLTEXT)]['status'], 'below_threshold')
+
+    def test_due_is_handed_out_once(self):
+        for i in range(3):
+            self.advisor.record(Predicate('C2', '==', str(i)), 0.05)
+            self.advisor.record(Predicate('C1', '==', str(i)), 0.05)
+        self.assertEqual(self.advisor.due({('C1', BTREE)}), [('C2', BTREE)])
+        self.assertEqual(self.advisor.due(set()), [('C1', BTREE)])
+        self.assertEqual(self.advisor.report({('C1', BTREE)})[0]['status'], 'pending')
+
+    def test_impact_of_created_index(self):
+        for i in range(4):
+            self.advisor.record(Predicate('C2', '==', str(i)), 0.04)
+        self.advisor.due(set())
+        self.advisor.mark_created('C2', BTREE, 'ix_record_C2')
+        for i in range(2):
+            self.advisor.record(Predicate('C2', '==', str(i)), 0.002)
+        entry = self.advisor.report(set())[0]
+        self.assertEqual(entry['status'], 'created')
+        self.assertEqual(entry['name'], 'ix_record_C2')
+        self.assertEqual(entry['impact'], {'before_queries': 4, 'before_mean_ms': 40.0,
+                                           'after_queries': 2, 'after_mean_ms': 2.0})
+        self.assertEqual(self.advisor.due(set()), [])
+
+    def test_failed_index_is_not_retried(self):
+        for i in range(3):
+            self.advisor.record(Predicate('C3', '$=', str(i)), 0.05)
+        self.assertEqual(self.advisor.due(set()), [('C3', FULLTEXT)])
+        self.advisor.mark_failed('C3', FULLTEXT, 'not supported')
+        self.assertEqual(self.advisor.due(set()), [])
+        entry = self.advisor.report(set(), describe=lambda column, kind: {'statement': None})[0]
+        self.assertEqual((entry['status'], entry['error'], entry['statement']), ('failed', 'not supported', None))
+
+    def test_shape_limit(self):
+        advisor = IndexAdvisor(max_shapes=1)
+        advisor.record(Predicate('C1', '==', 'a'), 0.01)
+        advisor.record(Predicate('C2', '==', 'a'), 0.01)
+        self.assertEqual(list(advisor.shapes), ['C1 == ?'])
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class TestFullTextNarrowing(unittest.TestCase):
+    def setUp(self):
+        # compiled against the MySQL dialect without connecting
+        self.db = MySQLDatabase.__new__(MySQLDatabase)
+        self.db.engine = create_engine('mysql+pymysql://user@localhost/db')
+        self.db.table = Table('record', MetaData(), Column('C1', String(255), primary_key=True),
+                              Column('C3', String(255)))
+        self.db._indexes = {('C1', BTREE), ('C3', FULLTEXT)}
+        self.db._stopword_free = set()
+
+    def compiled(self, operator, value):
+        return str(self.db._compile_predicate('C3', operator, value).compile(dialect=self.db.engine.dialect))
+
+    def test_index_with_stopwords_is_not_used(self):
+        self.assertNotIn('MATCH', self.compiled('&=', 'data'))
+
+    def test_stopword_free_index_narrows_substring_search(self):
+        self.db._stopword_free = {'C3'}
+        self.assertIn('MATCH (record.`C3`) AGAINST', self.compiled('&=', 'data'))
+        self.assertIn('LIKE', self.compiled('$=', 'data'))
+        # too short for the ngram index
+        self.assertNotIn('MATCH', self.compiled('&=', 'd'))
+
+    def test_advised_index_disables_stopwords(self):
+        description = self.db._describe_index('C3', FULLTEXT)
+        self.assertTrue(description['statement'].startswith('SET SESSION innodb_ft_enable_stopword = 0; '))
+        self.assertIn("COMMENT 'ngram, no stopwords'", description['statement'])
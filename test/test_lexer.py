@@ -0,0 +1,57 @@
+import unittest
+from unittest.mock import MagicMock
+
+from database.data_modifier import DataModifier
+from database.lexer import tokenize, STRING, WORD, OPERATOR, PUNCT, OTHER
+
+
+class TestLexer(unittest.TestCase):
+    def test_tokens(self):
+        self.assertEqual(tokenize('(C1=="a b" or * IN ("x", ""))'), [
+            (PUNCT, '('), (WORD, 'C1'), (OPERATOR, '=='), (STRING, 'a b'), (WORD, 'or'), (PUNCT, '*'),
+            (WORD, 'IN'), (PUNCT, '('), (STRING, 'x'), (PUNCT, ','), (STRING, ''), (PUNCT, ')'), (PUNCT, ')'),
+        ])
+
+    def test_escapes_in_one_pass(self):
+        tokens = tokenize(r'"say \"hi\"" "back\\slash" "keep \n"')
+        self.assertEqual([value for _, value in tokens], ['say "hi"', 'back\\slash', 'keep \\n'])
+
+    def test_other_characters(self):
+        self.assertEqual(tokenize('  C1 ~ "a"'), [(WORD, 'C1'), (OTHER, '~'), (STRING, 'a')])
+
+    def test_unterminated_value(self):
+        with self.assertRaises(ValueError):
+            tokenize('C1 == "abc')
+        with self.assertRaises(ValueError):
+            tokenize('C1 == "abc\\"')
+
+
+class TestDataModifierParsing(unittest.TestCase):
+    def setUp(self):
+        self.db = MagicMock()
+        self.db.get_columns.return_value = ['C1', 'C2', 'C3']
+        self.modifier = DataModifier(self.db)
+
+    def test_parse_commands(self):
+        self.assertEqual(self.modifier.parse('INSERT "a", "b \\"q\\"", "c"'), ('insert', ['a', 'b "q"', 'c']))
+        self.assertEqual(self.modifier.parse('DELETE "a", "b"'), ('delete', {'C1': 'a', 'C2': 'b'}))
+        self.assertEqual(self.modifier.parse('UPDATE "a", "b" C3, "new"'), ('update', {'C1': 'a', 'C2': 'b'}, 'C3', 'new'))
+        self.assertEqual(self.modifier.parse('UPDATE "a", "C2", "new"'), ('update', {'C1': 'a'}, 'C2', 'new'))
+
+    def test_batch_skips_invalid_commands(self):
+        operations = self.modifier.parse_batch(['INSERT "a", "b", "c"', 'INSERT "only"', 'DROP', 'DELETE "a"'])
+        self.assertIsInstance(operations[1], ValueError)
+        self.assertIsInstance(operations[2], ValueError)
+        self.assertEqual(self.modifier.apply_batch(operations), 2)
+        self.db.add_record.assert_called_once_with(['a', 'b', 'c'])
+        self.db.delete_record.assert_called_once_with({'C1': 'a'})
+
+    def test_batch_skips_commands_that_fail_to_apply(self):
+        self.db.add_record.side_effect = [RuntimeError('disk full'), None]
+        operations = self.modifier.parse_batch(['INSERT "a", "b", "c"', 'INSERT "d", "e", "f"'])
+        self.assertEqual(self.modifier.apply_batch(operations), 1)
+        self.assertEqual(self.db.add_record.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
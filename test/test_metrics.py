@@ -0,0 +1,47 @@
+import unittest
+
+from metrics import MetricsRegistry
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter(self):
+        counter = self.registry.counter('cache_requests_total', 'Cache lookups', labelnames=('cache', 'result'))
+        counter.inc('query', 'hit')
+        counter.inc('query', 'hit')
+        counter.inc('query', 'miss')
+        self.assertEqual(counter.value('query', 'hit'), 2)
+        text = self.registry.render()
+        self.assertIn('# TYPE cache_requests_total counter', text)
+        self.assertIn('cache_requests_total{cache="query",result="hit"} 2', text)
+        self.assertIn('cache_requests_total{cache="query",result="miss"} 1', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram('stage_seconds', 'Stage latency', labelnames=('stage',), buckets=(0.1, 1))
+        histogram.observe(0.05, 'parse')
+        histogram.observe(0.5, 'parse')
+        histogram.observe(5, 'parse')
+        text = self.registry.render()
+        self.assertIn('stage_seconds_bucket{stage="parse",le="0.1"} 1', text)
+        self.assertIn('stage_seconds_bucket{stage="parse",le="1"} 2', text)
+        self.assertIn('stage_seconds_bucket{stage="parse",le="+Inf"} 3', text)
+        self.assertIn('stage_seconds_count{stage="parse"} 3', text)
+        self.assertAlmostEqual(histogram.total('parse'), 5.55)
+
+    def test_timer(self):
+        histogram = self.registry.histogram('block_seconds', 'Block latency')
+        with histogram.time():
+            pass
+        self.assertEqual(histogram.count(), 1)
+
+    def test_registration_is_idempotent(self):
+        first = self.registry.counter('requests_total', 'Requests')
+        self.assertIs(self.registry.counter('requests_total', 'Requests'), first)
+        with self.assertRaises(ValueError):
+            self.registry.histogram('requests_total', 'Requests')
+
+
+if __name__ == '__main__':
+    unittest.main()
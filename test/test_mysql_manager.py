@@ -0,0 +1,116 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import redis
+
+from database.mysql_manager import MySQLDatabase
+from test.fakes import FakePipeline, FakeRedis
+
+
+class TestMySQLDatabase(unittest.TestCase):
+    """Runs the MySQL engine on SQLite, with Redis replaced by FakeRedis"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.client = FakeRedis()
+        with patch('database.redis_manager.redis.StrictRedis.from_url', return_value=self.client):
+            self.db = MySQLDatabase(f"sqlite:///{os.path.join(self.directory, 'records.db')}",
+                                    near_cache_size=0, warm_top_k=0)
+
+    def tearDown(self):
+        self.db.Session.remove()
+        self.db.router.dispose()
+        shutil.rmtree(self.directory)
+
+    def test_read_returns_plain_dicts(self):
+        self.db.add_record(['1', 'test', 'value1'])
+        self.db.add_record(['2', 'test2', 'value2'])
+
+        result = self.db.read()
+
+        self.assertEqual(sorted(result, key=lambda record: record['C1']), [
+            {'C1': '1', 'C2': 'test', 'C3': 'value1'},
+            {'C1': '2', 'C2': 'test2', 'C3': 'value2'},
+        ])
+
+    def test_unknown_filter_column_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            self.db.query_records([('C9', '==', 'x', '')])
+        with self.assertRaises(ValueError):
+            self.db.aggregate_records([('C9', '==', 'x', '')], 'count')
+
+    def test_update_of_c1_to_its_current_value_keeps_the_record_cached(self):
+        self.db.add_record(['1', 'test', 'value1'])
+        self.db.update_record({'C1': '1'}, 'C1', '1')
+
+        self.assertEqual(self.db.redis.get('record:1'), {'C1': '1', 'C2': 'test', 'C3': 'value1'})
+        self.assertTrue(self.db.redis.check_bloom_filter('record:1'))
+
+    def test_update_of_c1_moves_the_record_key(self):
+        self.db.add_record(['1', 'test', 'value1'])
+        self.db.update_record({'C1': '1'}, 'C1', '2')
+
+        self.assertIsNone(self.client.get('record:1'))
+        self.assertEqual(self.db.redis.get('record:2'), {'C1': '2', 'C2': 'test', 'C3': 'value1'})
+
+    def test_cache_hit_reads_generations_and_result_in_one_round_trip(self):
+        self.db.add_record(['1', 'test', 'value1'])
+        self.db.query_records([('C2', '==', 'test', '')])
+
+        lookup = self.db.redis._lookup_script
+        with patch.object(self.db.redis, '_lookup_script', wraps=lookup) as lookup_script, \
+                patch.object(self.client, 'get', side_effect=AssertionError('separate GET')), \
+                patch.object(self.client, 'mget', wraps=self.client.mget) as mget:
+            self.assertEqual(self.db.query_records([('C2', '==', 'test', '')]),
+                             [{'C1': '1', 'C2': 'test', 'C3': 'value1'}])
+        lookup_script.assert_called_once()
+        self.assertEqual(lookup_script.call_args.kwargs['keys'], ['generation:record', 'generation:record:C2'])
+        # the records are the only other read
+        self.assertEqual(mget.call_count, 1)
+
+    def test_update_and_delete_survive_redis_errors(self):
+        self.db.add_record(['1', 'test', 'value1'])
+        with patch.object(FakePipeline, 'execute', side_effect=redis.ConnectionError('down')):
+            self.db.update_record({'C1': '1'}, 'C3', 'value2')
+            self.assertEqual(self.db.read(), [{'C1': '1', 'C2': 'test', 'C3': 'value2'}])
+            self.db.delete_record({'C1': '1'})
+        self.assertEqual(self.db.read(), [])
+
+    def test_query_results_are_cached(self):
+        self.db.add_record(['1', 'test', 'value1'])
+        self.db.add_record(['2', 'test2', 'value2'])
+
+        self.assertEqual(self.db.query_records([('C2', '==', 'test', '')]), [{'C1': '1', 'C2': 'test', 'C3': 'value1'}])
+        # the lock taken to load the result is released, and stored apart from the result
+        self.assertEqual([key for key in self.client.strings if key.startswith('lock:')], [])
+        with patch.object(self.db, '_select_rows', side_effect=AssertionError('the database is queried again')):
+            self.assertEqual(self.db.query_records([('C2', '==', 'test', '')]),
+                             [{'C1': '1', 'C2': 'test', 'C3': 'value1'}])
+
+
+    def test_warm_ups_are_not_counted_as_lookups(self):
+        self.db.add_record(['1', 'test', 'value1'])
+        self.db.query_records([('C2', '==', 'test', '')])
+        self.db._warm_query(json.dumps([['C2', '==', 'test'], None, None, 0]))
+
+        stats = self.db.cache_policy.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (0, 1))
+
+
+    def test_version_tag_covers_every_generation(self):
+        self.db.add_record(['1', 'test', 'value1'])
+        tag = self.db.version_tag()
+        # updates of a column other than C1 only bump that column's generation
+        self.db.update_record({'C1': '1'}, 'C3', 'value2')
+        self.assertNotEqual(self.db.version_tag(), tag)
+        tag = self.db.version_tag()
+        self.db.delete_record({'C1': '1'})
+        self.assertNotEqual(self.db.version_tag(), tag)
+
+
+if __name__ == '__main__':
+    unittest.main()
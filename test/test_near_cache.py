@@ -0,0 +1,59 @@
+import unittest
+
+from database.near_cache import NearCache, MISSING
+from test.fakes import FakeClock
+
+
+class TestNearCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = NearCache(capacity=2, ttl=5.0, clock=self.clock)
+
+    def test_get_and_set(self):
+        self.assertIs(self.cache.get('record:1'), MISSING)
+        self.cache.set('record:1', {'C1': '1'})
+        self.assertEqual(self.cache.get('record:1'), {'C1': '1'})
+
+    def test_entries_expire(self):
+        self.cache.set('record:1', {'C1': '1'})
+        self.clock.now = 4.9
+        self.assertEqual(self.cache.get('record:1'), {'C1': '1'})
+        self.clock.now = 5.0
+        self.assertIs(self.cache.get('record:1'), MISSING)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.set('record:1', 1)
+        self.cache.set('record:2', 2)
+        self.cache.get('record:1')
+        self.cache.set('record:3', 3)
+        self.assertIs(self.cache.get('record:2'), MISSING)
+        self.assertEqual(self.cache.get('record:1'), 1)
+        self.assertEqual(self.cache.get('record:3'), 3)
+
+    def test_delete_and_clear(self):
+        self.cache.set('record:1', 1)
+        self.cache.set('record:2', 2)
+        self.cache.delete(['record:1', 'record:9'])
+        self.assertIs(self.cache.get('record:1'), MISSING)
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+
+    def test_fill_skips_keys_invalidated_meanwhile(self):
+        version = self.cache.version('generation:record')
+        self.cache.delete(['generation:record'])
+        self.assertFalse(self.cache.fill('generation:record', 1, version))
+        self.assertIs(self.cache.get('generation:record'), MISSING)
+
+        version = self.cache.version('generation:record')
+        self.assertTrue(self.cache.fill('generation:record', 2, version))
+        self.assertEqual(self.cache.get('generation:record'), 2)
+
+    def test_fill_skips_after_clear(self):
+        version = self.cache.version('record:1')
+        self.cache.clear()
+        self.assertFalse(self.cache.fill('record:1', 1, version))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import json
+import unittest
+
+from database.query_ast import And, Or, Predicate, from_conditions, plan, to_data, from_data
+
+
+class TestQueryAst(unittest.TestCase):
+    def test_from_conditions_precedence(self):
+        expression = from_conditions([('C1', '==', 'a', 'and'), ('C2', '==', 'b', 'OR'), ('C3', '==', 'c', '')])
+        self.assertEqual(expression, Or([And([Predicate('C1', '==', 'a'), Predicate('C2', '==', 'b')]),
+                                         Predicate('C3', '==', 'c')]))
+        self.assertIsNone(from_conditions([]))
+        self.assertEqual(from_conditions([('C1', '==', 'a', '')]), Predicate('C1', '==', 'a'))
+
+    def test_evaluate_short_circuits(self):
+        checked = []
+
+        def check(row, condition):
+            checked.append(condition[0])
+            return row[condition[0]] == condition[2]
+
+        row = {'C1': 'a', 'C2': 'b'}
+        self.assertFalse(And([Predicate('C1', '==', 'x'), Predicate('C2', '==', 'b')]).evaluate(row, check))
+        self.assertTrue(Or([Predicate('C1', '==', 'a'), Predicate('C2', '==', 'x')]).evaluate(row, check))
+        self.assertEqual(checked, ['C1', 'C1'])
+
+    def test_plan_orders_by_cost_and_selectivity(self):
+        contains = Predicate('C1', '&=', 'x')
+        equals = Predicate('C2', '==', 'y')
+        not_equals = Predicate('C3', '!=', 'z')
+        planned, _, _ = plan(And([contains, not_equals, equals]))
+        self.assertEqual(planned.children, [equals, contains, not_equals])
+        planned, _, _ = plan(Or([equals, not_equals]))
+        self.assertEqual(planned.children, [not_equals, equals])
+
+    def test_data_round_trip(self):
+        expression = Or([And([Predicate('C1', 'IN', ('a', 'b')), Predicate('C2', '&=', 'x')]),
+                         Predicate('*', '==', 'y')])
+        self.assertEqual(from_data(json.loads(json.dumps(to_data(expression)))), expression)
+        self.assertIsNone(from_data(to_data(None)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+from unittest.mock import patch
+
+from database.query_ast import And, Or, Predicate, from_conditions
+from database.query_parser import Aggregate, QueryParser
+
+
+class TestQueryParser(unittest.TestCase):
+    def setUp(self):
+        self.parser = QueryParser()
+
+    def test_plain_conditions(self):
+        query = self.parser.parse_command('C1 == "a" and C2 != "b"')
+        self.assertEqual(query.conditions, from_conditions([('C1', '==', 'a', 'and'), ('C2', '!=', 'b', '')]))
+        self.assertIsNone(query.columns)
+        self.assertIsNone(query.limit)
+        self.assertEqual(query.offset, 0)
+
+    def test_projection_and_paging(self):
+        query = self.parser.parse_command('SELECT C1, C3 WHERE C2 &= "x" LIMIT 50 OFFSET 10')
+        self.assertEqual(query.conditions, Predicate('C2', '&=', 'x'))
+        self.assertEqual(query.columns, ['C1', 'C3'])
+        self.assertEqual(query.limit, 50)
+        self.assertEqual(query.offset, 10)
+
+    def test_projection_without_conditions(self):
+        query = self.parser.parse_command('SELECT C1 LIMIT 5')
+        self.assertIsNone(query.conditions)
+        self.assertEqual(query.columns, ['C1'])
+        self.assertEqual(query.limit, 5)
+
+    def test_clause_keywords_inside_values(self):
+        query = self.parser.parse_command('C1 == "x LIMIT 5"')
+        self.assertEqual(query.conditions, Predicate('C1', '==', 'x LIMIT 5'))
+        self.assertIsNone(query.limit)
+
+    def test_cursor_round_trip(self):
+        first = self.parser.parse_command('C1 &= "a" LIMIT 5')
+        cursor = first.next_cursor(5)
+        second = self.parser.parse_command(f'C1 &= "a" LIMIT 5 CURSOR "{cursor}"')
+        self.assertEqual(second.offset, 5)
+        self.assertEqual(second.next_cursor(5), self.parser.parse_command('C1 &= "a" OFFSET 10').next_cursor(0))
+
+    def test_cursor_bound_to_query(self):
+        cursor = self.parser.parse_command('C1 &= "a" LIMIT 5').next_cursor(5)
+        with self.assertRaises(ValueError):
+            self.parser.parse_command(f'C1 &= "b" LIMIT 5 CURSOR "{cursor}"')
+        with self.assertRaises(ValueError):
+            self.parser.parse_command('C1 &= "a" CURSOR "garbage"')
+
+    def test_range_prefix_and_in_operators(self):
+        query = self.parser.parse_command('C1 >= "a" and C1 < "m" or C2 ^= "pre" and C3 IN ("x", "y\\"z")')
+        self.assertEqual(query.conditions, Or([
+            And([Predicate('C1', '>=', 'a'), Predicate('C1', '<', 'm')]),
+            And([Predicate('C2', '^=', 'pre'), Predicate('C3', 'IN', ('x', 'y"z'))]),
+        ]))
+
+    def test_and_binds_tighter_than_or(self):
+        query = self.parser.parse_command('C1 == "a" or C2 == "b" and C3 == "c"')
+        self.assertEqual(query.conditions, Or([
+            Predicate('C1', '==', 'a'),
+            And([Predicate('C2', '==', 'b'), Predicate('C3', '==', 'c')]),
+        ]))
+
+    def test_parentheses(self):
+        query = self.parser.parse_command('(C1 == "a" OR C1 == "b") and (C2 &= "(x)" or (C3 != "c"))')
+        self.assertEqual(query.conditions, And([
+            Or([Predicate('C1', '==', 'a'), Predicate('C1', '==', 'b')]),
+            Or([Predicate('C2', '&=', '(x)'), Predicate('C3', '!=', 'c')]),
+        ]))
+
+    def test_unbalanced_parentheses(self):
+        for query_str in ('(C1 == "a"', 'C1 == "a")', '()', 'C1 == "a" and'):
+            with self.assertRaises(ValueError):
+                self.parser.parse_command(query_str)
+
+    def test_aggregates(self):
+        query = self.parser.parse_command('select count(*)')
+        self.assertEqual(query.aggregate, Aggregate('count'))
+        self.assertIsNone(query.conditions)
+        query = self.parser.parse_command('SELECT COUNT(DISTINCT C2) WHERE C1 ^= "x"')
+        self.assertEqual(query.aggregate, Aggregate('count_distinct', 'C2'))
+        self.assertEqual(query.conditions, Predicate('C1', '^=', 'x'))
+        query = self.parser.parse_command('SELECT C2, COUNT(*) WHERE C1 != "a" GROUP BY C2 LIMIT 3')
+        self.assertEqual(query.aggregate, Aggregate('group_count', 'C2'))
+        self.assertEqual(query.limit, 3)
+        self.assertNotEqual(query.fingerprint(), self.parser.parse_command('C1 != "a"').fingerprint())
+
+    def test_invalid_aggregates(self):
+        for query_str in ('SELECT C1, COUNT(*)', 'SELECT C1, COUNT(*) GROUP BY C2', 'SELECT COUNT(*) LIMIT 5',
+                          'SELECT C1 GROUP BY C1', 'C1 == "a" GROUP BY C1'):
+            with self.assertRaises(ValueError):
+                self.parser.parse_command(query_str)
+
+    def test_invalid_query(self):
+        with self.assertRaises(ValueError):
+            self.parser.parse_command('C1 ~ "a"')
+
+    def test_flat_queries_parse_as_the_token_parser_does(self):
+        for query_str in ('C1 == "a"', '  * &= "x"  ', 'C1 == "a" and C2 IN ("b\\"c", "d\\\\") Or C3 <= "e"',
+                          'C1=="a"AND C2!="b"or\tC3 IN("c")', 'C1 == "a" LIMIT 5 offset 3 LIMIT 07',
+                          'LIMIT == "a" and and == "b" LIMIT 2', 'C1 ^= "x LIMIT 5"\n'):
+            flat = self.parser.parse_command(query_str)
+            with patch.object(QueryParser, '_parse_flat', return_value=None):
+                tokenized = self.parser.parse_command(query_str)
+            self.assertEqual((flat.conditions, flat.limit, flat.offset), (tokenized.conditions, tokenized.limit, tokenized.offset))
+
+    def test_queries_that_are_not_flat_use_the_token_parser(self):
+        for query_str in ('(C1 == "a")', 'SELECT C1 WHERE C1 == "a"', 'SELECT == "a"', 'C1 == "a" CURSOR "x"',
+                          'C1 == "a" andC2 == "b"', 'C1 == "a" LIMIT x', 'C1 == "a" or', 'C1 == "a'):
+            self.assertIsNone(self.parser._parse_flat(query_str))
+        # a leading SELECT always starts a projection, even when it reads like a column
+        with self.assertRaises(ValueError):
+            self.parser.parse_command('SELECT == "a"')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+from unittest.mock import patch
+
+from database.query_warmer import QueryWarmer
+from test.fakes import FakeClock, FakeRedis
+
+
+class TestQueryWarmer(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeRedis()
+        self.clock = FakeClock()
+        self.loaded = []
+        self.warmer = QueryWarmer(self.client, 'hot_queries:record', self.loaded.append, top_k=2, rate=4.0,
+                                  flush_interval=60.0, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_counts_are_flushed_when_due(self):
+        self.warmer.record('q1')
+        self.assertEqual(self.client.sets, {})
+        self.clock.now = 60.0
+        self.warmer.record('q1')
+        # flushed by a background thread
+        flusher = self.warmer._flusher
+        if flusher is not None:
+            flusher.join(5)
+        self.assertEqual(self.client.sets['hot_queries:record'], {'q1': 1.0})
+        self.assertIsNone(self.warmer._flusher)
+
+    def test_shared_counts_are_decayed_once_per_interval(self):
+        for _ in range(4):
+            self.warmer.record('q1')
+        self.warmer.flush()
+        self.assertEqual(self.client.sets['hot_queries:record'], {'q1': 2.0})
+        self.warmer.record('q1')
+        self.warmer.flush()
+        self.assertEqual(self.client.sets['hot_queries:record'], {'q1': 3.0})
+
+    def test_set_is_trimmed(self):
+        for i in range(20):
+            for _ in range(i):
+                self.warmer.record(f'q{i:02d}')
+        self.warmer.flush()
+        self.assertEqual(len(self.client.sets['hot_queries:record']), 8)
+        self.assertEqual(self.warmer.hottest(), ['q19', 'q18'])
+
+    def test_warm_runs_the_hottest_at_the_rate(self):
+        for query, count in (('q1', 1), ('q2', 3), ('q3', 2)):
+            for _ in range(count):
+                self.warmer.record(query)
+        self.assertEqual(self.warmer.warm(), 2)
+        self.assertEqual(self.loaded, ['q2', 'q3'])
+        self.assertEqual(self.clock.now, 0.25)
+
+    def test_failing_query_does_not_stop_the_warm_up(self):
+        def load(query):
+            if query == 'q2':
+                raise ValueError('bad query')
+            self.loaded.append(query)
+
+        self.warmer.load = load
+        self.warmer.record('q2')
+        self.warmer.record('q2')
+        self.warmer.record('q1')
+        self.assertEqual(self.warmer.warm(), 2)
+        self.assertEqual(self.loaded, ['q1'])
+
+    def test_request_warms_in_the_background(self):
+        self.warmer.record('q1')
+        self.warmer.request()
+        thread = self.warmer._thread
+        if thread is not None:
+            thread.join(5)
+        # the warm-up waited for the writes to settle
+        self.assertEqual(self.clock.now, 1.0)
+        self.assertEqual(self.loaded, ['q1'])
+        self.assertIsNone(self.warmer._thread)
+
+
+    @patch('database.query_warmer.threading.Thread')
+    def test_later_requests_do_not_delay_the_warm_up(self, mock_thread):
+        self.warmer.record('q1')
+        self.warmer.request()
+        self.clock.now = 0.9
+        self.warmer.request()
+        mock_thread.return_value.start.assert_called_once_with()
+        self.warmer._run()
+        # settled one second after the first request, not the last
+        self.assertEqual(self.clock.now, 1.0)
+        self.assertEqual(self.loaded, ['q1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -57,6 +57,95 @@ class TestReadWriteLock(unittest.TestCase):
         read_thread.join()
         write_thread.join()
 
+    def test_try_acquire(self):
+        self.assertTrue(self.lock.try_acquire_read())
+        self.assertTrue(self.lock.try_acquire_read())
+        self.assertFalse(self.lock.try_acquire_write())
+        self.lock.release_read()
+        self.lock.release_read()
+        self.assertTrue(self.lock.try_acquire_write())
+        self.assertFalse(self.lock.try_acquire_read())
+        self.assertFalse(self.lock.try_acquire_write())
+        self.lock.release_write()
+
+    def test_acquire_timeout(self):
+        self.lock.acquire_write()
+        self.assertFalse(self.lock.acquire_read(timeout=0.05))
+        self.assertFalse(self.lock.acquire_write(timeout=0.05))
+        with self.assertRaises(TimeoutError):
+            with self.lock.read_lock(timeout=0.05):
+                pass
+        self.lock.release_write()
+        self.assertTrue(self.lock.acquire_read(timeout=0.05))
+        self.lock.release_read()
+        self.assertEqual(self.lock.stats()['read']['timeouts'], 2)
+
+    def test_timed_out_writer_lets_readers_in(self):
+        self.lock.acquire_read()
+        results = []
+        writer = threading.Thread(target=lambda: results.append(self.lock.acquire_write(timeout=0.1)))
+        writer.start()
+        sleep(0.02)
+        # blocked behind the queued writer until it gives up
+        self.assertTrue(self.lock.acquire_read(timeout=1))
+        writer.join()
+        self.assertEqual(results, [False])
+        self.lock.release_read()
+        self.lock.release_read()
+
+    def test_phase_fair_hand_off(self):
+        order = []
+
+        def read(name):
+            with self.lock.read_lock():
+                order.append(name)
+
+        def write(name):
+            with self.lock.write_lock():
+                order.append(name)
+                sleep(0.05)
+
+        self.lock.acquire_write()
+        threads = [threading.Thread(target=write, args=('w1',))]
+        threads[0].start()
+        sleep(0.02)
+        threads.append(threading.Thread(target=read, args=('r1',)))
+        threads[-1].start()
+        sleep(0.02)
+        threads.append(threading.Thread(target=write, args=('w2',)))
+        threads[-1].start()
+        sleep(0.02)
+        threads.append(threading.Thread(target=read, args=('r2',)))
+        threads[-1].start()
+        sleep(0.02)
+        self.lock.release_write()
+        for thread in threads:
+            thread.join()
+        # every reader queued during the write phase goes before the queued writers
+        self.assertEqual(set(order[:2]), {'r1', 'r2'})
+        self.assertEqual(order[2:], ['w1', 'w2'])
+
+    def test_stats(self):
+        with self.lock.read_lock():
+            sleep(0.01)
+        with self.lock.write_lock():
+            pass
+        stats = self.lock.stats()
+        self.assertEqual(stats['read']['acquired'], 1)
+        self.assertEqual(stats['write']['acquired'], 1)
+        self.assertGreaterEqual(stats['read']['hold_max'], 0.01)
+        self.lock.reset_stats()
+        self.assertEqual(self.lock.stats()['read']['acquired'], 0)
+
+    def test_release_read_from_another_thread(self):
+        self.assertTrue(self.lock.acquire_read())
+        releaser = threading.Thread(target=self.lock.release_read)
+        releaser.start()
+        releaser.join()
+        self.assertEqual(self.lock.stats()['readers_active'], 0)
+        self.assertTrue(self.lock.acquire_write(timeout=1))
+        self.lock.release_write()
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,44 @@
+import gzip
+import json
+import unittest
+import zlib
+
+from response_utils import encode_json, negotiate_encoding, json_response, etag_matches
+
+
+class TestResponseUtils(unittest.TestCase):
+    def test_encode_json(self):
+        payload = {'result': [{'C1': 'ä', 'C2': '2'}]}
+        self.assertEqual(json.loads(encode_json(payload)), payload)
+
+    def test_negotiate_encoding(self):
+        self.assertIsNone(negotiate_encoding(None))
+        self.assertIsNone(negotiate_encoding('br'))
+        self.assertEqual(negotiate_encoding('gzip, deflate'), 'gzip')
+        self.assertEqual(negotiate_encoding('gzip;q=0, deflate'), 'deflate')
+        self.assertEqual(negotiate_encoding('*'), 'gzip')
+
+    def test_small_bodies_are_not_compressed(self):
+        response = json_response({'result': []}, accept_encoding='gzip')
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_large_bodies_are_compressed(self):
+        payload = {'result': [{'C1': str(i), 'C2': 'x' * 20} for i in range(200)]}
+        response = json_response(payload, etag='abc', accept_encoding='gzip')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['ETag'], 'W/"abc"')
+        self.assertEqual(json.loads(gzip.decompress(response.get_data())), payload)
+
+        response = json_response(payload, accept_encoding='deflate')
+        self.assertEqual(json.loads(zlib.decompress(response.get_data())), payload)
+
+    def test_etag_matches(self):
+        self.assertTrue(etag_matches('W/"abc"', 'abc'))
+        self.assertTrue(etag_matches('"xyz", "abc"', 'abc'))
+        self.assertTrue(etag_matches('*', 'abc'))
+        self.assertFalse(etag_matches('"xyz"', 'abc'))
+        self.assertFalse(etag_matches(None, 'abc'))
+
+
+if __name__ == '__main__':
+    unittest.main()
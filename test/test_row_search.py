@@ -0,0 +1,33 @@
+import unittest
+
+from database.row_search import TableSearchText
+
+
+class TestTableSearchText(unittest.TestCase):
+    def setUp(self):
+        rows = [{'A': 'apple', 'B': 'Pie'}, {'A': '', 'B': 'pear'}, {'A': 'pie', 'B': 'apple pie'}]
+        self.search = TableSearchText(rows, ['A', 'B'])
+
+    def test_whole_cell_matches(self):
+        self.assertEqual(self.search.rows_matching('==', 'pie'), [2])
+        self.assertEqual(self.search.rows_matching('==', ''), [1])
+        self.assertEqual(self.search.rows_matching('!=', 'pie'), [0, 1])
+        self.assertEqual(self.search.rows_matching('$=', 'PIE'), [0, 2])
+        self.assertEqual(self.search.rows_matching('IN', ('pear', 'apple')), [0, 1])
+
+    def test_partial_matches(self):
+        self.assertEqual(self.search.rows_matching('&=', 'pie'), [2])
+        self.assertEqual(self.search.rows_matching('&=', 'p'), [0, 1, 2])
+        self.assertEqual(self.search.rows_matching('&=', ''), [0, 1, 2])
+        self.assertEqual(self.search.rows_matching('^=', 'ap'), [0, 2])
+        # a match may not span two cells
+        self.assertEqual(self.search.rows_matching('&=', 'appleP'), [])
+
+    def test_supports(self):
+        self.assertTrue(TableSearchText.supports('&=', 'x'))
+        self.assertFalse(TableSearchText.supports('<', 'x'))
+        self.assertFalse(TableSearchText.supports('IN', ('a', '\x03')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+import multiprocessing
+import os
+import struct
+import threading
+import time
+import unittest
+from multiprocessing import resource_tracker, shared_memory
+from unittest.mock import patch
+
+from database.shared_table import (SharedTableWriter, SharedTableReader, pack_table, unpack_table, OWNER_FORMAT,
+                                   OWNER_OFFSET)
+from database.shared_csv_manager import SharedCSVFileManager
+from database.csv_index import SortedIndex
+
+
+def read_in_child(table_name, results):
+    reader = SharedTableReader(table_name)
+    results.put((reader.version, reader.rows))
+    reader.close()
+
+
+class TestSharedTable(unittest.TestCase):
+    def setUp(self):
+        self.table_name = f'test_table_{os.getpid()}'
+        self.writer = SharedTableWriter(self.table_name)
+        self.columns = ['C1', 'C2']
+        self.rows = [{'C1': 'a', 'C2': 'ünïcode'}, {'C1': '', 'C2': 'b,c'}]
+
+    def tearDown(self):
+        self.writer.close()
+
+    def test_pack_round_trip(self):
+        self.assertEqual(unpack_table(pack_table(self.columns, self.rows)), (self.columns, self.rows))
+
+    def test_live_writer_is_not_replaced(self):
+        with self.assertRaises(FileExistsError):
+            SharedTableWriter(self.table_name)
+        # the first writer still owns a working control block
+        self.writer.publish(self.columns, self.rows)
+        reader = SharedTableReader(self.table_name)
+        self.assertEqual(reader.rows, self.rows)
+        reader.close()
+
+    def test_stale_control_block_is_replaced(self):
+        # a writer that died without closing leaves its control block behind
+        struct.pack_into(OWNER_FORMAT, self.writer.control.buf, OWNER_OFFSET, self._dead_pid())
+        replacement = SharedTableWriter(self.table_name)
+        replacement.publish(self.columns, self.rows)
+        reader = SharedTableReader(self.table_name)
+        self.assertEqual(reader.rows, self.rows)
+        reader.close()
+        self.writer.control.close()
+        self.writer = replacement
+
+    def _dead_pid(self):
+        process = multiprocessing.Process(target=os.getpid)
+        process.start()
+        process.join()
+        return process.pid
+
+    def test_reader_follows_versions(self):
+        self.writer.publish(self.columns, self.rows)
+        reader = SharedTableReader(self.table_name)
+        self.assertEqual(reader.version, 1)
+        self.assertEqual(reader.rows, self.rows)
+        self.assertFalse(reader.refresh())
+
+        for i in range(5):
+            self.writer.publish(self.columns, self.rows + [{'C1': str(i), 'C2': ''}])
+        self.assertTrue(reader.refresh())
+        self.assertEqual(reader.version, 6)
+        self.assertEqual(reader.rows[-1], {'C1': '4', 'C2': ''})
+        reader.close()
+
+    def test_reader_in_other_process(self):
+        self.writer.publish(self.columns, self.rows)
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        process = context.Process(target=read_in_child, args=(self.table_name, results))
+        process.start()
+        version, rows = results.get(timeout=10)
+        process.join()
+        self.assertEqual(version, 1)
+        self.assertEqual(rows, self.rows)
+
+    def test_concurrent_attaches_keep_the_resource_tracker(self):
+        self.writer.publish(self.columns, self.rows)
+        register = resource_tracker.register
+        readers = [SharedTableReader(self.table_name) for _ in range(4)]
+        attach = shared_memory.SharedMemory
+
+        def slow_attach(*args, **kwargs):
+            # lets the attaches of the other threads overlap
+            time.sleep(0.001)
+            return attach(*args, **kwargs)
+
+        def refresh(reader):
+            for i in range(20):
+                reader.version = 0
+                reader.refresh()
+
+        threads = [threading.Thread(target=refresh, args=(reader,)) for reader in readers]
+        with patch('database.shared_table.shared_memory.SharedMemory', side_effect=slow_attach):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertIs(resource_tracker.register, register)
+        for reader in readers:
+            reader.close()
+
+    def test_shared_csv_manager(self):
+        self.writer.publish(self.columns, self.rows)
+        manager = SharedCSVFileManager(self.table_name)
+        self.assertEqual(manager.get_columns(), self.columns)
+        self.assertEqual(manager.query_records([('C2', '&=', 'b', '')]), [self.rows[1]])
+        tag = manager.version_tag()
+
+        self.writer.publish(self.columns, [{'C1': 'x', 'C2': 'b'}])
+        self.assertNotEqual(manager.version_tag(), tag)
+        self.assertEqual(manager.query_records([('C2', '&=', 'b', '')]), [{'C1': 'x', 'C2': 'b'}])
+        with self.assertRaises(PermissionError):
+            manager.add_record(['y', 'z'])
+        with self.assertRaises(PermissionError):
+            manager.delete_record({'C1': 'x'})
+
+
+    def test_shared_csv_manager_indexes_follow_versions(self):
+        self.writer.publish(self.columns, self.rows)
+        manager = SharedCSVFileManager(self.table_name)
+        manager.create_index('C2')
+        self.assertEqual(manager.query_records([('C2', '==', 'b,c', '')]), [self.rows[1]])
+
+        self.writer.publish(self.columns, [{'C1': 'new', 'C2': 'b,c'}])
+        self.assertEqual(manager.query_records([('C2', '==', 'b,c', '')]), [{'C1': 'new', 'C2': 'b,c'}])
+        self.assertEqual(manager.query_records([('C2', '^=', 'b', '')]), [{'C1': 'new', 'C2': 'b,c'}])
+        with self.assertRaises(ValueError):
+            manager.create_index('C9')
+
+    def test_concurrent_queries_see_one_version(self):
+        def table(version):
+            return [{'C1': f'{version}-{i}', 'C2': 'even' if i % 2 == 0 else 'odd'} for i in range(20)]
+
+        self.writer.publish(self.columns, table(0))
+        manager = SharedCSVFileManager(self.table_name)
+        manager.create_index('C2')
+        # matches the even rows, and in version 1 also '1-1' and '1-10' to '1-19'
+        query = [('C2', '==', 'even', 'or'), ('*', '&=', '1-1', '')]
+        probing = threading.Event()
+        resume = threading.Event()
+        lookup = SortedIndex.lookup
+        results = {}
+
+        def slow_lookup(index, operator, value):
+            if threading.current_thread().name == 'slow':
+                probing.set()
+                resume.wait(5)
+            return lookup(index, operator, value)
+
+        def run():
+            try:
+                results['slow'] = manager.query_records(query)
+            except Exception as error:
+                results['slow'] = error
+
+        slow = threading.Thread(target=run, name='slow')
+        with patch.object(SortedIndex, 'lookup', slow_lookup):
+            slow.start()
+            self.assertTrue(probing.wait(5))
+            # a new version is published and loaded by another query while the slow one probes
+            self.writer.publish(self.columns, table(1))
+            fast = manager.query_records(query)
+            resume.set()
+            slow.join(5)
+        self.assertEqual({row['C1'].split('-')[0] for row in fast}, {'1'})
+        self.assertEqual(len(fast), 16)
+        self.assertEqual({row['C1'].split('-')[0] for row in results['slow']}, {'0'})
+        self.assertEqual(len(results['slow']), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
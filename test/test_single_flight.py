@@ -0,0 +1,87 @@
+import threading
+import time
+import unittest
+
+from database.single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.single_flight = SingleFlight()
+
+    def _run_concurrently(self, key, function, callers):
+        results = []
+        errors = []
+
+        def call():
+            try:
+                results.append(self.single_flight.do(key, function))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def test_waiters_share_the_leader(self):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def load():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 42
+
+        leader = threading.Thread(target=lambda: self.single_flight.do('query:a', load))
+        leader.start()
+        started.wait(5)
+        threads, results, errors = self._run_concurrently('query:a', load, 3)
+        # let the callers reach the running call
+        time.sleep(0.1)
+        release.set()
+        leader.join(5)
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [42, 42, 42])
+        self.assertEqual(self.single_flight.in_flight(), 0)
+
+    def test_exception_reaches_every_caller(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def load():
+            started.set()
+            release.wait(5)
+            raise ValueError('database down')
+
+        leader_errors = []
+
+        def lead():
+            try:
+                self.single_flight.do('query:a', load)
+            except ValueError as e:
+                leader_errors.append(e)
+
+        leader = threading.Thread(target=lead)
+        leader.start()
+        started.wait(5)
+        threads, results, errors = self._run_concurrently('query:a', load, 2)
+        time.sleep(0.1)
+        release.set()
+        leader.join(5)
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(leader_errors), 1)
+        self.assertEqual([str(e) for e in errors], ['database down'] * 2)
+
+    def test_next_call_runs_again(self):
+        self.assertEqual(self.single_flight.do('query:a', lambda: 1), 1)
+        self.assertEqual(self.single_flight.do('query:a', lambda: 2), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from database.csv_manager import CSVFileManager
+from database.query_ast import And, Or, Predicate
+from database.query_parser import QueryParser
+from database.sqlite_manager import SQLiteDatabase, glob_prefix
+
+ROWS = [
+    ['id0', 'even', 'Value 0'],
+    ['id1', 'odd', 'value 1'],
+    ['id2', 'EVEN', 'a*b [x]'],
+    ['id3', 'odd', 'Straße'],
+    ['id4', 'even', ''],
+    ['id5', 'ödd', 'value "5"'],
+]
+
+
+class TestSQLiteDatabase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = SQLiteDatabase(os.path.join(self.tmp_dir, 'data.db'), indexed_columns=['C2'])
+        for row in ROWS:
+            self.db.add_record(row)
+        self.db.write()
+        csv_path = os.path.join(self.tmp_dir, 'data.csv')
+        with open(csv_path, 'w', newline='') as f:
+            f.write("C1,C2,C3\n")
+        self.csv = CSVFileManager(csv_path)
+        self.csv.data = [dict(zip(['C1', 'C2', 'C3'], row)) for row in ROWS]
+        for row in self.csv.data:
+            self.csv._assign_seq(row)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def assertSameAsCSV(self, query):
+        conditions = QueryParser().parse_command(query).conditions
+        self.assertEqual(self.db.query_records(conditions), self.csv.query_records(conditions), query)
+
+    def test_queries_match_csv_engine(self):
+        for query in ['C2 == "odd"', 'C2 != "odd"', 'C2 $= "even"', 'C2 $= "ÖDD"', 'C3 &= "alu"', 'C3 &= "Val"',
+                      'C3 &= "ß"', 'C3 $= "STRASSE"', 'C3 $= "straße"', 'C1 ^= "id"', 'C3 ^= "a*b"', 'C3 ^= "a?b"',
+                      'C1 >= "id2" and C1 < "id4"', 'C2 IN ("odd", "EVEN")', 'C3 == ""', 'C4 == ""', 'C4 != ""',
+                      '* == "odd"', '* != "odd"', '* &= "alue"', '* $= "even"', '* ^= "Va"',
+                      'C3 &= "\\"5\\""', '(C2 == "odd" or C2 == "even") and C3 &= "value"']:
+            self.assertSameAsCSV(query)
+
+    def test_projection_limit_offset(self):
+        rows = self.db.query_records([('C2', '$=', 'even', '')], columns=['C1'], limit=2, offset=1)
+        self.assertEqual(rows, [{'C1': 'id2'}, {'C1': 'id4'}])
+        self.assertEqual(self.db.query_records(None, limit=0), [])
+        with self.assertRaises(ValueError):
+            self.db.query_records(None, columns=['C9'])
+
+    def test_writes(self):
+        self.db.update_record({'C2': 'odd'}, 'C3', 'updated')
+        self.db.delete_record({'C1': 'id0'})
+        self.db.delete_record({'C9': 'id1'})
+        self.db.write()
+        self.assertEqual([row['C1'] for row in self.db.query_records(Predicate('C3', '&=', 'updated'))], ['id1', 'id3'])
+        self.assertEqual(len(self.db.read()), 5)
+
+    def test_batch_is_one_transaction(self):
+        self.db.add_record(['id6', 'even', 'pending'])
+        seen = []
+        reader = threading.Thread(target=lambda: seen.append(len(self.db.read())))
+        reader.start()
+        reader.join()
+        # another thread's connection does not see the batch until it is committed
+        self.assertEqual(seen, [6])
+        self.db.write()
+        reader = threading.Thread(target=lambda: seen.append(len(self.db.read())))
+        reader.start()
+        reader.join()
+        self.assertEqual(seen, [6, 7])
+
+    def test_search_follows_writes(self):
+        self.db.update_record({'C1': 'id1'}, 'C3', 'needle')
+        self.db.add_record(['id7', 'odd', 'another needle'])
+        self.db.delete_record({'C1': 'id7'})
+        self.db.write()
+        self.assertEqual(self.db.query_records(Predicate('*', '&=', 'needle'), columns=['C1']), [{'C1': 'id1'}])
+
+    def test_reopen_keeps_data(self):
+        self.db.close()
+        reopened = SQLiteDatabase(self.db.filepath)
+        self.assertEqual(reopened.get_columns(), ['C1', 'C2', 'C3'])
+        self.assertEqual(len(reopened.query_records(Predicate('C3', '&=', 'alue'))), 3)
+        reopened.close()
+
+    def test_aggregates(self):
+        self.assertEqual(self.db.aggregate_records(None, 'count'), [{'count': 6}])
+        self.assertEqual(self.db.aggregate_records(Or([Predicate('C2', '==', 'odd'), Predicate('C1', '==', 'id0')]),
+                                                   'count'), [{'count': 3}])
+        self.assertEqual(self.db.aggregate_records(None, 'count_distinct', 'C2'),
+                         self.csv.aggregate_records(None, 'count_distinct', 'C2'))
+        self.assertEqual(self.db.aggregate_records(None, 'group_count', 'C2', limit=2, offset=1),
+                         self.csv.aggregate_records(None, 'group_count', 'C2', limit=2, offset=1))
+
+    def test_statistics(self):
+        self.assertEqual(self.db.get_statistics()['row_count'], 6)
+        self.db.delete_record({'C2': 'odd'})
+        self.db.write()
+        self.assertEqual(self.db.get_statistics()['row_count'], 4)
+        self.assertGreater(self.db.estimate_rows(And([Predicate('C2', '==', 'even')])), 0)
+
+    def test_without_full_text_index(self):
+        db = SQLiteDatabase(os.path.join(self.tmp_dir, 'plain.db'), full_text=False)
+        for row in ROWS:
+            db.add_record(row)
+        self.assertEqual([row['C1'] for row in db.query_records(Predicate('*', '&=', 'alue'))], ['id0', 'id1', 'id5'])
+        db.close()
+
+    def test_glob_prefix(self):
+        self.assertEqual(glob_prefix('a*b?[c]'), 'a[*]b[?][[]c]*')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,23 @@
+import importlib
+
+# queue name -> (module, class), imported on first use so pika is only loaded for RabbitMQ
+QUEUES = {
+    'local': ('threading_lib.task_queue', 'LocalQueue'),
+    'process': ('threading_lib.task_queue', 'ProcessQueue'),
+    'rabbitmq': ('threading_lib.rabbitmq_queue', 'RabbitMQQueue'),
+}
+
+
+def get_queue(name):
+    """
+    Returns the QueueInterface implementation registered under name, importing it on first use.
+
+    :param name: The queue name.
+    :return: The queue class.
+    :raises ValueError: If no queue is registered under name.
+    """
+    try:
+        module_name, class_name = QUEUES[name]
+    except KeyError:
+        raise ValueError(f"Unsupported queue type: {name}")
+    return getattr(importlib.import_module(module_name), class_name)
@@ -0,0 +1,36 @@
+import pika
+from threading_lib.task_queue import QueueInterface
+
+
+class RabbitMQQueue(QueueInterface):
+    def __init__(self, queue_name='task_queue'):
+        self.queue_name = queue_name
+        self.connection = pika.BlockingConnection(pika.ConnectionParameters('localhost', 5672))
+        self.channel = self.connection.channel()
+        self.channel.queue_declare(queue=queue_name, durable=True)
+    
+    def put(self, item):
+        self.channel.basic_publish(
+            exchange='',
+            routing_key=self.queue_name,
+            body=item,
+            properties=pika.BasicProperties(delivery_mode=2)
+        )
+
+    def get(self, count=1):
+        messages = []
+        for _ in range(count):
+            method_frame, header_frame, body = self.channel.basic_get(queue=self.queue_name)
+            if method_frame:
+                #  make sure messages processed
+                self.channel.basic_ack(method_frame.delivery_tag)
+                messages.append(body)
+            else:
+                break
+        return messages
+    
+    def task_done(self):
+        pass
+
+    def close(self):
+        self.connection.close()
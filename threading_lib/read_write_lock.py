@@ -1,65 +1,237 @@
 import threading
+import time
+from collections import deque
+
+
+class LockStats:
+    """
+    Wait-time and hold-time statistics for one side (read or write) of a FairReadWriteLock.
+
+    All updates happen while the owning lock's internal mutex is held, so no extra
+    synchronization is needed.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.acquired = 0
+        self.contended = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+
+    def record_wait(self, waited, contended):
+        self.acquired += 1
+        if contended:
+            self.contended += 1
+            self.wait_total += waited
+            if waited > self.wait_max:
+                self.wait_max = waited
+
+    def record_hold(self, held):
+        self.hold_total += held
+        if held > self.hold_max:
+            self.hold_max = held
+
+    def snapshot(self):
+        return {
+            'acquired': self.acquired,
+            'contended': self.contended,
+            'timeouts': self.timeouts,
+            'wait_total': self.wait_total,
+            'wait_max': self.wait_max,
+            'wait_avg': self.wait_total / self.contended if self.contended else 0.0,
+            'hold_total': self.hold_total,
+            'hold_max': self.hold_max,
+            'hold_avg': self.hold_total / self.acquired if self.acquired else 0.0,
+        }
+
+
+class _WriterWaiter:
+    """A queued writer; the lock is handed to it by setting granted and notifying its condition"""
+
+    __slots__ = ('condition', 'granted')
+
+    def __init__(self, lock):
+        self.condition = threading.Condition(lock)
+        self.granted = False
+
 
 class FairReadWriteLock:
     """
     A lock object that allows many simultaneous "read locks", but only one "write lock".
 
-    This is a variant of a read-write lock that supports multiple readers
-    but only one writer at a time. It prevents write starvation by allowing
-    writers to acquire the lock even if there are waiting readers.
+    This is a phase-fair read-write lock: reader phases and writer phases alternate.
+    A reader that arrives while a writer holds or waits for the lock joins the next
+    reader phase, which starts as soon as the current writer releases, so readers are
+    never starved by a stream of writers. Writers wait only for the readers already
+    inside and are served in FIFO order, so writers are never starved by readers either.
+
+    Waiting readers and each waiting writer sleep on separate conditions and the lock is
+    handed off explicitly on release, so a release wakes only the threads that can proceed
+    instead of every waiter.
     """
     def __init__(self):
         """Initialize a new ReadWriteLock."""
-        self._writers_waiting = 0
-        # number of active reader
+        self._lock = threading.Lock()
+        # number of active readers
         self._readers = 0
         # writer status
         self._writer = False
-        self._lock = threading.Lock()
-        # condition variable 
+        # readers blocked until the next reader phase
+        self._readers_waiting = 0
+        self._reader_phase = 0
         self._read_ready = threading.Condition(self._lock)
-
-    def acquire_read(self):
-        with self._read_ready:
-            while self._writer or self._writers_waiting > 0:
-                self._read_ready.wait()
-            self._readers += 1
+        # writers blocked, in arrival order
+        self._writer_queue = deque()
+        # sum of the acquire times of the active readers; a read lock may be released by another
+        # thread than the one that acquired it, so hold times are not tracked per thread
+        self._read_started_total = 0.0
+        self._write_acquired_at = 0.0
+        self.read_stats = LockStats()
+        self.write_stats = LockStats()
+
+    def acquire_read(self, blocking=True, timeout=None):
+        """
+        Acquire the lock in shared mode.
+
+        :param blocking: If False, return immediately when the lock is not available.
+        :param timeout: Maximum number of seconds to wait, or None to wait forever.
+        :return: True if the lock was acquired, False otherwise.
+        """
+        with self._lock:
+            if not self._writer and not self._writer_queue:
+                self._readers += 1
+                self._read_started_total += time.perf_counter()
+                self.read_stats.record_wait(0.0, False)
+                return True
+            if not blocking:
+                self.read_stats.timeouts += 1
+                return False
+
+            start = time.perf_counter()
+            phase = self._reader_phase
+            self._readers_waiting += 1
+            # release_write and _admit_readers count us in before bumping the phase
+            granted = self._read_ready.wait_for(lambda: self._reader_phase != phase, timeout)
+            if not granted:
+                self._readers_waiting -= 1
+                self.read_stats.timeouts += 1
+                return False
+            self.read_stats.record_wait(time.perf_counter() - start, True)
+            return True
 
     def release_read(self):
-        with self._read_ready:
+        with self._lock:
+            now = time.perf_counter()
+            # readers are not told apart, so each release is charged the mean acquire time of
+            # the active readers; hold_total stays exact, hold_max is an estimate
+            started = self._read_started_total / self._readers if self._readers > 0 else now
+            self._read_started_total -= started
             self._readers -= 1
-            if self._readers == 0:
-                self._read_ready.notify_all()
-
-    def acquire_write(self):
-        with self._read_ready:
-            self._writers_waiting += 1
-            while self._writer or self._readers > 0:
-                self._read_ready.wait()
-            self._writers_waiting -= 1
-            self._writer = True
+            self.read_stats.record_hold(now - started)
+            if self._readers == 0 and self._writer_queue:
+                self._grant_next_writer()
+
+    def acquire_write(self, blocking=True, timeout=None):
+        """
+        Acquire the lock in exclusive mode.
+
+        :param blocking: If False, return immediately when the lock is not available.
+        :param timeout: Maximum number of seconds to wait, or None to wait forever.
+        :return: True if the lock was acquired, False otherwise.
+        """
+        with self._lock:
+            if not self._writer and self._readers == 0 and not self._writer_queue:
+                self._writer = True
+                self.write_stats.record_wait(0.0, False)
+                self._write_acquired_at = time.perf_counter()
+                return True
+            if not blocking:
+                self.write_stats.timeouts += 1
+                return False
+
+            start = time.perf_counter()
+            waiter = _WriterWaiter(self._lock)
+            self._writer_queue.append(waiter)
+            granted = waiter.condition.wait_for(lambda: waiter.granted, timeout)
+            if not granted:
+                self._writer_queue.remove(waiter)
+                self.write_stats.timeouts += 1
+                # readers held back only by this writer may go now
+                if not self._writer and not self._writer_queue:
+                    self._admit_readers()
+                return False
+            self.write_stats.record_wait(time.perf_counter() - start, True)
+            self._write_acquired_at = time.perf_counter()
+            return True
 
     def release_write(self):
-        with self._read_ready:
+        with self._lock:
+            self.write_stats.record_hold(time.perf_counter() - self._write_acquired_at)
             self._writer = False
-            self._read_ready.notify_all()
-
-    def read_lock(self):
+            # phase-fair hand-off: readers that queued up during this write phase go first
+            if self._readers_waiting:
+                self._admit_readers()
+            elif self._writer_queue:
+                self._grant_next_writer()
+
+    def try_acquire_read(self):
+        return self.acquire_read(blocking=False)
+
+    def try_acquire_write(self):
+        return self.acquire_write(blocking=False)
+
+    def _admit_readers(self):
+        self._readers += self._readers_waiting
+        self._read_started_total += time.perf_counter() * self._readers_waiting
+        self._readers_waiting = 0
+        self._reader_phase += 1
+        self._read_ready.notify_all()
+
+    def _grant_next_writer(self):
+        waiter = self._writer_queue.popleft()
+        waiter.granted = True
+        self._writer = True
+        waiter.condition.notify()
+
+    def stats(self):
+        """Return a snapshot of the wait-time and hold-time statistics"""
+        with self._lock:
+            return {
+                'read': self.read_stats.snapshot(),
+                'write': self.write_stats.snapshot(),
+                'readers_active': self._readers,
+                'readers_waiting': self._readers_waiting,
+                'writers_waiting': len(self._writer_queue),
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.read_stats.reset()
+            self.write_stats.reset()
+
+    def read_lock(self, timeout=None):
         """Return a context manager for a read lock"""
-        return self._ReadLock(self)
-    
-    def write_lock(self):
+        return self._ReadLock(self, timeout)
+
+    def write_lock(self, timeout=None):
         """Return a context manager for a write lock"""
-        return self._WriteLock(self)
+        return self._WriteLock(self, timeout)
 
     class _ReadLock:
         """read lock context manager class"""
 
-        def __init__(self, rw_lock):
+        def __init__(self, rw_lock, timeout=None):
             self.rw_lock = rw_lock
+            self.timeout = timeout
 
         def __enter__(self):
-            self.rw_lock.acquire_read()
+            if not self.rw_lock.acquire_read(timeout=self.timeout):
+                raise TimeoutError("Timed out waiting for the read lock")
 
         def __exit__(self, exc_type, exc_val, exc_tb):
             self.rw_lock.release_read()
@@ -68,11 +240,13 @@ class FairReadWriteLock:
     class _WriteLock:
         """write lock context manager class"""
 
-        def __init__(self, rw_lock):
+        def __init__(self, rw_lock, timeout=None):
             self.rw_lock = rw_lock
+            self.timeout = timeout
 
         def __enter__(self):
-            self.rw_lock.acquire_write()
+            if not self.rw_lock.acquire_write(timeout=self.timeout):
+                raise TimeoutError("Timed out waiting for the write lock")
 
         def __exit__(self, exc_type, exc_val, exc_tb):
             self.rw_lock.release_write()
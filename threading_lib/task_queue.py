@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 import queue
-import pika
+import multiprocessing
 
 class QueueInterface(ABC):
     @abstractmethod
@@ -8,7 +8,7 @@ class QueueInterface(ABC):
         pass
 
     @abstractmethod
-    def get(self):
+    def get(self, count=1):
         pass
 
     @abstractmethod
@@ -27,9 +27,15 @@ class LocalQueue(QueueInterface):
     def put(self, item):
         self.q.put(item)
 
-    def get(self):
-        return self.q.get()
-    
+    def get(self, count=1):
+        messages = []
+        for _ in range(count):
+            try:
+                messages.append(self.q.get_nowait())
+            except queue.Empty:
+                break
+        return messages
+
     def task_done(self):
         self.q.task_done()
 
@@ -37,35 +43,36 @@ class LocalQueue(QueueInterface):
         self.q.put(None)
  
 
-class RabbitMQQueue(QueueInterface):
-    def __init__(self, queue_name='task_queue'):
-        self.queue_name = queue_name
-        self.connection = pika.BlockingConnection(pika.ConnectionParameters('localhost', 5672))
-        self.channel = self.connection.channel()
-        self.channel.queue_declare(queue=queue_name, durable=True)
-    
+class ProcessQueue(QueueInterface):
+    """
+    A queue shared between pre-forked server processes and the writer process.
+    It must be created in the parent before the processes are started.
+    """
+    def __init__(self, mp_queue=None):
+        self.q = mp_queue if mp_queue is not None else multiprocessing.Queue()
+
     def put(self, item):
-        self.channel.basic_publish(
-            exchange='',
-            routing_key=self.queue_name,
-            body=item,
-            properties=pika.BasicProperties(delivery_mode=2)
-        )
+        self.q.put(item)
 
     def get(self, count=1):
         messages = []
         for _ in range(count):
-            method_frame, header_frame, body = self.channel.basic_get(queue=self.queue_name)
-            if method_frame:
-                #  make sure messages processed
-                self.channel.basic_ack(method_frame.delivery_tag)
-                messages.append(body)
-            else:
+            try:
+                messages.append(self.q.get_nowait())
+            except queue.Empty:
                 break
         return messages
-    
+
     def task_done(self):
         pass
 
     def close(self):
-        self.connection.close()
+        self.q.close()
+
+
+def __getattr__(name):
+    # RabbitMQQueue moved to its own module so importing this one does not load pika
+    if name == 'RabbitMQQueue':
+        from threading_lib.rabbitmq_queue import RabbitMQQueue
+        return RabbitMQQueue
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")